@@ -2,6 +2,9 @@ from elasticsearch import exceptions
 
 from ..es import es
 
+# exact value fields keep full text search and get a `.keyword` subfield for term filters
+text_with_keyword = {"type": "text", "fields": {"keyword": {"type": "keyword"}}}
+
 gcps__mapping = {
     "settings": {"number_of_shards": 1, "number_of_replicas": 0},
     "mappings": {
@@ -10,8 +13,8 @@ gcps__mapping = {
             "cog_id": {"type": "keyword"},
             "modified": {"type": "date"},
             "created": {"type": "date"},
-            "system": {"type": "text"},
-            "system_version": {"type": "text"},
+            "system": text_with_keyword,
+            "system_version": text_with_keyword,
             "registration_id": {"type": "text"},
             "model_id": {"type": "text"},
             "model": {"type": "text"},
@@ -20,7 +23,7 @@ gcps__mapping = {
             "columns_from_left": {"type": "float"},
             "latitude": {"type": "float"},
             "longitude": {"type": "float"},
-            "crs": {"type": "text"},
+            "crs": text_with_keyword,
             "confidence": {"type": "float"},
             "reference_id": {"type": "text"},
         }
@@ -34,14 +37,14 @@ projection_file_mapping = {
         "properties": {
             "cog_id": {"type": "keyword"},
             "projection_id": {"type": "keyword"},
-            "crs": {"type": "text"},  # epsg_code used for reprojection
+            "crs": text_with_keyword,  # epsg_code used for reprojection
             "gcps_ids": {"type": "text"},  # gcps used in reprojection
             "created": {"type": "date"},  # when file was created
-            "status": {"type": "text"},  # (created, failed, validated)
+            "status": text_with_keyword,  # (created, failed, validated)
             "download_url": {"type": "text"},  # url in polymer s3 or cdr s3
             "map_area_id": {"type": "text"},
-            "system": {"type": "text"},
-            "system_version": {"type": "text"},
+            "system": text_with_keyword,
+            "system_version": text_with_keyword,
             "registration_id": {"type": "text"},
             "transformation": {"type": "text"},
             "from_cdr": {"type": "boolean"},
@@ -78,13 +81,13 @@ legend_mapping = {
             "coordinates": {"type": "nested"},
             "coordinates_from_bottom": {"type": "nested"},
             "text": {"type": "text"},
-            "system": {"type": "text"},
-            "system_version": {"type": "text"},
+            "system": text_with_keyword,
+            "system_version": text_with_keyword,
             "model": {"type": "text"},
             "model_version": {"type": "text"},
-            "category": {"type": "text"},  # polygon, line, point
+            "category": text_with_keyword,  # polygon, line, point
             "confidence": {"type": "float"},
-            "status": {"type": "text"},
+            "status": text_with_keyword,
             "notes": {"type": "text"},
             "edited": {"type": "boolean"},
             "pattern": {"type": "text"},
@@ -107,30 +110,31 @@ area_extractions_mapping = {
             "bbox": {"type": "float"},
             "extent_from_bottom": {"type": "float"},
             "text": {"type": "text"},
-            "system": {"type": "text"},
-            "system_version": {"type": "text"},
+            "system": text_with_keyword,
+            "system_version": text_with_keyword,
             "model": {"type": "text"},
             "model_version": {"type": "text"},
-            "category": {"type": "text"},  # map_area, legend_area, ...
+            "category": text_with_keyword,  # map_area, legend_area, ...
             "confidence": {"type": "float"},
-            "status": {"type": "text"},
+            "status": text_with_keyword,
         }
     },
 }
 
 
+indices_to_create = [
+    ("polymer_gcps", gcps__mapping),
+    ("polymer_projections", projection_file_mapping),
+    ("polymer_legend_extractions", legend_mapping),
+    ("polymer_area_extractions", area_extractions_mapping),
+]
+
+
 def main():
     # Check if connected
     if not es.ping():
         raise ValueError("Couldn't connect to Elasticsearch. Ensure it's running and accessible.")
 
-    indices_to_create = [
-        ("polymer_gcps", gcps__mapping),
-        ("polymer_projections", projection_file_mapping),
-        ("polymer_legend_extractions", legend_mapping),
-        ("polymer_area_extractions", area_extractions_mapping),
-    ]
-
     for index, mapping in indices_to_create:
         create_index(es, index, mapping)
 
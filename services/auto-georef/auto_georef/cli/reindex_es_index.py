@@ -0,0 +1,95 @@
+import sys
+from datetime import datetime
+
+from elasticsearch import exceptions
+
+from ..es import es
+from .create_es_index import indices_to_create
+
+
+def current_indices(es_instance, name):
+    """Concrete indices behind `name`, which is either an alias or an index created before aliases were used."""
+    if es_instance.indices.exists_alias(name=name):
+        return list(es_instance.indices.get_alias(name=name).keys())
+    if es_instance.indices.exists(index=name):
+        return [name]
+    return []
+
+
+def set_write_block(es_instance, indices, blocked):
+    es_instance.indices.put_settings(index=",".join(indices), body={"index.blocks.write": blocked})
+
+
+def reindex(es_instance, name, mapping):
+    """
+    Copy `name` into a new index created with the current mapping, then point the
+    alias `name` at it so readers and writers switch over in one step. Writes to the
+    old index are blocked while it is copied, so none are lost in the swap. They fail
+    until the swap instead and have to be retried.
+    """
+    old_indices = current_indices(es_instance, name)
+    if not old_indices:
+        print(f"Index {name} does not exist, nothing to reindex.")
+        return
+
+    new_index = f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    es_instance.indices.create(index=new_index, body=mapping)
+    set_write_block(es_instance, old_indices, True)
+    swapped = False
+    try:
+        try:
+            response = es_instance.reindex(
+                body={"source": {"index": name}, "dest": {"index": new_index}},
+                wait_for_completion=True,
+                refresh=True,
+                request_timeout=3600,
+            )
+        except exceptions.TransportError as e:
+            es_instance.indices.delete(index=new_index)
+            print(f"Error while reindexing {name}, removed {new_index}. Details: {e}")
+            return
+
+        if response.get("failures"):
+            es_instance.indices.delete(index=new_index)
+            print(f"Reindexing {name} failed, removed {new_index}. Failures: {response['failures'][:5]}")
+            return
+
+        if old_indices == [name]:
+            # a concrete index can't share its name with an alias, drop it in the same call
+            actions = [{"add": {"index": new_index, "alias": name}}, {"remove_index": {"index": name}}]
+        else:
+            actions = [{"add": {"index": new_index, "alias": name}}]
+            actions += [{"remove": {"index": index, "alias": name}} for index in old_indices]
+        es_instance.indices.update_aliases(body={"actions": actions})
+        swapped = True
+    finally:
+        if not swapped:
+            # the old index is still the one in use, let it take writes again
+            set_write_block(es_instance, old_indices, False)
+
+    for index in old_indices:
+        if index != name:
+            es_instance.indices.delete(index=index)
+
+    print(f"Reindexed {response['total']} docs from {name} into {new_index}.")
+
+
+def main():
+    # Check if connected
+    if not es.ping():
+        raise ValueError("Couldn't connect to Elasticsearch. Ensure it's running and accessible.")
+
+    # optionally limit to the index names given on the command line
+    names = sys.argv[1:]
+    for index, mapping in indices_to_create:
+        if not names or index in names:
+            reindex(es, index, mapping)
+
+    print(
+        "Once every index is reindexed, "
+        "set AUTOGEOREF_POLYMER_ES_KEYWORD_FILTERS=true to filter on .keyword fields."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Shared client for the CDR API.
+
+Every CDR request goes through one pooled httpx.Client / httpx.AsyncClient with
+bounded timeouts. Connection errors are retried with exponential backoff, as are
+5xx responses to idempotent requests. GETs can opt in to a TTL cache and every
+request is timed per endpoint, see `get_metrics`.
+
+Urls can be CDR paths ("/v1/maps/cog/meta/{cog_id}") or absolute urls.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from logging import Logger
+
+import httpx
+from cachetools import TTLCache
+
+from auto_georef.settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+
+auth = {
+    "Authorization": app_settings.cdr_bearer_token,
+}
+
+timeout = httpx.Timeout(app_settings.cdr_timeout, connect=app_settings.cdr_connect_timeout)
+# publishing results and long running jobs, the CDR can take minutes to respond
+publish_timeout = httpx.Timeout(app_settings.cdr_publish_timeout, connect=app_settings.cdr_connect_timeout)
+limits = httpx.Limits(
+    max_connections=app_settings.cdr_max_connections,
+    max_keepalive_connections=app_settings.cdr_max_connections,
+)
+
+client = httpx.Client(base_url=app_settings.cdr_endpoint_url, headers=auth, timeout=timeout, limits=limits)
+async_client = httpx.AsyncClient(base_url=app_settings.cdr_endpoint_url, headers=auth, timeout=timeout, limits=limits)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_cache_lock = threading.Lock()
+_caches = {}
+
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+
+# ids are tokens containing a digit (cog ids, uuids, job ids, numbers) or long tokens,
+# the api version prefix (v1) is not an id
+id_segment = re.compile(r"^(?!v\d+$)(?=.*\d)[\w.-]+$|^[\w.-]{25,}$")
+
+
+def endpoint_name(method, url):
+    """Group urls by endpoint, ids in the path are replaced with {id}"""
+    path = httpx.URL(str(url)).path
+    segments = ["{id}" if id_segment.match(segment) else segment for segment in path.split("/")]
+    return f"{method} {'/'.join(segments)}"
+
+
+def record(method, url, elapsed, status_code):
+    name = endpoint_name(method, url)
+    with _metrics_lock:
+        stats = _metrics.setdefault(name, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        if status_code is None or status_code >= 500:
+            stats["errors"] += 1
+    if elapsed > app_settings.cdr_slow_request_seconds:
+        logger.warning(f"Slow CDR request {name}: {elapsed:.2f}s")
+
+
+def get_metrics():
+    with _metrics_lock:
+        return {
+            name: {**stats, "mean_seconds": stats["total_seconds"] / stats["count"]}
+            for name, stats in sorted(_metrics.items())
+        }
+
+
+def cache_key(method, url, kwargs):
+    params = kwargs.get("params")
+    return (method, str(url), tuple(sorted(dict(params).items())) if params else ())
+
+
+def cached_response(key, ttl):
+    with _cache_lock:
+        cache = _caches.get(ttl)
+        return cache.get(key) if cache is not None else None
+
+
+def cache_response(key, ttl, response):
+    if response.status_code != 200:
+        return
+    with _cache_lock:
+        _caches.setdefault(ttl, TTLCache(maxsize=app_settings.cdr_cache_size, ttl=ttl))[key] = response
+
+
+def invalidate(path_prefix=""):
+    """Drop cached responses whose url contains `path_prefix`, or all of them."""
+    with _cache_lock:
+        for cache in _caches.values():
+            for key in [key for key in cache if path_prefix in key[1]]:
+                cache.pop(key, None)
+
+
+def should_retry(method, attempt, idempotent, response=None, error=None):
+    if attempt >= app_settings.cdr_retries:
+        return False
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    if error is not None:
+        # the request never reached the CDR, safe to resend for every method
+        return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)) or (
+            idempotent and isinstance(error, httpx.TransportError)
+        )
+    return idempotent and response.status_code >= 500
+
+
+def backoff(attempt):
+    return app_settings.cdr_retry_backoff * 2**attempt
+
+
+def request(method, url, *, cache_ttl=None, idempotent=None, **kwargs):
+    """
+    Send a request with the shared client. `cache_ttl` caches 200 responses of GETs
+    for that many seconds. `idempotent` overrides the method based retry policy,
+    e.g. for search POSTs that are safe to resend.
+    """
+    method = method.upper()
+    key = cache_key(method, url, kwargs) if cache_ttl and method == "GET" else None
+    if key is not None:
+        response = cached_response(key, cache_ttl)
+        if response is not None:
+            return response
+
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            response = client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            record(method, url, time.perf_counter() - start, None)
+            if not should_retry(method, attempt, idempotent, error=e):
+                raise
+            logger.warning(f"CDR {method} {url} failed with {type(e).__name__}, retrying")
+        else:
+            record(method, url, time.perf_counter() - start, response.status_code)
+            if not should_retry(method, attempt, idempotent, response=response):
+                break
+            logger.warning(f"CDR {method} {url} returned {response.status_code}, retrying")
+        time.sleep(backoff(attempt))
+        attempt += 1
+
+    if key is not None:
+        cache_response(key, cache_ttl, response)
+    return response
+
+
+async def arequest(method, url, *, cache_ttl=None, idempotent=None, **kwargs):
+    method = method.upper()
+    key = cache_key(method, url, kwargs) if cache_ttl and method == "GET" else None
+    if key is not None:
+        response = cached_response(key, cache_ttl)
+        if response is not None:
+            return response
+
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            response = await async_client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            record(method, url, time.perf_counter() - start, None)
+            if not should_retry(method, attempt, idempotent, error=e):
+                raise
+            logger.warning(f"CDR {method} {url} failed with {type(e).__name__}, retrying")
+        else:
+            record(method, url, time.perf_counter() - start, response.status_code)
+            if not should_retry(method, attempt, idempotent, response=response):
+                break
+            logger.warning(f"CDR {method} {url} returned {response.status_code}, retrying")
+        await asyncio.sleep(backoff(attempt))
+        attempt += 1
+
+    if key is not None:
+        cache_response(key, cache_ttl, response)
+    return response
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+async def aget(url, **kwargs):
+    return await arequest("GET", url, **kwargs)
+
+
+async def apost(url, **kwargs):
+    return await arequest("POST", url, **kwargs)
+
+
+async def aput(url, **kwargs):
+    return await arequest("PUT", url, **kwargs)
+
+
+async def aclose():
+    await async_client.aclose()
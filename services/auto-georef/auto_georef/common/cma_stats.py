@@ -0,0 +1,132 @@
+"""
+Extraction statistics of the maps in a CMA.
+
+The CDR is asked for the statistics of every feature type at once, and the totals
+are cached per (cma_id, set of cog ids) for `cma_stats_ttl` seconds. Older totals
+are served for up to `cma_stats_stale_ttl` seconds while they are refreshed in the
+background, linking or unlinking maps changes the key and skips the cache.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from functools import reduce
+from logging import Logger
+
+from cachetools import TTLCache
+
+from auto_georef.common import cdr
+from auto_georef.settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+
+VALIDATED_INDEX = 0
+PENDING_INDEX = 1
+EMPTY_INDEX = 2
+
+cdr_features = ["projection", "point", "line", "polygon", "legend_item"]
+stats_url = "/v1/features/feature_type/statistics"
+
+cma_stats_cache = TTLCache(maxsize=256, ttl=app_settings.cma_stats_stale_ttl)
+# key -> refresh task, also keeps a reference to the task until it's done
+refreshing: dict[tuple[str, str], asyncio.Task] = {}
+
+
+def reformat_dict(input_dict):
+    """
+    Reformats inconsistent cdr total,validated count keys for each
+    feature_type to the same keys: either to "validated" or "total". Sample input:
+    {"total_lines":..., "total_validated_lines"} or {"georeference_count":..., "validated_count":...}
+    output: {"validated":..., "total":...}
+    """
+    output_dict = {}
+    for key, value in input_dict.items():
+        if "validated" in key:
+            output_dict["validated"] = value
+        else:
+            output_dict["total"] = value
+    return output_dict
+
+
+def group_totals(acc, cog_dict):
+    if cog_dict["validated"] > 0:
+        acc[VALIDATED_INDEX] += 1
+    elif cog_dict["total"] > 0:
+        acc[PENDING_INDEX] += 1
+    else:
+        acc[EMPTY_INDEX] += 1
+    return acc
+
+
+def accumulate_stats_for_feature(cog_stats_for_feature):
+    totals = [0, 0, 0]
+    formatted = map(reformat_dict, cog_stats_for_feature.values())
+    totals = reduce(group_totals, formatted, totals)
+    return totals
+
+
+def cache_key(cma_id: str, cog_ids: list[str]):
+    return cma_id, hashlib.sha256("\n".join(sorted(cog_ids)).encode()).hexdigest()
+
+
+async def fetch_cma(cma_id: str):
+    response = await cdr.aget(f"/v1/prospectivity/cma?cma_id={cma_id}", cache_ttl=app_settings.cdr_cache_ttl)
+    return response.json()
+
+
+async def fetch_feature_stats(cog_ids: list[str], feature_type: str):
+    response = await cdr.apost(stats_url, idempotent=True, json={"cog_ids": cog_ids, "feature_type": feature_type})
+    # sample response:
+    # {
+    #   "46d902d905b92df90c39447955b9593d583d5a9d322525252525252583679344": {
+    #     "georeferenced_count": 8,
+    #     "validated_count": 2
+    #   },
+    # }
+    if response.status_code == 200:
+        return accumulate_stats_for_feature(response.json())
+    # for now else means stats remains at 0
+    return [0, 0, 0]
+
+
+async def compute_stats(cog_ids: list[str]):
+    stats = {
+        "projections": [0, 0, 0],
+        "legend_items": [0, 0, 0],
+        "lines": [0, 0, 0],
+        "points": [0, 0, 0],
+        "polygons": [0, 0, 0],
+    }
+    totals = await asyncio.gather(*(fetch_feature_stats(cog_ids, feature_type) for feature_type in cdr_features))
+    for feature_type, feature_totals in zip(cdr_features, totals):
+        # endpoint was already pluralizing, so we'll add (s) from cdr singular feature_type..
+        stats[f"{feature_type}s"] = feature_totals
+    return stats
+
+
+async def refresh(key: tuple[str, str], cog_ids: list[str]):
+    try:
+        cma_stats_cache[key] = (await compute_stats(cog_ids), time.monotonic())
+    except Exception:
+        logger.exception(f"Failed to refresh the stats of CMA {key[0]}")
+    finally:
+        refreshing.pop(key, None)
+
+
+async def get_cma_stats(cma_id: str):
+    """The CMA and the [validated, pending, empty] map counts per feature type"""
+    cma = await fetch_cma(cma_id)
+    cog_ids = [cog["cog_id"] for cog in cma.get("cogs") or []]
+    key = cache_key(cma_id, cog_ids)
+
+    cached = cma_stats_cache.get(key)
+    if cached is not None:
+        stats, fetched_at = cached
+        if time.monotonic() - fetched_at > app_settings.cma_stats_ttl and key not in refreshing:
+            refreshing[key] = asyncio.create_task(refresh(key, cog_ids))
+        return cma, stats
+
+    stats = await compute_stats(cog_ids)
+    cma_stats_cache[key] = (stats, time.monotonic())
+    return cma, stats
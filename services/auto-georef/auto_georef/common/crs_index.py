@@ -0,0 +1,134 @@
+import bisect
+import hashlib
+import json
+import logging
+import threading
+from functools import lru_cache
+from logging import Logger
+
+import pyproj
+from pyproj.aoi import AreaOfInterest
+
+from auto_georef.common.map_utils import determine_display_format
+
+logger: Logger = logging.getLogger(__name__)
+
+CONUS_AREA_OF_INTEREST = AreaOfInterest(
+    east_lon_degree=-66.885444,
+    west_lon_degree=-124.848974,
+    south_lat_degree=24.396308,
+    north_lat_degree=49.384358,
+)
+
+_lock = threading.Lock()
+_index = None
+
+
+class CRSIndex:
+    """
+    In-memory index of the EPSG CRS codes that intersect CONUS.
+
+    Built once from the PROJ database so the CRS picker endpoints can be served
+    without querying the SQLite database or constructing CRS objects per request.
+    """
+
+    def __init__(self, crs_infos):
+        self.entries = {}
+        for info in crs_infos:
+            code = f"{info.auth_name}:{info.code}"
+            area = info.area_of_use
+            self.entries[code] = {
+                "label": code,
+                "name": info.name,
+                "type": info.type.name.lower(),
+                "area_of_use": area.name if area else None,
+                "bounds": list(area.bounds) if area else None,
+            }
+
+        self.sorted_codes = sorted(self.entries)
+        self.sorted_names = sorted((entry["name"].lower(), code) for code, entry in self.entries.items())
+
+        body = json.dumps({"codes": list(self.entries.values())}, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, auth_code):
+        return self.entries.get(normalize_auth_code(auth_code))
+
+    def search(self, prefix="", limit=0):
+        """
+        Return entries whose code or name starts with `prefix` (case insensitive).
+        A bare number such as `269` is treated as an EPSG code prefix.
+        """
+        if not prefix:
+            matches = list(self.entries.values())
+            return matches[:limit] if limit else matches
+
+        code_prefix = normalize_auth_code(prefix)
+        if ":" not in code_prefix:
+            code_prefix = "EPSG:" if code_prefix.upper() == "EPSG" else f"EPSG:{code_prefix}"
+
+        found = {}
+        start = bisect.bisect_left(self.sorted_codes, code_prefix)
+        for code in self.sorted_codes[start:]:
+            if not code.startswith(code_prefix):
+                break
+            found[code] = self.entries[code]
+
+        name_prefix = prefix.lower()
+        start = bisect.bisect_left(self.sorted_names, (name_prefix, ""))
+        for name, code in self.sorted_names[start:]:
+            if not name.startswith(name_prefix):
+                break
+            found.setdefault(code, self.entries[code])
+
+        matches = list(found.values())
+        return matches[:limit] if limit else matches
+
+
+def normalize_auth_code(auth_code):
+    auth_code = auth_code.strip()
+    if ":" not in auth_code:
+        return auth_code
+    auth, code = auth_code.split(":", 1)
+    return f"{auth.upper()}:{code}"
+
+
+def build_crs_index():
+    crs_infos = pyproj.database.query_crs_info(auth_name="EPSG", area_of_interest=CONUS_AREA_OF_INTEREST)
+    index = CRSIndex(crs_infos)
+    logger.info(f"Built CRS index with {len(index)} codes")
+    return index
+
+
+def get_crs_index():
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = build_crs_index()
+    return _index
+
+
+@lru_cache(maxsize=4096)
+def crs_from_auth_code(auth_code):
+    auth, code = normalize_auth_code(auth_code).split(":", 1)
+    return pyproj.CRS.from_authority(auth, code)
+
+
+@lru_cache(maxsize=4096)
+def projection_name(auth_code):
+    entry = get_crs_index().get(auth_code)
+    if entry is not None:
+        return entry["name"]
+    return crs_from_auth_code(auth_code).name
+
+
+@lru_cache(maxsize=4096)
+def display_format(auth_code):
+    """
+    Display format ("DMS", "EN", ...) for a CRS code, raising on unknown codes.
+    """
+    return determine_display_format(crs_from_auth_code(auth_code))
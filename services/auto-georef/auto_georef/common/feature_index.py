@@ -0,0 +1,169 @@
+"""
+Per-map spatial index over CDR extractions.
+
+The extractions of one (cog, feature type, system, version) are fetched from the CDR
+once, turned into shapely geometries in CDR pixel space (origin top left, y down) and
+indexed with an STRtree. Indexes are kept in a TTL cache so vector tiles and viewport
+queries for the same layer don't page through the CDR again.
+
+The cache is per process. Publishing or validating features invalidates the indexes of
+the worker that handled the request, other workers pick the changes up once their
+indexes expire after `feature_index_ttl` seconds.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from logging import Logger
+from typing import Literal
+
+import numpy as np
+import shapely
+from cachetools import TTLCache
+from shapely.geometry import shape
+
+from auto_georef.common.segment_utils import CDRClient
+from auto_georef.common.utils import timeit
+from auto_georef.settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+
+FType = Literal["polygon", "line", "point"]
+
+feature_index_cache = TTLCache(maxsize=app_settings.feature_index_size, ttl=app_settings.feature_index_ttl)
+feature_index_lock = threading.Lock()
+# one build lock per layer, concurrent tile requests for a cold layer wait for a single build
+build_locks: dict[tuple, threading.Lock] = {}
+
+
+def extraction_id(ftype: str, extraction: dict):
+    return extraction.get(f"{ftype}_id") or extraction.get("id") or ""
+
+
+def legend_name(legend_item: dict | None):
+    if not legend_item:
+        return "Unknown"
+    return (legend_item.get("abbreviation") or legend_item.get("label") or "Unknown").strip()
+
+
+def layer_digest(geometries, properties: list[dict]):
+    """
+    Changes whenever a feature is added, removed, moved or gets other properties
+    (validated, legend item), used to version cached tiles.
+    """
+    digest = hashlib.sha256()
+    wkbs = shapely.to_wkb(geometries) if len(geometries) else []
+    for i in sorted(range(len(properties)), key=lambda i: properties[i]["id"]):
+        digest.update(json.dumps(properties[i], sort_keys=True).encode())
+        digest.update(wkbs[i])
+    return digest.hexdigest()[:16]
+
+
+class FeatureIndex:
+    """
+    Geometries and properties of one extraction layer with an STRtree over them.
+    `properties[i]` describes `geometries[i]`.
+    """
+
+    def __init__(self, ftype: str, geometries, properties: list[dict]):
+        self.ftype = ftype
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.properties = properties
+        self.tree = shapely.STRtree(self.geometries)
+        self.digest = layer_digest(self.geometries, properties)
+
+    def __len__(self):
+        return len(self.properties)
+
+    @classmethod
+    def from_extractions(cls, ftype: str, extractions):
+        geometries, properties = [], []
+        for e in extractions:
+            try:
+                geometry = shape(e["px_geojson"])
+            except Exception:
+                logger.warning(f"Skipping {ftype} extraction with invalid geometry: {extraction_id(ftype, e)}")
+                continue
+            legend_item = e.get("legend_item") or {}
+            geometries.append(geometry)
+            properties.append(
+                {
+                    "id": extraction_id(ftype, e),
+                    "legend_id": e.get("legend_id") or legend_item.get("legend_id") or "",
+                    "name": legend_name(legend_item),
+                    "validated": e.get("validated"),
+                }
+            )
+        return cls(ftype, geometries, properties)
+
+    def query(self, bbox: tuple[float, float, float, float]):
+        """Indices of the features intersecting `bbox` (minx, miny, maxx, maxy), in index order."""
+        if not len(self):
+            return np.empty(0, dtype=np.intp)
+        indices = self.tree.query(shapely.box(*bbox), predicate="intersects")
+        return np.sort(indices)
+
+    def viewport(self, bbox: tuple[float, float, float, float], max_features: int, tolerance: float = 0):
+        """
+        Features intersecting `bbox`, at most `max_features` of them, keeping the largest
+        ones when some have to be left out. Lines and polygons are simplified with `tolerance` pixels.
+        Returns (indices, geometries, number of features in the bbox).
+        """
+        indices = self.query(bbox)
+        total = len(indices)
+        geometries = self.geometries[indices]
+
+        if total > max_features:
+            if self.ftype == "polygon":
+                order = np.argsort(-shapely.area(geometries), kind="stable")[:max_features]
+            elif self.ftype == "line":
+                order = np.argsort(-shapely.length(geometries), kind="stable")[:max_features]
+            else:
+                order = np.arange(max_features)
+            order = np.sort(order)
+            indices, geometries = indices[order], geometries[order]
+
+        if tolerance > 0 and self.ftype != "point":
+            geometries = shapely.simplify(geometries, tolerance, preserve_topology=self.ftype == "polygon")
+        return indices, geometries, total
+
+
+@timeit(logger)
+def build_feature_index(cog_id: str, ftype: FType, system: str, version: str):
+    client = CDRClient(cog_id)
+    extractions = client.iter_extractions(ftype, system, version, app_settings.feature_index_max_features)
+    index = FeatureIndex.from_extractions(ftype, extractions)
+    logger.info(f"Indexed {len(index)} {ftype} features for {cog_id} {system} {version}")
+    return index
+
+
+def get_feature_index(cog_id: str, ftype: FType, system: str, version: str) -> FeatureIndex:
+    key = (cog_id, ftype, system, version)
+    with feature_index_lock:
+        if key in feature_index_cache:
+            return feature_index_cache[key]
+        build_lock = build_locks.setdefault(key, threading.Lock())
+
+    try:
+        with build_lock:
+            with feature_index_lock:
+                if key in feature_index_cache:
+                    return feature_index_cache[key]
+
+            index = build_feature_index(cog_id, ftype, system, version)
+
+            with feature_index_lock:
+                feature_index_cache[key] = index
+            return index
+    finally:
+        with feature_index_lock:
+            if build_locks.get(key) is build_lock:
+                del build_locks[key]
+
+
+def invalidate_feature_index(cog_id: str, system: str | None = None):
+    """Drop the cached indexes of `cog_id`, optionally only those of one system."""
+    with feature_index_lock:
+        for key in [key for key in feature_index_cache if key[0] == cog_id and system in (None, key[2])]:
+            feature_index_cache.pop(key, None)
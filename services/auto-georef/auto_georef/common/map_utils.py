@@ -1,30 +1,42 @@
 import json
 import logging
+import multiprocessing
 import os
 import re
 import tempfile
+import threading
 import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from io import BytesIO
 from logging import Logger
 from time import perf_counter
 from openai import OpenAI
 
-import httpx
+import numpy as np
 import pytesseract
 import rasterio as rio
 import rasterio.transform as riot
 from cdr_schemas.georeference import GeoreferenceResults
 from fastapi import HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from PIL import Image
 from pyproj import Transformer
 import pyproj
 from rasterio.warp import Resampling, calculate_default_transform, reproject
 from rasterio.windows import Window
 
+from auto_georef.common import cdr
+from auto_georef.common.shared_cache import SharedCache
 from auto_georef.common.tiff_cache import get_cached_tiff
 from auto_georef.common.utils import s3_client, time_since, upload_s3_file
-from auto_georef.es import cdr_GCP_by_id, return_ES_doc_by_id, save_ES_data, search_by_cog_id, update_GCPs
+from auto_georef.es import (
+    GCPResolver,
+    return_ES_doc_by_id,
+    save_ES_data,
+    search_by_cog_id,
+    update_GCPs,
+)
 from auto_georef.settings import app_settings
 
 logger: Logger = logging.getLogger(__name__)
@@ -35,10 +47,6 @@ client = OpenAI(
 
 Image.MAX_IMAGE_PIXELS = None
 
-auth = {
-    "Authorization": app_settings.cdr_bearer_token,
-}
-
 
 def cog_height(cache, cog_id):
     with get_cached_tiff(cache, cog_id) as image_size:
@@ -235,97 +243,58 @@ def inverse_bbox(bbox, height):
 
 
 async def post_results(files, data):
-    async with httpx.AsyncClient(timeout=None) as client:
-        data_ = {"georef_result": data}  # Marking the part as JSON
-        files_ = []
-        for file_path, file_name in files:
-            files_.append(("files", (file_name, open(file_path, "rb"))))
-        try:
-            if len(files_) > 0:
-                logging.debug(f"files to be sent {files_}")
-                logging.debug(f"data to be sent {data_}")
-                r = await client.post(
-                    app_settings.cdr_endpoint_url + "/v1/maps/publish/georef",
-                    files=files_,
-                    data=data_,
-                    headers=auth,
-                )
-                logging.debug(f"Response text from CDR {r.text}")
-                r.raise_for_status()
-            else:
-                logging.debug(f"files to be sent {files_}")
-                logging.debug(f"data to be sent {data_}")
-                r = await client.post(
-                    app_settings.cdr_endpoint_url + "/v1/maps/publish/georef",
-                    files=[],
-                    data=data_,
-                    headers=auth,
-                )
-                logging.debug(f"Response text from CDR {r.text}")
-                r.raise_for_status()
-        except Exception as e:
-            logging.exception(e)
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"projection not updated in cdr")
+    data_ = {"georef_result": data}  # Marking the part as JSON
+    files_ = []
+    for file_path, file_name in files:
+        files_.append(("files", (file_name, open(file_path, "rb"))))
+    try:
+        logging.debug(f"files to be sent {files_}")
+        logging.debug(f"data to be sent {data_}")
+        r = await cdr.apost(
+            "/v1/maps/publish/georef",
+            files=files_,
+            data=data_,
+            timeout=cdr.publish_timeout,
+        )
+        logging.debug(f"Response text from CDR {r.text}")
+        r.raise_for_status()
+    except Exception as e:
+        logging.exception(e)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"projection not updated in cdr")
 
 
-def get_gcp_from_cdr(gcp_id):
-    endpoint = f"{app_settings.cdr_endpoint_url}/v1/maps/cog/gcp/{gcp_id}"
-    response = httpx.get(endpoint, headers=auth)
-    if response.status_code == 200:
-        return response.json()
+def format_gcp_for_georef_result(source, gcp):
+    gcp_ = dict(gcp)
+    gcp_["map_geom"] = {
+        "latitude": gcp_.get("latitude"),
+        "longitude": gcp_.get("longitude"),
+    }
+    gcp_["px_geom"] = {
+        "rows_from_top": gcp_.get("rows_from_top"),
+        "columns_from_left": gcp_.get("columns_from_left"),
+    }
+    if source == "cdr" and isinstance(gcp_.get("model"), dict):
+        gcp_["model_version"] = gcp_["model"]["model_version"]
+        gcp_["model"] = gcp_["model"]["model_name"]
 
-    return None
+    for key in ["rows_from_top", "columns_from_left", "latitude", "longitude", "registration_id", "reference_id"]:
+        gcp_.pop(key, None)
+    return gcp_
 
 
 def build_cdr_georef_result(proj_id):
     # get projection from es
     projection = return_ES_doc_by_id(app_settings.polymer_projections_index, proj_id)
-    all_gcps = []
     georef_result = None
     if projection:
-        for gcp_id in projection.get("gcps_ids"):
-            #  get gcp from es
-            gcp_ = return_ES_doc_by_id(app_settings.polymer_gcps_index, gcp_id)
-            if gcp_ is not None:
-                # found in es which means it has been edited or created in polymer
-                gcp_["map_geom"] = {
-                    "latitude": gcp_.get("latitude"),
-                    "longitude": gcp_.get("longitude"),
-                }
-                gcp_["px_geom"] = {
-                    "rows_from_top": gcp_.get("rows_from_top"),
-                    "columns_from_left": gcp_.get("columns_from_left"),
-                }
-                del gcp_["rows_from_top"]
-                del gcp_["columns_from_left"]
-                del gcp_["latitude"]
-                del gcp_["longitude"]
-                del gcp_["registration_id"]
-                del gcp_["reference_id"]
-                all_gcps.append(gcp_)
-            else:
-                # get gcp from cdr since not in es
-                gcp_ = get_gcp_from_cdr(gcp_id=gcp_id)
-                if gcp_:
-                    gcp_["map_geom"] = {
-                        "latitude": gcp_.get("latitude"),
-                        "longitude": gcp_.get("longitude"),
-                    }
-                    gcp_["px_geom"] = {
-                        "rows_from_top": gcp_.get("rows_from_top"),
-                        "columns_from_left": gcp_.get("columns_from_left"),
-                    }
-                    gcp_["model_version"] = gcp_["model"]["model_version"]
-                    gcp_["model"] = gcp_["model"]["model_name"]
-
-                    del gcp_["rows_from_top"]
-                    del gcp_["columns_from_left"]
-                    del gcp_["latitude"]
-                    del gcp_["longitude"]
-                    del gcp_["registration_id"]
-                    del gcp_["reference_id"]
-
-                    all_gcps.append(gcp_)
+        # gcps found in es have been edited or created in polymer, the rest come from the cdr
+        resolver = GCPResolver(projection.get("cog_id"))
+        resolved = resolver.resolve(projection.get("gcps_ids"), prefer="polymer")
+        all_gcps = [
+            format_gcp_for_georef_result(*resolved[str(gcp_id)])
+            for gcp_id in projection.get("gcps_ids")
+            if str(gcp_id) in resolved
+        ]
 
         georef_result = {
             "likely_CRSs": [],
@@ -351,7 +320,7 @@ def build_cdr_georef_result(proj_id):
 
 
 async def send_georef_to_cdr(proj_id):
-    data, cog_id = build_cdr_georef_result(proj_id=proj_id)
+    data, cog_id = await run_in_threadpool(build_cdr_georef_result, proj_id=proj_id)
     if data is not None:
         s3_key = f"{app_settings.polymer_s3_cog_projections_prefix}/{cog_id}/{proj_id}"
         all_files = []
@@ -360,7 +329,7 @@ async def send_georef_to_cdr(proj_id):
             proj_file_name = f"{s3_key.split('/')[-1]}"
             raw_path = os.path.join(tmpdir, proj_file_name)
             s3 = s3_client()
-            s3.download_file(app_settings.polymer_public_bucket, s3_key, raw_path)
+            await run_in_threadpool(s3.download_file, app_settings.polymer_public_bucket, s3_key, raw_path)
             pro_cog_path = os.path.join(tmpdir, proj_file_name)
 
             all_files.append((pro_cog_path, proj_file_name))
@@ -371,31 +340,23 @@ async def send_georef_to_cdr(proj_id):
 
 
 async def post_feature_results(data):
-    async with httpx.AsyncClient(timeout=None) as client:
-        try:
-            r = await client.post(
-                app_settings.cdr_endpoint_url + "/v1/maps/publish/features",
-                data=json.dumps(data),
-                headers=auth,
-            )
-            logging.debug(f"Response text from CDR {r.text}")
-            r.raise_for_status()
-        except Exception as e:
-            logging.error(e)
+    try:
+        r = await cdr.apost("/v1/maps/publish/features", content=json.dumps(data), timeout=cdr.publish_timeout)
+        logging.debug(f"Response text from CDR {r.text}")
+        r.raise_for_status()
+    except Exception as e:
+        logging.error(e)
 
 
 async def publish_legend_items(data):
-    async with httpx.AsyncClient(timeout=None) as client:
-        try:
-            r = await client.post(
-                app_settings.cdr_endpoint_url + "/v1/features/publish/legend_items",
-                data=json.dumps(data),
-                headers=auth,
-            )
-            logging.debug(f"Response text from CDR {r.text}")
-            r.raise_for_status()
-        except Exception as e:
-            logging.error(e)
+    try:
+        r = await cdr.apost(
+            "/v1/features/publish/legend_items", content=json.dumps(data), timeout=cdr.publish_timeout
+        )
+        logging.debug(f"Response text from CDR {r.text}")
+        r.raise_for_status()
+    except Exception as e:
+        logging.error(e)
 
 
 async def send_feature_results_to_cdr(data):
@@ -419,23 +380,13 @@ def getMapUnits(age_texts, ages):
     return map_units
 
 
-# todo update to point to cdr for this data
 def getMapUnit(age_text, ages):
-    if age_text == "":
-        return None
-
-    if age_text not in ages.keys():
-        return None
-    return {
-        "age_text": age_text,
-        "t_age": ages[age_text].get("max_ma", None),
-        "b_age": ages[age_text].get("min_ma", None),
-    }
+    """`ages` is the SGMCAgeIndex from common.sgmc_ages"""
+    return ages.map_unit(age_text)
 
 
 def get_projections_from_cdr(cog_id):
-    url = app_settings.cdr_endpoint_url + f"/v1/maps/cog/projections/{cog_id}"
-    response = httpx.get(url, headers=auth)
+    response = cdr.get(f"/v1/maps/cog/projections/{cog_id}")
     response_data = []
     if response.status_code == 200:
         response_data = response.json()
@@ -447,39 +398,39 @@ def get_projections_from_cdr(cog_id):
     return []
 
 
-def add_gcps_to_projections(cog_id, polymer_projections):
+def add_gcps_to_projections(cog_id, polymer_projections, resolver=None):
+    """
+    Attach gcps to polymer projections, cdr gcps take precedence over polymer ones.
+    A single `GCPResolver` serves every projection of the cog.
+    """
+    resolver = resolver or GCPResolver(cog_id)
+    all_gcp_ids = [gcp_id for projection in polymer_projections for gcp_id in projection.get("gcps_ids")]
+    resolved = resolver.resolve(all_gcp_ids)
+
     projections = []
     for projection in polymer_projections:
-        projection["gcps"] = []
-        for gcp_id in projection.get("gcps_ids"):
-            projection["gcps"].append(cdr_GCP_by_id(cog_id, gcp_id))
+        projection["gcps"] = [
+            resolved[str(gcp_id)][1] for gcp_id in projection.get("gcps_ids") if str(gcp_id) in resolved
+        ]
         projections.append(projection)
 
     return projections
 
 
-def get_projections_from_polymer(cog_id):
-    polymer_projections = search_by_cog_id(app_settings.polymer_projections_index, cog_id)
-    polymer_projections = add_gcps_to_projections(cog_id, polymer_projections)
+def prepare_polymer_projections(cog_id, polymer_projections, resolver=None):
+    polymer_projections = add_gcps_to_projections(cog_id, polymer_projections, resolver)
     for proj in polymer_projections:
         proj["in_cdr"] = False
     return polymer_projections
 
 
-def get_cdr_gcps(cog_id):
-    url = app_settings.cdr_endpoint_url + f"/v1/maps/cog/gcps/{cog_id}"
-    response = httpx.get(url, headers=auth)
-    response_data = []
-    if response.status_code == 200:
-        response_data = response.json()
-        if response_data is None:
-            response_data = []
-    return response_data
+def get_projections_from_polymer(cog_id, resolver=None):
+    polymer_projections = search_by_cog_id(app_settings.polymer_projections_index, cog_id)
+    return prepare_polymer_projections(cog_id, polymer_projections, resolver)
 
 
 def get_cog_meta(cog_id):
-    url = app_settings.cdr_endpoint_url + f"/v1/maps/cog/meta/{cog_id}"
-    response = httpx.get(url, headers=auth)
+    response = cdr.get(f"/v1/maps/cog/meta/{cog_id}", cache_ttl=app_settings.cdr_cache_ttl)
     response_data = {"cog_id": cog_id}
     if response.status_code == 200:
         response_data = response.json()
@@ -490,7 +441,12 @@ def get_cog_meta(cog_id):
 
 def get_area_extractions(cache, cog_id):
     height = cog_height(cache=cache, cog_id=cog_id)
-    map_areas = search_by_cog_id(app_settings.polymer_area_extractions, cog_id=cog_id)
+    # the from_bottom fields are recomputed below, don't transfer them
+    map_areas = search_by_cog_id(
+        app_settings.polymer_area_extractions,
+        cog_id=cog_id,
+        source={"excludes": ["coordinates_from_bottom", "extent_from_bottom"]},
+    )
     for area in map_areas:
         area["coordinates_from_bottom"] = inverse_geojson(area.get("coordinates"), height)
         area["extent_from_bottom"] = inverse_bbox(area["bbox"], height)
@@ -555,38 +511,164 @@ def project_cog(cache, req):
     return {"pro_cog_path": f"{app_settings.polymer_s3_endpoint_url}/{s3_pro_unique_key}"}
 
 
+# http range reads of remote cogs: skip the directory listing, merge neighbouring
+# ranges into one request and keep the fetched blocks in GDAL's VSI cache
+cog_gdal_env = {
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(app_settings.gdal_vsi_cache_size),
+}
+
+
+def cog_url(cog_id):
+    s3_key = f"{app_settings.cdr_s3_cog_prefix}/{cog_id}.cog.tif"
+    return f"{app_settings.cdr_s3_endpoint_url}/{app_settings.cdr_public_bucket}/{s3_key}"
+
+
+def cog_path(cog_id):
+    """The disk cached cog when there is one, otherwise its url"""
+    path = os.path.join(app_settings.disk_cache_dir, f"{cog_id}.cog.tif")
+    return path if os.path.isfile(path) else cog_url(cog_id)
+
+
+def ocr_windows(src, bboxes):
+    """Windows of the bboxes, which are in pixels with the origin at the bottom left"""
+    windows = []
+    for box in bboxes:
+        left, top = int(box[0]), int(src.height - box[3])
+        windows.append(Window(left, top, int(box[2] - box[0]), int(box[3] - box[1])))
+    return windows
+
+
+def read_windows(src, windows):
+    """
+    Pixels of each window as (bands, rows, cols). When the windows are close together
+    their union is read once, otherwise they are read in row order so the reads move
+    through the file in one direction.
+    """
+    indexes = list(range(1, min(src.count, 3) + 1))
+    if not windows:
+        return []
+
+    col_off = min(w.col_off for w in windows)
+    row_off = min(w.row_off for w in windows)
+    union = Window(
+        col_off,
+        row_off,
+        max(w.col_off + w.width for w in windows) - col_off,
+        max(w.row_off + w.height for w in windows) - row_off,
+    )
+    if union.width * union.height <= app_settings.ocr_union_read_factor * sum(w.width * w.height for w in windows):
+        data = src.read(indexes, window=union, boundless=True, fill_value=255)
+        pixels = []
+        for w in windows:
+            top, left = w.row_off - row_off, w.col_off - col_off
+            pixels.append(data[:, top : top + w.height, left : left + w.width])
+        return pixels
+
+    pixels = [None] * len(windows)
+    for i in sorted(range(len(windows)), key=lambda i: (windows[i].row_off, windows[i].col_off)):
+        pixels[i] = src.read(indexes, window=windows[i], boundless=True, fill_value=255)
+    return pixels
+
+
+def to_uint8(pixels):
+    """
+    Pixels an image can be made of, PIL only takes multi band arrays as uint8. Only
+    the first band of 2 band rasters (gray and alpha) is kept, other dtypes are
+    stretched to 0-255.
+    """
+    if len(pixels) == 2:
+        pixels = pixels[:1]
+    if pixels.dtype == np.uint8:
+        return pixels
+    pixels = pixels.astype(np.float64)
+    low, high = np.nanmin(pixels), np.nanmax(pixels)
+    if high > low:
+        pixels = (pixels - low) * (255 / (high - low))
+    else:
+        pixels = np.full_like(pixels, 255)
+    return np.nan_to_num(pixels, nan=255).astype(np.uint8)
+
+
+def ocr_image(pixels):
+    """Runs in the OCR process pool, pixels are (bands, rows, cols)"""
+    pixels = to_uint8(pixels)
+    image = Image.fromarray(pixels[0] if len(pixels) == 1 else np.moveaxis(pixels, 0, -1))
+    return pytesseract.image_to_string(image).replace("\n", " ")
+
+
+ocr_executor = None
+ocr_executor_lock = threading.Lock()
+
+
+def get_ocr_executor():
+    global ocr_executor
+    with ocr_executor_lock:
+        if ocr_executor is None:
+            # workers are spawned, forking would copy the locks and clients of the web server threads
+            ocr_executor = ProcessPoolExecutor(
+                max_workers=app_settings.ocr_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return ocr_executor
+
+
+def shutdown_ocr_executor():
+    global ocr_executor
+    with ocr_executor_lock:
+        executor, ocr_executor = ocr_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_ocr_bboxes(cog_id, bboxes):
+    """Yields (index of the bbox, text) in the order the OCR finishes"""
+    with rio.Env(**cog_gdal_env):
+        with rio.open(cog_path(cog_id)) as src:
+            pixels = read_windows(src, ocr_windows(src, bboxes or []))
+
+    executor = get_ocr_executor()
+    futures = {executor.submit(ocr_image, p): i for i, p in enumerate(pixels)}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+
 def ocr_bboxes(req):
-    bboxes = req.bboxes
-    s3_key = f"{app_settings.cdr_s3_cog_prefix}/{req.cog_id}.cog.tif"
-
-    with rio.open(f"{app_settings.cdr_s3_endpoint_url}/{app_settings.cdr_public_bucket}/{s3_key}") as src:
-        all_texts = []
-        for box in bboxes:
-            top = src.height - box[3]
-            left = box[0]
-            width = box[2] - box[0]
-            height = box[3] - box[1]
-
-            window = Window(left, top, width, height)
-            w = src.read(1, window=window)
-            image = Image.fromarray(w)
-            all_texts.append(pytesseract.image_to_string(image).replace("\n", " "))
+    all_texts = [""] * len(req.bboxes or [])
+    for i, text in iter_ocr_bboxes(req.cog_id, req.bboxes):
+        all_texts[i] = text
 
     return {"extracted_text": all_texts}
 
 
-def cog_height_not_in_memory(cog_id):
-    s3_key = f"{app_settings.cdr_s3_cog_prefix}/{cog_id}.cog.tif"
-    gdal_env = {
-        "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
-    }
+# a cog's header never changes, it is read once and shared with the other workers
+cog_headers = SharedCache("cog_headers", ttl=app_settings.cog_header_ttl, maxsize=4096)
 
-    print(f"{app_settings.cdr_s3_endpoint_url}/{app_settings.cdr_public_bucket}/{s3_key}")
 
-    with rio.Env(**gdal_env) as rio_env:
-        with rio.open(f"{app_settings.cdr_s3_endpoint_url}/{app_settings.cdr_public_bucket}/{s3_key}") as src:
-            height = src.height
-            return height
+def read_cog_header(cog_id):
+    with rio.Env(**cog_gdal_env):
+        with rio.open(cog_path(cog_id)) as src:
+            return {
+                "width": src.width,
+                "height": src.height,
+                "count": src.count,
+                "dtypes": list(src.dtypes),
+                "crs": src.crs.to_string() if src.crs else None,
+                "transform": list(src.transform)[:6],
+                "block_shapes": [list(shape) for shape in src.block_shapes],
+                "overviews": src.overviews(1),
+            }
+
+
+def get_cog_header(cog_id):
+    """Dimensions and profile of a cog, from the disk cache or its http header"""
+    return cog_headers.get_or_load(cog_id, lambda: read_cog_header(cog_id))
+
+
+def cog_height_not_in_memory(cog_id):
+    return get_cog_header(cog_id)["height"]
 
 
 def determine_display_format(crs):
@@ -1,17 +1,21 @@
+import hashlib
 import itertools
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from logging import Logger
 from typing import Any
 
-import httpx
 import numpy as np
+from cachetools import TTLCache
 from cdr_schemas.cdr_responses.features import PolygonExtractionResponse
 from cdr_schemas.cdr_responses.legend_items import LegendItemResponse
 from cdr_schemas.feature_results import FeatureResults
-from cdr_schemas.features.polygon_features import PolygonLegendAndFeaturesResult
+from cdr_schemas.features.polygon_features import PolygonFeatureCollection, PolygonLegendAndFeaturesResult
 from pydantic import BaseModel
 from tifffile import imread as tiffread
 
+from auto_georef.common import cdr
 from auto_georef.common.tiff_cache import get_cached_tiff
 from auto_georef.common.utils import timeit
 from auto_georef.http.routes.cache import cache
@@ -19,23 +23,31 @@ from auto_georef.settings import app_settings
 
 logger: Logger = logging.getLogger(__name__)
 
+# the best intersecting legend item per legend id, legend relationships rarely change
+legend_intersect_cache = TTLCache(maxsize=10_000, ttl=3600)
+legend_intersect_lock = threading.Lock()
+
 
 class CDRClient:
     def __init__(self, cog_id: str):
         self.cog_id = cog_id
         self.headers = {"accept": "application/json", "Authorization": app_settings.cdr_bearer_token}
-        self.base_url = f"{app_settings.cdr_endpoint_url}/v1/features"
-        self.client = httpx.Client(timeout=None)
+        self.base_url = "/v1/features"
 
     def post(self, endpoint: str, data: dict[str, Any] | BaseModel | None = None):
-        json = data.model_dump() if isinstance(data, BaseModel) else data
-        response = self.client.post(f"{self.base_url}/{endpoint}", headers=self.headers, json=json)
+        url = f"{self.base_url}/{endpoint}"
+        if isinstance(data, BaseModel):
+            # serialize with pydantic-core directly instead of model_dump() + json.dumps
+            headers = {**self.headers, "content-type": "application/json"}
+            response = cdr.post(url, headers=headers, content=data.model_dump_json(), timeout=cdr.publish_timeout)
+        else:
+            response = cdr.post(url, headers=self.headers, json=data, timeout=cdr.publish_timeout)
         response.raise_for_status()
         return response.json()
 
     def get(self, endpoint: str, data: dict | None = None):
         url_search_params = "&".join([f"{k}={v}" for k, v in data.items()])
-        response = self.client.get(f"{self.base_url}/{endpoint}?{url_search_params}", headers=self.headers)
+        response = cdr.get(f"{self.base_url}/{endpoint}?{url_search_params}", headers=self.headers)
         response.raise_for_status()
         return response.json()
 
@@ -43,9 +55,12 @@ class CDRClient:
         response: list[tuple[str, str]] = self.get(f"{self.cog_id}/system_versions", {"type": type})
         return response
 
-    @timeit(logger)
-    def get_polygons(self, system: str, version: str, max_polygons: int):
-        SIZE = 100_000
+    def iter_extractions(self, ftype: str, system: str, version: str, max_num: int):
+        """
+        Yield `ftype` ("polygon", "line" or "point") extractions as raw dicts, one page
+        at a time, so only a single page of the CDR response is held in memory.
+        """
+        SIZE = app_settings.cdr_polygon_page_size
 
         def get_data(page: int):
             return {
@@ -57,15 +72,21 @@ class CDRClient:
                 "size": SIZE,
             }
 
-        all_extractions: list[PolygonExtractionResponse] = []
+        count = 0
         for i in itertools.count():
-            extractions = self.get(f"{self.cog_id}/polygon_extractions", get_data(i))
-            all_extractions.extend([PolygonExtractionResponse(**e) for e in extractions])
+            extractions = self.get(f"{self.cog_id}/{ftype}_extractions", get_data(i))
+            yield from extractions[: max_num - count]
+            count += len(extractions)
 
-            if len(extractions) < SIZE or len(all_extractions) >= max_polygons:
+            if len(extractions) < SIZE or count >= max_num:
                 break
 
-        return all_extractions[:max_polygons]
+    def iter_polygons(self, system: str, version: str, max_polygons: int):
+        return self.iter_extractions("polygon", system, version, max_polygons)
+
+    @timeit(logger)
+    def get_polygons(self, system: str, version: str, max_polygons: int):
+        return [PolygonExtractionResponse(**e) for e in self.iter_polygons(system, version, max_polygons)]
 
     def get_legend_items(self, system: str, version: str) -> list[LegendItemResponse]:
         data = {
@@ -77,22 +98,67 @@ class CDRClient:
         response = self.get(f"{self.cog_id}/legend_items", data)
         return response
 
+    @timeit(logger)
     def publish_polygons(self, system: str, version: str, results: list[PolygonLegendAndFeaturesResult]):
-        for result in results:
+        """
+        Publish the legend results in chunks of bounded size, several chunks at a time.
+        Large legend items are split so no single request carries too many features or vertices.
+        """
+        chunks = [chunk for result in results for chunk in chunk_polygon_result(result)]
+        total = len(chunks)
+
+        def publish(numbered_chunk):
+            i, chunk = numbered_chunk
             feature_result = FeatureResults(
-                system=system, system_version=version, cog_id=self.cog_id, polygon_feature_results=[result]
+                system=system, system_version=version, cog_id=self.cog_id, polygon_feature_results=[chunk]
             )
             json = self.post(f"publish/polygon_features", feature_result)
             features = json["features_saved"]
-            logger.info(f"Published {features} features")
+            logger.info(f"Published chunk {i + 1}/{total} of legend item {chunk.id}: {features} features")
+            return features
+
+        if not chunks:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(app_settings.cdr_publish_concurrency, total)) as executor:
+            return sum(executor.map(publish, enumerate(chunks)))
 
     def legend_item_intersect(self, legend_id: str):
+        with legend_intersect_lock:
+            if legend_id in legend_intersect_cache:
+                return legend_intersect_cache[legend_id]
+
         data = {"legend_id": legend_id}
         items = self.get(f"legend_item_intersect", data)
         item = max(items, key=lambda item: item["ratio"])
         logger.info(f"Intersected legend item {item} with ratio {item['ratio']}")
+
+        with legend_intersect_lock:
+            legend_intersect_cache[legend_id] = item
         return item
 
+    def legend_items_intersect(self, legend_ids: list[str], max_workers: int = 8):
+        """
+        Intersect many legend ids at once, cached ids cost nothing and the rest are
+        requested concurrently. Returns {legend_id: item}, ids without a match are omitted.
+        """
+
+        def intersect(legend_id: str):
+            try:
+                return legend_id, self.legend_item_intersect(legend_id)
+            except ValueError:
+                # nothing intersects this legend item
+                return legend_id, None
+            except Exception:
+                logger.exception(f"Failed to intersect legend item {legend_id}")
+                return legend_id, None
+
+        legend_ids = list(dict.fromkeys(legend_ids))
+        if not legend_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(legend_ids))) as executor:
+            results = executor.map(intersect, legend_ids)
+            return {legend_id: item for legend_id, item in results if item is not None}
+
     def legend_item_intersect_point(self, x: float, y: float):
         data = {"cog_id": self.cog_id, "rows_from_top": round(y), "columns_from_left": round(x)}
         items = self.post(f"legend_item_intersect_point", data)
@@ -101,6 +167,45 @@ class CDRClient:
         return item
 
 
+def polygon_vertex_count(feature):
+    return sum(len(ring) for ring in feature.geometry.coordinates)
+
+
+def chunk_polygon_result(result: PolygonLegendAndFeaturesResult):
+    """
+    Split a legend result into copies that each hold at most `cdr_publish_chunk_features`
+    features and about `cdr_publish_chunk_vertices` vertices, which bounds the request size.
+    """
+    features = result.polygon_features.features if result.polygon_features else []
+    max_features = app_settings.cdr_publish_chunk_features
+    max_vertices = app_settings.cdr_publish_chunk_vertices
+
+    chunk, vertices = [], 0
+    for feature in features:
+        count = polygon_vertex_count(feature)
+        if chunk and (len(chunk) >= max_features or vertices + count > max_vertices):
+            yield result.model_copy(update={"polygon_features": PolygonFeatureCollection(features=chunk)})
+            chunk, vertices = [], 0
+        chunk.append(feature)
+        vertices += count
+
+    if chunk or not features:
+        yield result.model_copy(update={"polygon_features": PolygonFeatureCollection(features=chunk)})
+
+
+def geometry_hash(coordinates):
+    """
+    Canonical hash of polygon coordinates, computed over the packed float64 values of
+    each ring (prefixed with its length) instead of the model's string representation.
+    """
+    h = hashlib.sha256()
+    for ring in coordinates:
+        points = np.asarray(ring, dtype=np.float64)
+        h.update(np.int64(len(points)).tobytes())
+        h.update(points.tobytes())
+    return h.hexdigest()
+
+
 def normalize_image(image):
     """
     Normalize the image to have 3 channels
@@ -0,0 +1,173 @@
+import json
+import logging
+import threading
+import time
+from logging import Logger
+
+from auto_georef.common import cdr
+from auto_georef.redisapi import redis_client
+from auto_georef.settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+
+redis_key = "sgmc_ages"
+
+
+def normalize_age_text(age_text):
+    return " ".join(str(age_text).split()).lower()
+
+
+class SGMCAgeIndex:
+    """
+    SGMC age table from the CDR, indexed by normalized age text so lookups
+    ignore case and whitespace differences.
+    """
+
+    def __init__(self, ages):
+        self.ages = ages or {}
+        self.index = {normalize_age_text(age_text): age_text for age_text in self.ages}
+
+    def __len__(self):
+        return len(self.ages)
+
+    def map_unit(self, age_text):
+        if not age_text:
+            return None
+        key = self.index.get(normalize_age_text(age_text))
+        if key is None:
+            return None
+        return {
+            "age_text": key,
+            "t_age": self.ages[key].get("max_ma", None),
+            "b_age": self.ages[key].get("min_ma", None),
+        }
+
+
+class SGMCAgesCache:
+    """
+    Keeps the SGMC age table in memory for `ttl` seconds.
+
+    Only the first call waits on the CDR. Once the table is stale it keeps being served
+    while a background thread revalidates it with If-None-Match/If-Modified-Since, and
+    a failed refresh keeps the previous table. With `use_redis` the table is shared
+    through Redis so only one worker has to ask the CDR per ttl, a copy from Redis keeps
+    the time it was fetched from the CDR so it isn't served for longer than `ttl`.
+    """
+
+    def __init__(self, ttl, use_redis=False):
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.clear()
+
+    def clear(self):
+        self.index = None
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = 0.0
+
+    def is_stale(self):
+        return time.monotonic() - self.fetched_at > self.ttl
+
+    def get(self):
+        if self.index is None:
+            with self.lock:
+                if self.index is None:
+                    self.refresh()
+        elif self.is_stale():
+            self.refresh_in_background()
+        return self.index or SGMCAgeIndex({})
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self.refreshing = False
+
+    def refresh(self):
+        if self.use_redis and self.load_from_redis():
+            return
+        try:
+            self.fetch_from_cdr()
+        except Exception:
+            logger.exception("Failed to refresh SGMC ages from the CDR")
+            return
+        if self.use_redis:
+            self.save_to_redis()
+
+    def fetch_from_cdr(self):
+        headers = {}
+        if self.index is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+
+        response = cdr.get("/v1/sgmc/sgmc_ages", headers=headers)
+        if response.status_code == 304:
+            self.fetched_at = time.monotonic()
+            return
+        if response.status_code != 200:
+            logger.error("Connection to CDR is down.")
+            return
+
+        self.set(response.json(), response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    def set(self, ages, etag=None, last_modified=None, age=0.0):
+        """`age` is how many seconds ago the table was fetched from the CDR"""
+        self.index = SGMCAgeIndex(ages)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic() - age
+        logger.info(f"Loaded {len(self.index)} SGMC ages")
+
+    def load_from_redis(self):
+        try:
+            payload = redis_client.get(redis_key)
+        except Exception:
+            logger.exception("Failed to read SGMC ages from redis")
+            return False
+        if not payload:
+            return False
+        cached = json.loads(payload)
+        age = max(time.time() - cached.get("fetched_at", 0.0), 0.0)
+        if age > self.ttl:
+            # as stale as ours, revalidate it with the CDR instead
+            return False
+        self.set(cached["ages"], cached.get("etag"), cached.get("last_modified"), age=age)
+        return True
+
+    def save_to_redis(self):
+        if self.index is None:
+            return
+        payload = {
+            "ages": self.index.ages,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            # wall clock time, the monotonic clock isn't shared between processes
+            "fetched_at": time.time() - (time.monotonic() - self.fetched_at),
+        }
+        try:
+            redis_client.set(redis_key, json.dumps(payload), ex=self.ttl)
+        except Exception:
+            logger.exception("Failed to save SGMC ages to redis")
+
+
+sgmc_ages = SGMCAgesCache(ttl=app_settings.sgmc_ages_ttl, use_redis=app_settings.sgmc_ages_redis)
+
+
+def get_sgmc_age_index():
+    return sgmc_ages.get()
+
+
+def get_sgmc_ages():
+    """SGMC age table keyed by age text, as returned by the CDR."""
+    return get_sgmc_age_index().ages
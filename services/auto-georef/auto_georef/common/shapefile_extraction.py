@@ -1,17 +1,18 @@
-import json
 import logging
 import os
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from logging import Logger
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import rasterio.transform as riot
+import shapely
+from cdr_schemas.feature_results import FeatureResults
 from fastapi import HTTPException
+from pydantic import ValidationError
 from pyproj import Transformer
-from shapely import to_geojson
-from shapely.affinity import affine_transform
-from shapely.geometry import LineString, Point, Polygon
 
 logger: Logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.ERROR)
@@ -24,13 +25,33 @@ required_column_names = {
 }
 
 
+# the members of a shapefile that are read, everything else in the zip is left compressed
+shapefile_extensions = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+upload_chunk_size = 1 << 20
+
+
+async def save_upload_file(upload, path):
+    """Write an UploadFile to `path` chunk by chunk instead of reading it into memory"""
+    with open(path, "wb") as f:
+        while chunk := await upload.read(upload_chunk_size):
+            f.write(chunk)
+
+
 def unzip_file(zip_file_path, extract_to):
     if not os.path.exists(extract_to):
         os.makedirs(extract_to)
 
     with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
-        zip_ref.extractall(extract_to)
-        logger.info(f"Extracted all files to {extract_to}")
+        members = [
+            info
+            for info in zip_ref.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(shapefile_extensions)
+            and not info.filename.startswith("__MACOSX/")
+        ]
+        for member in members:
+            zip_ref.extract(member, extract_to)
+        logger.info(f"Extracted {len(members)} shapefile members to {extract_to}")
 
 
 def walk_shp_prj_files(extracted_folder):
@@ -49,24 +70,26 @@ def walk_shp_prj_files(extracted_folder):
     return shapefile_paths
 
 
-def load_shapefiles(shapefiles):
-    geodataframes = []
-    target_crs = ""
-    if shapefiles:
-        gdf_crs = gpd.read_file(shapefiles[0])
-        target_crs = gdf_crs.crs
-    else:
-        raise ValueError(f"Shapefiles not found.")
+def read_shapefile(shp_file):
+    gdf = gpd.read_file(shp_file, engine="pyogrio")
 
-    if not target_crs:
+    if gdf.crs is None:
         raise ValueError(f"Shapefile {shp_file} does not have a CRS. All shapefiles must have a valid CRS.")
+    return gdf
+
 
-    for shp_file in shapefiles:
-        gdf = gpd.read_file(shp_file)
+def load_shapefiles(shapefiles, max_workers=4):
+    if not shapefiles:
+        raise ValueError(f"Shapefiles not found.")
 
-        if gdf.crs is None:
-            raise ValueError(f"Shapefile {shp_file} does not have a CRS. All shapefiles must have a valid CRS.")
+    # GDAL releases the GIL while reading, the shapefiles are read in parallel and
+    # the first one is only read once, its CRS is the target CRS
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(shapefiles))) as executor:
+        gdfs = list(executor.map(read_shapefile, shapefiles))
+    target_crs = gdfs[0].crs
 
+    geodataframes = []
+    for shp_file, gdf in zip(shapefiles, gdfs):
         if gdf.crs != target_crs:
             logger.info(f"Reprojecting {shp_file} from {gdf.crs} to {target_crs}")
             gdf = gdf.to_crs(target_crs)  # Reproject to the target CRS
@@ -113,24 +136,44 @@ def validate_columns(columns, feature_type, df):
 
 def apply_transform_to_gdf(gdf, transform):
     inverse_transform = ~transform
+    matrix = np.array([[inverse_transform.a, inverse_transform.b], [inverse_transform.d, inverse_transform.e]])
+    offset = np.array([inverse_transform.xoff, inverse_transform.yoff])
 
-    gdf["geometry"] = gdf["geometry"].apply(
-        lambda geom: affine_transform(
-            geom,
-            [
-                inverse_transform.a,
-                inverse_transform.b,
-                inverse_transform.d,
-                inverse_transform.e,
-                inverse_transform.xoff,
-                inverse_transform.yoff,
-            ],
-        )
-    )
+    # one pass over all coordinates instead of an affine_transform call per geometry
+    geometries = shapely.transform(np.asarray(gdf.geometry.values), lambda coords: coords @ matrix.T + offset)
+    gdf["geometry"] = gpd.GeoSeries(geometries, index=gdf.index, crs=gdf.crs)
 
     return gdf
 
 
+def point_coordinates(geometries):
+    """GeoJSON coordinates of each point"""
+    return shapely.get_coordinates(np.asarray(geometries)).tolist()
+
+
+def line_coordinates(geometries):
+    """GeoJSON coordinates of each line string (or ring)"""
+    geometries = np.asarray(geometries)
+    coordinates = shapely.get_coordinates(geometries)
+    splits = np.cumsum(shapely.get_num_coordinates(geometries))[:-1]
+    return [c.tolist() for c in np.split(coordinates, splits)]
+
+
+def polygon_coordinates(geometries):
+    """GeoJSON coordinates of each polygon, exterior ring first"""
+    geometries = np.asarray(geometries)
+    rings, ring_index = shapely.get_rings(geometries, return_index=True)
+    polygons = [[] for _ in range(len(geometries))]
+    for i, ring in zip(ring_index, line_coordinates(rings)):
+        polygons[i].append(ring)
+    return polygons
+
+
+def to_int_or_none(values: pd.Series):
+    numbers = pd.to_numeric(values, errors="coerce")
+    return [None if pd.isna(n) else int(n) for n in numbers]
+
+
 def cps_to_transform(cps, to_crs):
     cps_p = []
     for cp in cps:
@@ -181,36 +224,26 @@ def prepare_point_data(required_column_names, point_df, geo_transform):
         label = label_abbr.split("_")[0]
         abbr = label_abbr.split("_")[1]
 
-        point_features = []
-        for idx, row in group.iterrows():
-            geometry = Point(row["geometry"])
-
-            dip = None
-            try:
-                dip = int(row["DIP"])
-            except Exception:
-                logger.info(f'Error with dip {row["DIP"]}')
-
-            dip_dir = None
-            try:
-                dip_dir = int(row["DIP_DIRECT"])
-            except Exception:
-                logger.info(f'Error with dip direction {row["DIP_DIRECT"]}')
-
-            point_features.append(
-                {
-                    "type": "Feature",
-                    "id": str(idx),
-                    "geometry": json.loads(to_geojson(geometry)),
-                    "properties": {
-                        "model": "",
-                        "model_version": "",
-                        "dip": dip,
-                        "dip_direction": dip_dir,
-                        "validated": False,
-                    },
-                }
+        point_features = [
+            {
+                "type": "Feature",
+                "id": str(idx),
+                "geometry": {"type": "Point", "coordinates": coordinates},
+                "properties": {
+                    "model": "",
+                    "model_version": "",
+                    "dip": dip,
+                    "dip_direction": dip_dir,
+                    "validated": False,
+                },
+            }
+            for idx, coordinates, dip, dip_dir in zip(
+                group.index,
+                point_coordinates(group.geometry.values),
+                to_int_or_none(group["DIP"]),
+                to_int_or_none(group["DIP_DIRECT"]),
             )
+        ]
         collection = {"type": "FeatureCollection", "features": point_features}
         point_legend_results.append(
             {
@@ -244,35 +277,26 @@ def prepare_line_data(required_column_names, line_df, geo_transform):
         label = label_abbr.split("_")[0]
         abbr = label_abbr.split("_")[1]
 
-        line_features = []
-        for idx, row in group.iterrows():
-            geometry = LineString(row["geometry"])
-
-            pattern = ""
-            try:
-                pattern = row["DASH_PATT"]
-            except Exception:
-                logger.info(f'Error with dash patter {row["DASH_PATT"]}')
-
-            symbol = ""
-            try:
-                symbol = row["SYMBOL"]
-            except Exception:
-                logger.info("issue with symbol")
-            line_features.append(
-                {
-                    "type": "Feature",
-                    "id": str(idx),
-                    "geometry": json.loads(to_geojson(geometry)),
-                    "properties": {
-                        "model": "",
-                        "model_version": "",
-                        "dash_pattern": pattern,
-                        "symbol": symbol,
-                        "validated": False,
-                    },
-                }
+        line_features = [
+            {
+                "type": "Feature",
+                "id": str(idx),
+                "geometry": {"type": "LineString", "coordinates": coordinates},
+                "properties": {
+                    "model": "",
+                    "model_version": "",
+                    "dash_pattern": pattern,
+                    "symbol": symbol,
+                    "validated": False,
+                },
+            }
+            for idx, coordinates, pattern, symbol in zip(
+                group.index,
+                line_coordinates(group.geometry.values),
+                group["DASH_PATT"],
+                group["SYMBOL"],
             )
+        ]
         collection = {"type": "FeatureCollection", "features": line_features}
         line_legend_results.append(
             {
@@ -347,18 +371,15 @@ def prepare_polygon_data(required_column_names, df, geo_transform):
         color = (
             group.get("COLOR", pd.Series([])).mode()[0] if not group.get("COLOR", pd.Series([])).mode().empty else ""
         )
-        polygon_features = []
-        for idx, row in group.iterrows():
-            geometry = Polygon(row["geometry"])
-
-            polygon_features.append(
-                {
-                    "type": "Feature",
-                    "id": str(idx),
-                    "geometry": json.loads(to_geojson(geometry)),
-                    "properties": {"model": "", "model_version": "", "validated": False},
-                }
-            )
+        polygon_features = [
+            {
+                "type": "Feature",
+                "id": str(idx),
+                "geometry": {"type": "Polygon", "coordinates": coordinates},
+                "properties": {"model": "", "model_version": "", "validated": False},
+            }
+            for idx, coordinates in zip(group.index, polygon_coordinates(group.geometry.values))
+        ]
         collection = {"type": "FeatureCollection", "features": polygon_features}
         polygon_legend_results.append(
             {
@@ -374,3 +395,68 @@ def prepare_polygon_data(required_column_names, df, geo_transform):
             }
         )
     return polygon_legend_results
+
+
+def shapefiles_to_feature_results(shapefiles, gcps):
+    """
+    Load the shapefiles and convert them to CDR legend results in pixel space, using the
+    validated `gcps` of the map. CPU bound, run it off the event loop.
+    """
+    point_df, line_df, polygon_df, found_crs = load_shapefiles(shapefiles=shapefiles)
+
+    projection = {"crs": found_crs, "gcps": gcps}
+    geo_transform = get_transform(projection=projection)
+
+    results = {"point_feature_results": [], "line_feature_results": [], "polygon_feature_results": []}
+    if point_df is not None:
+        results["point_feature_results"] = prepare_point_data(required_column_names, point_df, geo_transform)
+    if line_df is not None:
+        results["line_feature_results"] = prepare_line_data(required_column_names, line_df, geo_transform)
+    if polygon_df is not None:
+        results["polygon_feature_results"] = prepare_polygon_data(required_column_names, polygon_df, geo_transform)
+    return results
+
+
+features_keys = {
+    "point_feature_results": "point_features",
+    "line_feature_results": "line_features",
+    "polygon_feature_results": "polygon_features",
+}
+
+
+def chunk_feature_results(results, chunk_size):
+    """
+    Split the legend results of `shapefiles_to_feature_results` into batches of at most
+    `chunk_size` features, large legend items are split across batches.
+    """
+    empty = lambda: {key: [] for key in results}
+    batch, size, sent = empty(), 0, False
+    for key, legend_results in results.items():
+        features_key = features_keys[key]
+        for legend_result in legend_results:
+            features = legend_result[features_key]["features"]
+            for i in range(0, max(len(features), 1), chunk_size):
+                chunk = features[i : i + chunk_size]
+                if size and size + len(chunk) > chunk_size:
+                    yield batch
+                    batch, size, sent = empty(), 0, True
+                batch[key].append({**legend_result, features_key: {"type": "FeatureCollection", "features": chunk}})
+                size += len(chunk)
+    if any(batch.values()) or not sent:
+        yield batch
+
+
+def feature_results_json(cog_id, batch):
+    f = FeatureResults(system="upload", system_version="1.0", cog_id=cog_id, **batch)
+    return f.model_dump_json()
+
+
+def feature_results_payloads(cog_id, results, chunk_size):
+    """
+    CDR payloads of every batch of the upload, see `chunk_feature_results`. All of them
+    are validated before any is published, so an invalid upload publishes nothing.
+    """
+    try:
+        return [feature_results_json(cog_id, batch) for batch in chunk_feature_results(results, chunk_size)]
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid features in the shapefiles: {e}")
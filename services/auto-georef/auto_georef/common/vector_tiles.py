@@ -0,0 +1,339 @@
+"""
+Pixel-space Mapbox Vector Tiles for CDR and Polymer extractions.
+
+Tiles use an XYZ grid anchored at the top left corner of the map image. At zoom
+`vector_tile_max_zoom` a tile covers 256x256 image pixels and each zoom level out
+doubles that, so zoom 0 covers 256 * 2**max_zoom pixels. Geometries are clipped to
+the tile (plus a buffer), simplified to one tile unit and encoded as MVT 2.1.
+
+Rendered tiles are cached on disk per layer, versioned by the digest of the layer's
+feature index so published or validated features show up without clearing anything by
+hand. The tile cache is kept under `vector_tile_cache_max_bytes`, least recently used
+tiles are removed first.
+"""
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from logging import Logger
+
+import numpy as np
+import shapely
+
+from auto_georef.common.feature_index import FeatureIndex, FType, get_feature_index
+from auto_georef.settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POINT, LINESTRING, POLYGON = 1, 2, 3
+
+
+def varint(value: int):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return (values << 1) ^ (values >> 63)
+
+
+def command(cmd: int, count: int):
+    return (count << 3) | cmd
+
+
+def field_varint(field: int, value: int):
+    return varint(field << 3) + varint(value)
+
+
+def field_bytes(field: int, data: bytes):
+    return varint(field << 3 | 2) + varint(len(data)) + data
+
+
+def field_packed(field: int, values):
+    return field_bytes(field, b"".join(varint(int(v)) for v in values))
+
+
+def encode_value(value):
+    if isinstance(value, bool):
+        return field_varint(7, int(value))
+    return field_bytes(1, str(value).encode())
+
+
+def tile_span(z: int):
+    """Size of a tile at zoom `z`, in image pixels"""
+    return TILE_SIZE * 2 ** (app_settings.vector_tile_max_zoom - z)
+
+
+def tile_bounds(z: int, x: int, y: int):
+    span = tile_span(z)
+    return x * span, y * span, (x + 1) * span, (y + 1) * span
+
+
+def is_valid_tile(z: int, x: int, y: int):
+    return 0 <= z <= app_settings.vector_tile_max_zoom and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def tile_points(coords, close: bool):
+    """Round coordinates to the tile grid and drop repeated points (and the closing point of rings)"""
+    points = np.rint(np.asarray(coords)[:, :2]).astype(np.int64)
+    if len(points) > 1:
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+        points = points[keep]
+    if close and len(points) > 1 and (points[0] == points[-1]).all():
+        points = points[:-1]
+    return points
+
+
+def signed_area(points):
+    x, y = points[:, 0], points[:, 1]
+    return np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y) / 2
+
+
+class GeometryEncoder:
+    """Builds the command stream of one feature, the cursor carries over between parts"""
+
+    def __init__(self):
+        self.commands: list[int] = []
+        self.cursor = np.zeros(2, dtype=np.int64)
+
+    def add_points(self, points):
+        if not len(points):
+            return
+        deltas = np.diff(points, axis=0, prepend=self.cursor[None])
+        self.commands.append(command(MOVE_TO, len(points)))
+        self.commands.extend(zigzag(deltas).ravel().tolist())
+        self.cursor = points[-1]
+
+    def add_path(self, points, close: bool):
+        self.add_points(points[:1])
+        deltas = np.diff(points, axis=0)
+        self.commands.append(command(LINE_TO, len(deltas)))
+        self.commands.extend(zigzag(deltas).ravel().tolist())
+        self.cursor = points[-1]
+        if close:
+            self.commands.append(command(CLOSE_PATH, 1))
+
+    def add_line(self, line):
+        points = tile_points(shapely.get_coordinates(line), close=False)
+        if len(points) >= 2:
+            self.add_path(points, close=False)
+
+    def add_ring(self, ring, exterior: bool):
+        points = tile_points(shapely.get_coordinates(ring), close=True)
+        if len(points) < 3:
+            return False
+        area = signed_area(points)
+        if area == 0:
+            return False
+        # exterior rings have a positive area in tile coordinates (clockwise with y down)
+        if (area > 0) != exterior:
+            points = points[::-1]
+        self.add_path(points, close=True)
+        return True
+
+    def add_polygon(self, polygon):
+        if not self.add_ring(polygon.exterior, exterior=True):
+            return
+        for interior in polygon.interiors:
+            self.add_ring(interior, exterior=False)
+
+
+def encode_geometry(geometry):
+    """(MVT geometry type, commands) of a shapely geometry in tile coordinates, no commands if nothing is left"""
+    encoder = GeometryEncoder()
+    parts = shapely.get_parts(geometry)
+    type_ids = shapely.get_type_id(parts)
+
+    if (type_ids == 0).any():
+        encoder.add_points(tile_points(shapely.get_coordinates(parts[type_ids == 0]), close=False))
+        return POINT, encoder.commands
+    if (type_ids == 3).any():
+        for polygon in parts[type_ids == 3]:
+            encoder.add_polygon(polygon)
+        return POLYGON, encoder.commands
+    for line in parts[(type_ids == 1) | (type_ids == 2)]:
+        encoder.add_line(line)
+    return LINESTRING, encoder.commands
+
+
+class LayerEncoder:
+    def __init__(self, name: str, extent: int):
+        self.name = name
+        self.extent = extent
+        self.keys: dict[str, int] = {}
+        self.values: dict[bytes, int] = {}
+        self.features: list[bytes] = []
+
+    def tags(self, properties: dict):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            value = encode_value(value)
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault(value, len(self.values)))
+        return tags
+
+    def add_feature(self, geometry, properties: dict):
+        geometry_type, commands = encode_geometry(geometry)
+        if not commands:
+            return
+        feature = field_packed(2, self.tags(properties)) + field_varint(3, geometry_type) + field_packed(4, commands)
+        self.features.append(field_bytes(2, feature))
+
+    def encode(self):
+        layer = field_varint(15, 2) + field_bytes(1, self.name.encode())
+        layer += b"".join(self.features)
+        layer += b"".join(field_bytes(3, key.encode()) for key in self.keys)
+        layer += b"".join(field_bytes(4, value) for value in self.values)
+        layer += field_varint(5, self.extent)
+        return field_bytes(3, layer)
+
+
+def render_tile(index: FeatureIndex, z: int, x: int, y: int):
+    """Encode the features of `index` that fall in tile z/x/y, empty bytes for an empty tile"""
+    extent = app_settings.vector_tile_extent
+    span = tile_span(z)
+    scale = extent / span
+    minx, miny, maxx, maxy = tile_bounds(z, x, y)
+    buffer = app_settings.vector_tile_buffer / scale
+    clip = (minx - buffer, miny - buffer, maxx + buffer, maxy + buffer)
+
+    indices = index.query(clip)
+    if not len(indices):
+        return b""
+
+    geometries = index.geometries[indices]
+    if index.ftype != "point":
+        geometries = shapely.clip_by_rect(geometries, *clip)
+        # one tile unit, no simplification once a tile unit is smaller than a pixel
+        tolerance = 1 / scale
+        if tolerance > 1:
+            geometries = shapely.simplify(geometries, tolerance, preserve_topology=index.ftype == "polygon")
+    geometries = shapely.transform(geometries, lambda coords: (coords - (minx, miny)) * scale)
+
+    layer = LayerEncoder(index.ftype, extent)
+    for i, geometry in zip(indices, geometries):
+        if geometry is None or shapely.is_empty(geometry):
+            continue
+        layer.add_feature(geometry, index.properties[i])
+
+    if not layer.features:
+        return b""
+    return layer.encode()
+
+
+def path_component(value: str):
+    return re.sub(r"[^\w.-]", "_", value).strip(".") or "_"
+
+
+def layer_dir(cog_id: str, ftype: FType, system: str, version: str):
+    return os.path.join(
+        app_settings.disk_cache_dir,
+        "tiles",
+        path_component(cog_id),
+        ftype,
+        path_component(f"{system}__{version}"),
+    )
+
+
+def prune_layer_dir(directory: str, digest: str):
+    """Remove tiles rendered from older versions of the layer"""
+    for entry in os.listdir(directory):
+        if entry != digest:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+prune_lock = threading.Lock()
+last_prune = 0.0
+
+
+def tiles_dir():
+    return os.path.join(app_settings.disk_cache_dir, "tiles")
+
+
+def prune_tile_cache(max_bytes: int):
+    """Remove the least recently used tiles until the cache is under `max_bytes`"""
+    tiles = []
+    for root, _, files in os.walk(tiles_dir()):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            tiles.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in tiles)
+    if total <= max_bytes:
+        return
+    # leave some room so the next tiles don't trigger another prune right away
+    target = max_bytes * 0.9
+    for _, size, path in sorted(tiles):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    logger.info(f"Pruned the vector tile cache to {total} bytes")
+
+
+def maybe_prune_tile_cache():
+    global last_prune
+    with prune_lock:
+        if time.monotonic() - last_prune < app_settings.vector_tile_cache_prune_interval:
+            return
+        last_prune = time.monotonic()
+    threading.Thread(
+        target=prune_tile_cache, args=(app_settings.vector_tile_cache_max_bytes,), daemon=True
+    ).start()
+
+
+def get_tile(cog_id: str, ftype: FType, system: str, version: str, z: int, x: int, y: int):
+    index = get_feature_index(cog_id, ftype, system, version)
+
+    directory = layer_dir(cog_id, ftype, system, version)
+    digest_dir = os.path.join(directory, index.digest)
+    if not os.path.isdir(digest_dir):
+        os.makedirs(digest_dir, exist_ok=True)
+        prune_layer_dir(directory, index.digest)
+
+    path = os.path.join(digest_dir, str(z), str(x), f"{y}.mvt")
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                tile = f.read()
+            # mtime is the last use, see prune_tile_cache
+            os.utime(path)
+            return tile
+        except FileNotFoundError:
+            # pruned in the meantime, render it again
+            pass
+
+    tile = render_tile(index, z, x, y)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(tile)
+    os.replace(tmp_path, path)
+    maybe_prune_tile_cache()
+    return tile
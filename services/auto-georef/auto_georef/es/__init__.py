@@ -4,11 +4,11 @@ import uuid
 from datetime import datetime
 from logging import Logger
 
-import httpx
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+from elasticsearch.helpers import streaming_bulk
 from fastapi import HTTPException, status
 
+from ..common import cdr
 from ..settings import app_settings
 
 logger: Logger = logging.getLogger(__name__)
@@ -28,21 +28,42 @@ def compare_dicts(dict1, dict2, keys):
     return True
 
 
-auth = {
-    "Authorization": app_settings.cdr_bearer_token,
+# the sync client is used from threadpool code, async routes use async_es so
+# an ES round-trip never blocks the event loop. Both keep a pool of connections.
+es_client_options = {
+    "maxsize": app_settings.polymer_es_maxsize,
+    "timeout": app_settings.polymer_es_timeout,
+    "max_retries": app_settings.polymer_es_max_retries,
+    "retry_on_timeout": True,
 }
 
 es = Elasticsearch(
     [
         app_settings.polymer_es_endpoint_url,
-    ]
+    ],
+    **es_client_options,
 )
 
+async_es = AsyncElasticsearch(
+    [
+        app_settings.polymer_es_endpoint_url,
+    ],
+    **es_client_options,
+)
+
+
+async def close_async_es():
+    await async_es.close()
+
 
 def document_exists(index_name, doc_id):
     return es.exists(index=index_name, id=doc_id)
 
 
+async def document_exists_async(index_name, doc_id):
+    return await async_es.exists(index=index_name, id=doc_id)
+
+
 def update_document_by_id(index_name, doc_id, updates):
     """Update an Elasticsearch document by its ID with the provided updates."""
     try:
@@ -53,20 +74,23 @@ def update_document_by_id(index_name, doc_id, updates):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{doc_id} item not found")
 
 
-def cdr_GCP_by_id(cog_id, gcp_id):
-    url = app_settings.cdr_endpoint_url + f"/v1/maps/cog/gcps/{cog_id}"
-    response = httpx.get(url, headers=auth)
+async def update_document_by_id_async(index_name, doc_id, updates):
+    try:
+        response = await async_es.update(index=index_name, id=doc_id, body={"doc": updates}, refresh=True)
+        return response
+    except Exception:
+        logger.exception("Error updating document:")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{doc_id} item not found")
+
+
+def get_cdr_gcps(cog_id):
+    response = cdr.get(f"/v1/maps/cog/gcps/{cog_id}")
     response_data = []
     if response.status_code == 200:
         response_data = response.json()
         if response_data is None:
             response_data = []
-
-    for gcp in response_data:
-        if gcp_id == gcp["gcp_id"]:
-            return gcp
-
-    return return_ES_doc_by_id(app_settings.polymer_gcps_index, gcp_id)
+    return response_data
 
 
 def return_ES_doc_by_id(index, id):
@@ -79,32 +103,240 @@ def return_ES_doc_by_id(index, id):
         return None
 
 
+def return_ES_docs_by_ids(index, ids):
+    """Fetch many documents with a single mget, returns {id: _source} for the ids found."""
+    if not ids:
+        return {}
+    try:
+        response = es.mget(index=index, body={"ids": list(ids)})
+        return {doc["_id"]: doc["_source"] for doc in response["docs"] if doc.get("found")}
+
+    except Exception:
+        logger.exception(f"An error occured looking for {len(ids)} docs in {index}")
+        return {}
+
+
+class GCPResolver:
+    """
+    Resolves gcp ids for a single cog.
+
+    The cog's CDR gcps are downloaded at most once and polymer gcps are fetched
+    from ES with one mget per batch of unknown ids, so resolving every gcp of
+    every projection costs two requests instead of one per gcp. Already fetched
+    gcp lists can be passed in to skip those requests entirely.
+    """
+
+    def __init__(self, cog_id, cdr_gcps=None, polymer_gcps=None):
+        self.cog_id = cog_id
+        self.cdr_gcps = None if cdr_gcps is None else {gcp["gcp_id"]: gcp for gcp in cdr_gcps}
+        self.polymer_gcps = {gcp["gcp_id"]: gcp for gcp in polymer_gcps or []}
+
+    def _lookup_cdr(self, gcp_ids):
+        if self.cdr_gcps is None:
+            self.cdr_gcps = {gcp["gcp_id"]: gcp for gcp in get_cdr_gcps(self.cog_id)}
+        return self.cdr_gcps
+
+    def _lookup_polymer(self, gcp_ids):
+        missing = [gcp_id for gcp_id in gcp_ids if gcp_id not in self.polymer_gcps]
+        if missing:
+            found = return_ES_docs_by_ids(app_settings.polymer_gcps_index, missing)
+            for gcp_id in missing:
+                self.polymer_gcps[gcp_id] = found.get(gcp_id)
+        return self.polymer_gcps
+
+    def resolve(self, gcp_ids, prefer="cdr"):
+        """
+        Map gcp ids to `(source, gcp)` tuples, source being "cdr" or "polymer".
+        Sources are tried in order of preference and ids found in neither are omitted.
+        """
+        lookups = {"cdr": self._lookup_cdr, "polymer": self._lookup_polymer}
+        order = ["polymer", "cdr"] if prefer == "polymer" else ["cdr", "polymer"]
+
+        resolved = {}
+        pending = list(dict.fromkeys(str(gcp_id) for gcp_id in gcp_ids))
+        for source in order:
+            if not pending:
+                break
+            found = lookups[source](pending)
+            for gcp_id in pending:
+                if found.get(gcp_id) is not None:
+                    resolved[gcp_id] = (source, found[gcp_id])
+            pending = [gcp_id for gcp_id in pending if gcp_id not in resolved]
+
+        return resolved
+
+
+# text fields that have a `.keyword` subfield in indices created or reindexed with cli/create_es_index.py
+keyword_text_fields = {"status", "category", "system", "system_version", "crs"}
+
+
+def term_filter(field, value):
+    if field in keyword_text_fields:
+        if not app_settings.polymer_es_keyword_filters:
+            # indices that were not reindexed yet have no .keyword subfield
+            return match_filter(field, value)
+        field = f"{field}.keyword"
+    if isinstance(value, (list, tuple, set)):
+        return {"terms": {field: list(value)}}
+    return {"term": {field: value}}
+
+
+def match_filter(field, value):
+    if isinstance(value, (list, tuple, set)):
+        return {"bool": {"should": [{"match": {field: v}} for v in value], "minimum_should_match": 1}}
+    return {"match": {field: value}}
+
+
+def filter_query(filters, must_not=None):
+    """
+    Build an unscored bool query from exact `{field: value}` filters, lists become `terms`.
+    Filter context lets ES skip scoring and cache the matching docs per segment.
+    Text fields are filtered on their `.keyword` subfield once `polymer_es_keyword_filters`
+    is enabled, which needs the indices to be reindexed first, see cli/reindex_es_index.py.
+    """
+    query = {"bool": {"filter": [term_filter(field, value) for field, value in filters.items()]}}
+    if must_not:
+        query["bool"]["must_not"] = [term_filter(field, value) for field, value in must_not.items()]
+    return {"query": query}
+
+
+def first_page_query(body, page_size, source):
+    page = {**body, "size": page_size, "sort": ["_doc"], "track_total_hits": False}
+    if source is not None:
+        page["_source"] = source
+    return page
+
+
+def paged_query(body, pit_id, keep_alive, page_size, source, search_after):
+    page = {
+        **body,
+        "size": page_size,
+        "pit": {"id": pit_id, "keep_alive": keep_alive},
+        "sort": [{"_shard_doc": "asc"}],
+        "track_total_hits": False,
+    }
+    if source is not None:
+        page["_source"] = source
+    if search_after is not None:
+        page["search_after"] = search_after
+    return page
+
+
+def iter_ES_docs(index, body, source=None, page_size=None, keep_alive="1m"):
+    """
+    Yield the `_source` of every doc matching `body`, one page at a time.
+
+    Most lookups fit in one page and are answered by a single search. When the first
+    page comes back full the docs are read again from a point in time with
+    search_after, so results are not capped at 10000 hits, every page comes from the
+    same snapshot and only one page is held in memory. `source` is passed through as
+    `_source` filtering, e.g. a list of fields or {"excludes": [...]}.
+    """
+    page_size = page_size or app_settings.polymer_es_page_size
+    hits = es.search(index=index, body=first_page_query(body, page_size, source))["hits"]["hits"]
+    if len(hits) < page_size:
+        for hit in hits:
+            yield hit["_source"]
+        return
+    yield from iter_pit_docs(index, body, source, page_size, keep_alive)
+
+
+def iter_pit_docs(index, body, source, page_size, keep_alive):
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+    try:
+        search_after = None
+        while True:
+            page = paged_query(body, pit_id, keep_alive, page_size, source, search_after)
+            response = es.search(body=page)
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            for hit in hits:
+                yield hit["_source"]
+            if len(hits) < page_size:
+                break
+            search_after = hits[-1]["sort"]
+    finally:
+        es.close_point_in_time(body={"id": pit_id})
+
+
+async def aiter_ES_docs(index, body, source=None, page_size=None, keep_alive="1m"):
+    page_size = page_size or app_settings.polymer_es_page_size
+    response = await async_es.search(index=index, body=first_page_query(body, page_size, source))
+    hits = response["hits"]["hits"]
+    if len(hits) < page_size:
+        for hit in hits:
+            yield hit["_source"]
+        return
+    async for doc in aiter_pit_docs(index, body, source, page_size, keep_alive):
+        yield doc
+
+
+async def aiter_pit_docs(index, body, source, page_size, keep_alive):
+    pit_id = (await async_es.open_point_in_time(index=index, keep_alive=keep_alive))["id"]
+    try:
+        search_after = None
+        while True:
+            page = paged_query(body, pit_id, keep_alive, page_size, source, search_after)
+            response = await async_es.search(body=page)
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            for hit in hits:
+                yield hit["_source"]
+            if len(hits) < page_size:
+                break
+            search_after = hits[-1]["sort"]
+    finally:
+        await async_es.close_point_in_time(body={"id": pit_id})
+
+
+def polymer_system_query(cog_id):
+    return filter_query({"cog_id": cog_id})
+
+
+def polymer_system_from_response(response):
+    if len(response["hits"]["hits"]) > 0:
+        return app_settings.polymer_auto_georef_system + "_" + app_settings.polymer_auto_georef_system_version
+    return None
+
+
 def polymer_system_cog_id(index, cog_id):
     try:
-        response = es.search(
-            index=index,
-            body={"query": {"bool": {"must": [{"match": {"cog_id": cog_id}}]}}},
-        )
-        if len([hit["_source"] for hit in response["hits"]["hits"]]) > 0:
-            return app_settings.polymer_auto_georef_system + "_" + app_settings.polymer_auto_georef_system_version
+        response = es.search(index=index, body=polymer_system_query(cog_id), size=1, _source=False)
+        return polymer_system_from_response(response)
+    except Exception:
+        logger.exception("An error occured")
         return None
+
+
+async def polymer_system_cog_id_async(index, cog_id):
+    try:
+        response = await async_es.search(index=index, body=polymer_system_query(cog_id), size=1, _source=False)
+        return polymer_system_from_response(response)
     except Exception:
         logger.exception("An error occured")
         return None
 
 
-def search_by_cog_id(index, cog_id):
+def cog_id_query(cog_id):
+    return filter_query({"cog_id": cog_id}, must_not={"status": "failed"})
+
+
+def iter_by_cog_id(index, cog_id, source=None):
+    return iter_ES_docs(index, cog_id_query(cog_id), source=source)
+
+
+def search_by_cog_id(index, cog_id, source=None):
     try:
-        response = es.search(
-            index=index,
-            body={
-                "query": {
-                    "bool": {"must": [{"match": {"cog_id": cog_id}}], "must_not": [{"match": {"status": "failed"}}]}
-                }
-            },
-            size=10000,
-        )
-        return [hit["_source"] for hit in response["hits"]["hits"]]
+        return list(iter_by_cog_id(index, cog_id, source=source))
+
+    except Exception:
+        logger.exception("An error occured")
+        return []
+
+
+async def search_by_cog_id_async(index, cog_id, source=None):
+    try:
+        return [doc async for doc in aiter_ES_docs(index, cog_id_query(cog_id), source=source)]
 
     except Exception:
         logger.exception("An error occured")
@@ -120,6 +352,16 @@ def delete_by_id(index, id):
     return response
 
 
+async def delete_by_id_async(index, id):
+    response = None
+    try:
+        response = await async_es.delete(index=index, id=id, refresh=True)
+    except Exception:
+        logger.exception(f"Failed to delete {id} from {index}")
+
+    return response
+
+
 def save_ES_data(index, info, id=None):
     if id != None:
         response = es.index(index=index, id=id, document=info, refresh=True)
@@ -156,43 +398,21 @@ def prepare_gcps_for_es(gcps, cog_id):
 
 
 def update_GCPs(cog_id, gcps):
-    # get current gcps from cdr for this cog.
-    url = app_settings.cdr_endpoint_url + f"/v1/maps/cog/gcps/{cog_id}"
-    response = httpx.get(url, headers=auth)
-    cdr_gcps = []
-    if response.status_code == 200:
-        cdr_gcps = response.json()
+    compare_fields = ["latitude", "longitude", "rows_from_top", "columns_from_left", "crs"]
 
-    if cdr_gcps is None:
-        cdr_gcps = []
+    # get current gcps from cdr for this cog.
+    cdr_gcps = get_cdr_gcps(cog_id)
 
     all_gcps = {}
     for gcp in cdr_gcps:
         all_gcps[gcp["gcp_id"]] = gcp
 
-    # get current gcps from polymer for this cog.
-    query_body = {"query": {"term": {"cog_id": cog_id}}}
-    response = es.search(index=app_settings.polymer_gcps_index, body=query_body, size=1000)
-    for hit in response["hits"]["hits"]:
-        all_gcps[hit["_source"]["gcp_id"]] = {
-            "gcp_id": hit["_source"]["gcp_id"],
-            "cog_id": hit["_source"].get("cog_id"),
-            "latitude": hit["_source"].get("latitude"),
-            "longitude": hit["_source"].get("longitude"),
-            "rows_from_top": hit["_source"].get("rows_from_top"),
-            "columns_from_left": hit["_source"].get("columns_from_left"),
-            "confidence": hit["_source"].get("confidence"),
-            "model": hit["_source"].get("model", ""),
-            "model_id": hit["_source"].get("model_id", ""),
-            "model_version": hit["_source"].get("model_version", ""),
-            "crs": hit["_source"].get("crs"),
-            "reference_id": hit["_source"].get("reference_id"),
-            "system": hit["_source"].get("system"),
-            "system_version": hit["_source"].get("system"),
-            "registration_id": hit["_source"].get("registration_id"),
-            "created": hit["_source"].get("created", datetime.now()),
-            "modified": hit["_source"].get("modified", datetime.now()),
-        }
+    # get current gcps from polymer for this cog, only the fields compared below are needed.
+    gcp_fields = ["gcp_id", *compare_fields]
+    query = filter_query({"cog_id": cog_id})
+    polymer_gcps = iter_ES_docs(app_settings.polymer_gcps_index, query, source=gcp_fields)
+    for source in polymer_gcps:
+        all_gcps[source["gcp_id"]] = source
 
     # now loop over each point that was used in projection
     # see if that gcp_id is already accounted for,
@@ -205,11 +425,7 @@ def update_GCPs(cog_id, gcps):
     for gcp in gcps:
         new_gcp = copy.deepcopy(gcp)
         if gcp["gcp_id"] in all_gcps.keys():
-            if compare_dicts(
-                gcp,
-                all_gcps[gcp["gcp_id"]],
-                ["latitude", "longitude", "rows_from_top", "columns_from_left", "crs"],
-            ):
+            if compare_dicts(gcp, all_gcps[gcp["gcp_id"]], compare_fields):
                 logger.info("Point has stayed the same")
                 gcp_ids.append(gcp["gcp_id"])
                 continue
@@ -229,53 +445,89 @@ def update_GCPs(cog_id, gcps):
         new_gcps.append(new_gcp)
 
     gcps_ = prepare_gcps_for_es(gcps=new_gcps, cog_id=cog_id)
-    for gcp in gcps_:
-        save_ES_data(index=app_settings.polymer_gcps_index, info=gcp, id=gcp["gcp_id"])
+    if gcps_:
+        es_bulk_process_actions(
+            [index_action(app_settings.polymer_gcps_index, gcp, id=gcp["gcp_id"]) for gcp in gcps_]
+        )
     return gcp_ids
 
 
-def es_bulk_process_actions(index, actions):
-    try:
-        bulk(es, actions)
-        es.indices.refresh(index=index)
+def index_action(index, doc, id=None):
+    action = {"_op_type": "index", "_index": index, "_source": doc}
+    if id is not None:
+        action["_id"] = id
+    return action
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+def delete_action(index, id):
+    return {"_op_type": "delete", "_index": index, "_id": id}
+
+
+def upsert_action(index, id, doc, upsert=None):
+    """Partially update `id` with `doc`, or create it from `upsert` (defaults to `doc`) when missing."""
+    return {"_op_type": "update", "_index": index, "_id": id, "doc": doc, "upsert": doc if upsert is None else upsert}
+
+
+def es_bulk_process_actions(actions, refresh="wait_for"):
+    """
+    Run actions through the bulk helper, refreshing once per bulk request rather
+    than once per document. Deleting a missing document is not treated as an error.
+    Returns the per action results in order.
+    """
+    results = []
+    errors = []
+    for ok, item in streaming_bulk(es, actions, refresh=refresh, raise_on_error=False):
+        op_type, result = next(iter(item.items()))
+        if not ok and not (op_type == "delete" and result.get("status") == 404):
+            errors.append(item)
+        results.append(result)
+
+    if errors:
+        logger.error(f"Bulk request failed for {len(errors)} actions: {errors[:5]}")
+        raise HTTPException(status_code=500, detail=f"Failed to save {len(errors)} documents")
+    return results
+
+
+def legend_categories_query(cog_id, category):
+    return filter_query({"cog_id": cog_id, "category": category, "status": "validated"})
+
+
+def validated_legend_query(cog_id, categories):
+    return filter_query({"cog_id": cog_id, "category": categories, "status": "validated"})
+
+
+def group_by_category(legend_items, categories):
+    """Group legend items by category, ignoring case like the `match` filters that fetched them."""
+    by_category = {category: [] for category in categories}
+    lowered = {category.lower(): category for category in categories}
+    for item in legend_items:
+        category = lowered.get(str(item.get("category", "")).lower())
+        if category is not None:
+            by_category[category].append(item)
+    return by_category
+
+
+def legend_status_query(cog_id, status):
+    return filter_query({"cog_id": cog_id, "status": status})
 
 
 def legend_categories_by_cog_id(index, cog_id, category):
-    response = es.search(
-        index=index,
-        body={
-            "query": {
-                "bool": {
-                    "must": [
-                        {"match": {"cog_id": cog_id}},
-                        {"match": {"category": category}},
-                        {"match": {"status": "validated"}},
-                    ]
-                }
-            }
-        },
-        size=10000,
-    )
-
-    return [hit["_source"] for hit in response["hits"]["hits"]]
+    return list(iter_ES_docs(index, legend_categories_query(cog_id, category)))
+
+
+async def validated_legend_by_category_async(index, cog_id, categories=("polygon", "line", "point")):
+    """Validated legend items of a cog for all `categories` with one query, grouped by category."""
+    legend_items = aiter_ES_docs(index, validated_legend_query(cog_id, list(categories)))
+    return group_by_category([item async for item in legend_items], categories)
+
+
+def iter_legend_by_cog_id_status(index, cog_id, status):
+    return iter_ES_docs(index, legend_status_query(cog_id, status))
 
 
 def legend_by_cog_id_status(index, cog_id, status):
-    response = es.search(
-        index=index,
-        body={
-            "query": {
-                "bool": {
-                    "must": [
-                        {"match": {"cog_id": cog_id}},
-                        {"match": {"status": status}},
-                    ]
-                }
-            }
-        },
-        size=10000,
-    )
-    return [hit["_source"] for hit in response["hits"]["hits"]]
+    return list(iter_legend_by_cog_id_status(index, cog_id, status))
+
+
+async def legend_by_cog_id_status_async(index, cog_id, status):
+    return [doc async for doc in aiter_ES_docs(index, legend_status_query(cog_id, status))]
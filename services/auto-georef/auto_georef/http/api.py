@@ -2,9 +2,15 @@ import logging
 from logging import Logger
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from ..common import cdr
+from ..common.map_utils import get_ocr_executor, shutdown_ocr_executor
+from ..common.crs_index import get_crs_index
+from ..common.sgmc_ages import get_sgmc_age_index
+from ..es import close_async_es
 from ..settings import app_settings
 from . import views
 from .middleware import setup_middleware
@@ -34,9 +40,15 @@ def print_debug_routes() -> None:
 async def startup_event() -> None:
     logger.info("startup")
     logger.debug(app_settings)
+    await run_in_threadpool(get_crs_index)
+    await run_in_threadpool(get_sgmc_age_index)
+    get_ocr_executor()
     # print_debug_routes()
 
 
 @api.on_event("shutdown")
-def shutdown_event() -> None:
+async def shutdown_event() -> None:
     logger.debug("shutdown")
+    await close_async_es()
+    await cdr.aclose()
+    await run_in_threadpool(shutdown_ocr_executor)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from .routes import cache, cma, health, map, segment
+from .routes import cache, cma, extractions, health, map, segment
 
 tags_metadata = [
     {
@@ -10,6 +10,7 @@ tags_metadata = [
     {"name": "Cache", "description": "Manage cache endpoints"},
     {"name": "Map", "description": "Map endpoints"},
     {"name": "Segment", "description": "Segment Map"},
+    {"name": "Extractions", "description": "Vector tiles of map extractions"},
 ]
 
 api_router = APIRouter()
@@ -18,3 +19,4 @@ api_router.include_router(cache.router, prefix="/cache", tags=["Cache"])
 api_router.include_router(map.router, prefix="/map", tags=["Map"])
 api_router.include_router(segment.router, prefix="/segment", tags=["Segment"])
 api_router.include_router(cma.router, prefix="/manage-cma", tags=["CMA"])
+api_router.include_router(extractions.router, prefix="/extractions", tags=["Extractions"])
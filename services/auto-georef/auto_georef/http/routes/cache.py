@@ -6,6 +6,8 @@ from cachetools import TTLCache
 from fastapi import APIRouter, Response
 from starlette.status import HTTP_204_NO_CONTENT
 
+from auto_georef.common.sgmc_ages import sgmc_ages
+from auto_georef.common.shared_cache import clear_shared_caches, shared_cache_stats
 from auto_georef.common.tiff_cache import clear_disk
 from auto_georef.redisapi import cache_prefix, delete_keys_with_prefix
 from auto_georef.settings import app_settings
@@ -13,6 +15,7 @@ from auto_georef.settings import app_settings
 logger: Logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# decoded rasters, too large to share through redis so they stay per process
 cache = TTLCache(maxsize=2, ttl=1000)
 
 # segment_cache = TTLCache(maxsize=2, ttl=1000)
@@ -39,6 +42,7 @@ async def clear_disk_cache():
 )
 async def clear_redis_cache():
     delete_keys_with_prefix(cache_prefix)
+    clear_shared_caches()
     return
 
 
@@ -51,9 +55,20 @@ async def clear_redis_cache():
 )
 async def clear_memory_cache():
     cache.clear()
+    sgmc_ages.clear()
+    clear_shared_caches(local_only=True)
     return
 
 
+@router.get(
+    "/stats",
+    summary="shared cache stats",
+    description="Hits, misses, loads and redis errors of each shared cache namespace, for this worker",
+)
+def get_cache_stats():
+    return shared_cache_stats()
+
+
 @router.get(
     "/clear_segment_memory_cache",
     summary="clear segment memory cache",
@@ -2,10 +2,10 @@ import logging
 from logging import Logger
 from typing import List
 
-import httpx
 from fastapi import APIRouter
 from pydantic import BaseModel
 
+from auto_georef.common import cdr, cma_stats
 from auto_georef.settings import app_settings
 
 logger: Logger = logging.getLogger(__name__)
@@ -13,23 +13,19 @@ logging.basicConfig(level=logging.ERROR)
 
 router = APIRouter()
 
-auth = {
-    "Authorization": app_settings.cdr_bearer_token,
-}
-
 
 @router.get("/")
 def list_cmas():
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/cmas?size=500"
-    response = httpx.get(fetch_url, headers=auth, timeout=None).raise_for_status()
+    fetch_url = "/v1/prospectivity/cmas?size=500"
+    response = cdr.get(fetch_url).raise_for_status()
     return response.json()
 
 
 @router.get("/cog/{cog_id}")
 def get_cmas_linked_to_cog(cog_id):
-    cog_meta_url = f"{app_settings.cdr_endpoint_url}/v1/maps/cog/meta/{cog_id}"
+    cog_meta_url = f"/v1/maps/cog/meta/{cog_id}"
 
-    cog_response = httpx.get(cog_meta_url, headers=auth, timeout=None).raise_for_status()
+    cog_response = cdr.get(cog_meta_url, cache_ttl=app_settings.cdr_cache_ttl).raise_for_status()
     cog_meta = cog_response.json()
 
     return cog_meta["cmas"]
@@ -37,29 +33,44 @@ def get_cmas_linked_to_cog(cog_id):
 
 @router.get("/{cma_id}")
 def get_cma(cma_id):
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/cma?cma_id={cma_id}"
-    response = httpx.get(fetch_url, headers=auth, timeout=None).raise_for_status()
+    fetch_url = f"/v1/prospectivity/cma?cma_id={cma_id}"
+    response = cdr.get(fetch_url).raise_for_status()
     return response.json()
 
 
+@router.get("/{cma_id}/stats")
+async def get_cma_stats(cma_id):
+    """
+    Number of validated, pending and empty maps per feature type, as [validated, pending, empty]
+    """
+    _, stats = await cma_stats.get_cma_stats(cma_id)
+    return stats
+
+
 class LinkCOGBody(BaseModel):
     cog_ids: List[str]
 
 
 @router.post("/{cma_id}/link")
 def link_cma(cma_id, body: LinkCOGBody):
-    url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/link_cma_cogs"
+    url = "/v1/prospectivity/link_cma_cogs"
 
     data = {"cma_id": cma_id, "cog_ids": body.cog_ids}
 
-    response = httpx.post(url, headers=auth, timeout=None, json=data).raise_for_status()
+    response = cdr.post(url, timeout=cdr.publish_timeout, json=data).raise_for_status()
+    cdr.invalidate(f"/v1/prospectivity/cma?cma_id={cma_id}")
+    for cog_id in body.cog_ids:
+        cdr.invalidate(f"/v1/maps/cog/meta/{cog_id}")
     return True
 
 
 @router.post("/{cma_id}/unlink")
 def unlink_cma(cma_id, body: LinkCOGBody):
-    url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/unlink_cma_cogs"
+    url = "/v1/prospectivity/unlink_cma_cogs"
     data = {"cma_id": cma_id, "cog_ids": body.cog_ids}
 
-    response = httpx.post(url, headers=auth, timeout=None, json=data).raise_for_status()
+    response = cdr.post(url, timeout=cdr.publish_timeout, json=data).raise_for_status()
+    cdr.invalidate(f"/v1/prospectivity/cma?cma_id={cma_id}")
+    for cog_id in body.cog_ids:
+        cdr.invalidate(f"/v1/maps/cog/meta/{cog_id}")
     return True
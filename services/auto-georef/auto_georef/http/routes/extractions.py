@@ -0,0 +1,85 @@
+import json
+import logging
+from logging import Logger
+
+import shapely
+from fastapi import APIRouter, HTTPException, Query, Response
+from starlette.status import HTTP_204_NO_CONTENT
+
+from auto_georef.common.feature_index import FType, get_feature_index
+from auto_georef.common.map_utils import cog_height_not_in_memory
+from auto_georef.common.vector_tiles import MEDIA_TYPE, get_tile, is_valid_tile
+from auto_georef.settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get(
+    "/{cog_id}/{ftype}/tiles/{z}/{x}/{y}.mvt",
+    summary="vector tile",
+    description="Pixel space Mapbox Vector Tile of the extractions of a map for one system and version",
+    response_class=Response,
+)
+def get_vector_tile(cog_id: str, ftype: FType, z: int, x: int, y: int, system: str, version: str):
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail=f"Tile {z}/{x}/{y} is outside of the tile grid")
+
+    tile = get_tile(cog_id, ftype, system, version, z, x, y)
+    if not tile:
+        return Response(status_code=HTTP_204_NO_CONTENT)
+
+    return Response(
+        content=tile,
+        media_type=MEDIA_TYPE,
+        headers={"Cache-Control": f"max-age={app_settings.vector_tile_max_age}"},
+    )
+
+
+def parse_bbox(bbox: str):
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="bbox must be minx,miny,maxx,maxy")
+    if minx > maxx or miny > maxy:
+        raise HTTPException(status_code=422, detail="bbox min must not be greater than max")
+    return minx, miny, maxx, maxy
+
+
+@router.get(
+    "/{cog_id}/{ftype}",
+    summary="features in viewport",
+    description=(
+        "GeoJSON FeatureCollection of the extractions intersecting bbox, in the same flipped pixel space "
+        "as /segment/import_polygons (origin bottom left). When more than max_features intersect, the "
+        "largest are returned and truncated is true."
+    ),
+)
+def get_viewport_features(
+    cog_id: str,
+    ftype: FType,
+    system: str,
+    version: str,
+    bbox: str,
+    max_features: int = Query(default=1000, gt=0),
+    tolerance: float = Query(default=0, ge=0),
+):
+    minx, miny, maxx, maxy = parse_bbox(bbox)
+    height = cog_height_not_in_memory(cog_id)
+    index = get_feature_index(cog_id, ftype, system, version)
+
+    # the index is in CDR pixel space, y down from the top of the map
+    max_features = min(max_features, app_settings.viewport_max_features)
+    indices, geometries, total = index.viewport((minx, height - maxy, maxx, height - miny), max_features, tolerance)
+    geometries = shapely.transform(geometries, lambda coords: coords * (1, -1) + (0, height))
+
+    features = ",".join(
+        f'{{"type":"Feature","id":{json.dumps(index.properties[i]["id"])},"geometry":{geometry},'
+        f'"properties":{json.dumps(index.properties[i])}}}'
+        for i, geometry in zip(indices, shapely.to_geojson(geometries))
+    )
+    content = (
+        f'{{"type":"FeatureCollection","features":[{features}],'
+        f'"total":{total},"truncated":{json.dumps(total > len(indices))}}}'
+    )
+    return Response(content=content, media_type="application/json")
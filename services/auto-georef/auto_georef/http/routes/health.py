@@ -4,6 +4,8 @@ from logging import Logger
 from fastapi import APIRouter, Response
 from starlette.status import HTTP_204_NO_CONTENT
 
+from auto_georef.common import cdr
+
 logger: Logger = logging.getLogger(__name__)
 router = APIRouter()
 
@@ -17,3 +19,12 @@ router = APIRouter()
 )
 async def get_health_check():
     pass
+
+
+@router.get(
+    "/cdr_metrics",
+    summary="cdr request metrics",
+    description="Request count, errors and latency per CDR endpoint since startup",
+)
+async def get_cdr_metrics():
+    return cdr.get_metrics()
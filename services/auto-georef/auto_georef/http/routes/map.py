@@ -1,3 +1,4 @@
+import asyncio
 import copy
 import json
 import logging
@@ -8,56 +9,62 @@ from logging import Logger
 from typing import Any, List, Optional, Union
 
 import httpx
-import pyproj
-from cdr_schemas.feature_results import FeatureResults
-from fastapi import APIRouter, File, HTTPException, Query, Response, UploadFile, status
+from fastapi import APIRouter, File, HTTPException, Query, Request, Response, UploadFile, status
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from PIL import Image
 from pydantic import BaseModel, Field
-from pyproj import CRS
 from shapely.geometry import shape
 from starlette.status import HTTP_200_OK
 
+from auto_georef.common import cdr
+from auto_georef.common.crs_index import display_format, get_crs_index, projection_name
 from auto_georef.common.generate_ids import generate_legend_id, generate_map_area_id
 from auto_georef.common.map_utils import (
     clip_bbox_,
     clip_tiff_,
     cog_height,
     cog_height_not_in_memory,
-    get_cdr_gcps,
     get_cog_meta,
     get_projections_from_cdr,
     get_projections_from_polymer,
     getMapUnits,
     inverse_bbox,
     inverse_geojson,
+    iter_ocr_bboxes,
     ocr_bboxes,
+    prepare_polymer_projections,
     project_cog,
     query_gpt4,
     send_georef_to_cdr,
     send_new_legend_items_to_cdr,
-    determine_display_format
 )
+from auto_georef.common.sgmc_ages import get_sgmc_age_index, get_sgmc_ages
 from auto_georef.common.shapefile_extraction import (
-    get_transform,
-    load_shapefiles,
-    prepare_line_data,
-    prepare_point_data,
-    prepare_polygon_data,
-    required_column_names,
+    feature_results_payloads,
+    save_upload_file,
+    shapefiles_to_feature_results,
     unzip_file,
     walk_shp_prj_files,
 )
 from auto_georef.common.tiff_cache import get_cached_tiff
 from auto_georef.es import (
-    delete_by_id,
-    document_exists,
+    GCPResolver,
+    delete_action,
+    delete_by_id_async,
+    document_exists_async,
+    es_bulk_process_actions,
+    get_cdr_gcps,
+    index_action,
+    iter_by_cog_id,
+    iter_legend_by_cog_id_status,
     legend_by_cog_id_status,
-    legend_categories_by_cog_id,
     polymer_system_cog_id,
-    save_ES_data,
     search_by_cog_id,
-    update_document_by_id,
+    search_by_cog_id_async,
+    update_document_by_id_async,
+    upsert_action,
+    validated_legend_by_category_async,
 )
 from auto_georef.http.routes.cache import cache
 from auto_georef.settings import app_settings
@@ -69,9 +76,9 @@ logging.basicConfig(level=logging.ERROR)
 
 router = APIRouter()
 
-auth = {
-    "Authorization": app_settings.cdr_bearer_token,
-}
+
+# CRS definitions only change with the bundled PROJ database.
+CRS_CACHE_CONTROL = "public, max-age=86400"
 
 
 class Proj_Status(Enum):
@@ -120,46 +127,55 @@ def clip_bbox(cog_id: str, minx: int, miny: int, maxx: int, maxy: int):
 
 
 @router.get("/get_projection_name/{auth_code}")
-def get_projection_name(auth_code: str):
+def get_projection_name(auth_code: str, response: Response):
     try:
-        auth=auth_code.split(":")[0]
-        code=auth_code.split(":")[1]
-        crs = pyproj.CRS.from_authority(auth, code)
-        projection_name = crs.name
-        return {"projection_name": projection_name}
+        name = projection_name(auth_code)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    response.headers["Cache-Control"] = CRS_CACHE_CONTROL
+    return {"projection_name": name}
+
 
 @router.get("/get_projection_format/{auth_code}", status_code=HTTP_200_OK)
-async def cog_gcps(auth_code:str):
+async def get_projection_format(auth_code: str, response: Response):
     try:
-        crs =  pyproj.CRS.from_authority(auth_code.split(":")[0], auth_code.split(":")[1])
-        format = determine_display_format(crs)
+        format = display_format(auth_code)
     except Exception as e:
         logger.exception(e)
-        format="DMS"
+        format = "DMS"
 
+    response.headers["Cache-Control"] = CRS_CACHE_CONTROL
     return format
 
+
 @router.get("/codes", status_code=HTTP_200_OK)
-def codes():
-    all_crs = pyproj.database.query_crs_info(
-        auth_name="EPSG",
-        area_of_interest=pyproj.aoi.AreaOfInterest(
-            east_lon_degree=-66.885444,
-            west_lon_degree=-124.848974,
-            south_lat_degree=24.396308,
-            north_lat_degree=49.384358,
-        ),
-    )
+def codes(
+    request: Request,
+    response: Response,
+    prefix: str = Query(default="", description="Filter by code (e.g. EPSG:269) or name prefix"),
+    limit: int = Query(default=0, ge=0, description="Maximum number of codes returned, 0 for all"),
+):
+    index = get_crs_index()
+    headers = {"Cache-Control": CRS_CACHE_CONTROL, "ETag": index.etag}
+    if request.headers.get("if-none-match") == index.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return {"codes": index.search(prefix, limit)}
 
-    return {"codes": [{"label": crs[0] + ":" + crs[1]} for crs in all_crs]}
+
+def crs_format(auth_code):
+    try:
+        return display_format(auth_code)
+    except Exception:
+        logger.warning(f"Unable to determine display format for crs {auth_code}")
+        return "unknown"
 
 
 @router.get("/downloads/{cog_id}")
 def get_map_download_links(cog_id: str):
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/maps/cog/projections/{cog_id}"
+    fetch_url = f"/v1/maps/cog/projections/{cog_id}"
     s3_prefix = f"{app_settings.cdr_s3_endpoint_url}/{app_settings.cdr_public_bucket}"
 
     s3_download_products = f"{s3_prefix}/12/{cog_id}.zip"
@@ -180,7 +196,7 @@ def get_map_download_links(cog_id: str):
     """
 
     try:
-        projections_response = httpx.get(fetch_url, headers=auth, timeout=None).raise_for_status().json()
+        projections_response = cdr.get(fetch_url).raise_for_status().json()
     except httpx.HTTPError as he:
         raise HTTPException(status_code=he.response.status_code, detail={"error": str(he)})
 
@@ -199,8 +215,8 @@ def get_map_download_links(cog_id: str):
 
 @router.post("/{cog_id}/georeference-features")
 def georeference_features_refresh(cog_id: str):
-    url = f"{app_settings.cdr_endpoint_url}/v1/georeference/refresh"
-    response = httpx.post(url, headers=auth, timeout=None, json={"cog_id": cog_id})
+    url = f"/v1/georeference/refresh"
+    response = cdr.post(url, timeout=cdr.publish_timeout, json={"cog_id": cog_id})
 
     if response.status_code == 200:
         response_data = response.json()
@@ -219,54 +235,58 @@ def download_json(cog_id: str):
     return legend_items
 
 
-@router.get("/{cog_id}/gcps", status_code=HTTP_200_OK)
-async def cog_gcps(cog_id: str):
-    cdr_gcps = await run_in_threadpool(get_cdr_gcps, cog_id)
-
-    polymer_gcps = search_by_cog_id(app_settings.polymer_gcps_index, cog_id)
-    all_gcps = cdr_gcps + polymer_gcps
-    epsg_unit_mapper = {}
-    logger.info(f' gcps all{all_gcps} ')
-    for gcp in all_gcps:
+def ndjson_lines(docs):
+    for doc in docs:
+        yield json.dumps(doc, default=str) + "\n"
 
-        if gcp.get("crs") not in epsg_unit_mapper.keys():
-            try:
-                crs =  pyproj.CRS.from_authority(gcp.get("crs").split(":")[0], gcp.get("crs").split(":")[1])
-                    
-                epsg_unit_mapper[gcp.get("crs")] = determine_display_format(crs)
-            except Exception as e:
-                epsg_unit_mapper[gcp.get("crs")] = "unknown"
-                logger.exception(e)
 
-        gcp["crs_format"] = epsg_unit_mapper[gcp.get("crs")]
+@router.get("/{cog_id}/legend_features_ndjson")
+def download_ndjson(cog_id: str):
+    # one json document per line, read from ES a page at a time while the response is sent
+    legend_items = iter_legend_by_cog_id_status(
+        app_settings.polymer_legend_extractions, cog_id=cog_id, status="validated"
+    )
+    return StreamingResponse(ndjson_lines(legend_items), media_type="application/x-ndjson")
 
-    return all_gcps
 
+@router.get("/{cog_id}/gcps_ndjson")
+def download_gcps_ndjson(cog_id: str):
+    gcps = iter_by_cog_id(app_settings.polymer_gcps_index, cog_id)
+    return StreamingResponse(ndjson_lines(gcps), media_type="application/x-ndjson")
 
-@router.get("/{cog_id}/proj_info", status_code=HTTP_200_OK)
-async def cog_projs(cog_id: str):
-    cdr_projections = await run_in_threadpool(get_projections_from_cdr, cog_id)
 
-    polymer_projections = await run_in_threadpool(get_projections_from_polymer, cog_id)
+def format_gcps(gcps):
+    for gcp in gcps:
+        gcp["crs_format"] = crs_format(gcp.get("crs"))
+    return gcps
 
-    projections = cdr_projections + polymer_projections
 
-    epsg_unit_mapper = {}
+def format_projections(projections):
     for projection in projections:
-        for gcp in projection.get("gcps"):
-            if gcp.get("crs") not in epsg_unit_mapper.keys():
-                try:
-                    # crs = CRS.from_epsg(gcp.get("crs").split(":")[1])
-                    crs =  pyproj.CRS.from_authority(gcp.get("crs").split(":")[0], gcp.get("crs").split(":")[1])
-                    
-                    epsg_unit_mapper[gcp.get("crs")] = determine_display_format(crs)
-                except Exception:
-                    epsg_unit_mapper[gcp.get("crs")] = "unknown"
-
-            gcp["crs_format"] = epsg_unit_mapper[gcp.get("crs")]
+        format_gcps(projection.get("gcps"))
     return projections
 
 
+@router.get("/{cog_id}/gcps", status_code=HTTP_200_OK)
+async def cog_gcps(cog_id: str):
+    cdr_gcps, polymer_gcps = await asyncio.gather(
+        run_in_threadpool(get_cdr_gcps, cog_id),
+        search_by_cog_id_async(app_settings.polymer_gcps_index, cog_id),
+    )
+    all_gcps = cdr_gcps + polymer_gcps
+    logger.info(f' gcps all{all_gcps} ')
+    return format_gcps(all_gcps)
+
+
+@router.get("/{cog_id}/proj_info", status_code=HTTP_200_OK)
+async def cog_projs(cog_id: str):
+    cdr_projections, polymer_projections = await asyncio.gather(
+        run_in_threadpool(get_projections_from_cdr, cog_id),
+        run_in_threadpool(get_projections_from_polymer, cog_id),
+    )
+    return format_projections(cdr_projections + polymer_projections)
+
+
 @router.get("/{cog_id}/meta", status_code=HTTP_200_OK)
 async def cog_info(cog_id: str):
     cog_meta = await run_in_threadpool(get_cog_meta, cog_id)
@@ -274,8 +294,8 @@ async def cog_info(cog_id: str):
 
 
 def get_systems(cog_id, type):
-    url = app_settings.cdr_endpoint_url + f"/v1/features/{cog_id}/system_versions?type={type}"
-    response = httpx.get(url, headers=auth)
+    url = f"/v1/features/{cog_id}/system_versions?type={type}"
+    response = cdr.get(url, cache_ttl=app_settings.cdr_cache_ttl)
     response_data = []
     if response.status_code == 200:
         response_data_ = response.json()
@@ -298,17 +318,6 @@ async def return_system_versions(cog_id: str):
     return system_versions
 
 
-def get_sgmc_ages():
-    url = app_settings.cdr_endpoint_url + f"/v1/sgmc/sgmc_ages"
-    response = httpx.get(url, headers=auth)
-    names = []
-    if response.status_code == 200:
-        names = response.json()
-    else:
-        logger.error("Connection to CDR is down.")
-    return names
-
-
 @router.get("/sgmc/ages")
 async def list_map_unit_name():
     names = await run_in_threadpool(get_sgmc_ages)
@@ -317,8 +326,8 @@ async def list_map_unit_name():
 
 
 def return_cdr_area_extractions(cog_id):
-    url = app_settings.cdr_endpoint_url + f"/v1/features/{cog_id}/area_extractions"
-    response = httpx.get(url, headers=auth)
+    url = f"/v1/features/{cog_id}/area_extractions"
+    response = cdr.get(url)
     response.raise_for_status()
     return response.json()
 
@@ -334,8 +343,8 @@ def return_polymer_legend_items(cog_id):
         legend["in_cdr"] = False
 
     # legend swatches in cdr
-    url = app_settings.cdr_endpoint_url + f"/v1/features/{cog_id}/legend_items"
-    response = httpx.get(url, headers=auth)
+    url = f"/v1/features/{cog_id}/legend_items"
+    response = cdr.get(url)
     cdr_legend_items = []
     if response.status_code == 200:
         cdr_legend_items = response.json()
@@ -414,14 +423,26 @@ def load_extractions(cog_id: str):
 
 @router.get("/{cog_id}", status_code=HTTP_200_OK)
 async def cog_all_info(cog_id: str):
-    # get info from cdr
+    # independent cdr, es and s3 reads are issued concurrently
+    meta, cdr_gcps, polymer_gcps, cdr_projections, polymer_projections, height = await asyncio.gather(
+        run_in_threadpool(get_cog_meta, cog_id),
+        run_in_threadpool(get_cdr_gcps, cog_id),
+        search_by_cog_id_async(app_settings.polymer_gcps_index, cog_id),
+        run_in_threadpool(get_projections_from_cdr, cog_id),
+        search_by_cog_id_async(app_settings.polymer_projections_index, cog_id),
+        run_in_threadpool(cog_height_not_in_memory, cog_id),
+    )
 
-    meta = await cog_info(cog_id=cog_id)
-    projections = await cog_projs(cog_id=cog_id)
-    gcps = await cog_gcps(cog_id=cog_id)
+    # the gcps fetched above are reused for every polymer projection
+    resolver = GCPResolver(cog_id, cdr_gcps=cdr_gcps, polymer_gcps=polymer_gcps)
+    polymer_projections = await run_in_threadpool(prepare_polymer_projections, cog_id, polymer_projections, resolver)
 
-    meta["height"] = cog_height_not_in_memory(cog_id)
-    return {"cog_info": meta, "proj_info": projections, "all_gcps": gcps}
+    meta["height"] = height
+    return {
+        "cog_info": meta,
+        "proj_info": format_projections(cdr_projections + polymer_projections),
+        "all_gcps": format_gcps(cdr_gcps + polymer_gcps),
+    }
 
 
 @router.get(
@@ -432,8 +453,8 @@ async def cog_all_info(cog_id: str):
 def cog_meta(
     georeferenced: bool = Query(default=False),
 ):
-    url = app_settings.cdr_endpoint_url + "/v1/maps/cog/random?georeferenced=" + str(georeferenced)
-    response = httpx.get(url, headers=auth)
+    url = "/v1/maps/cog/random?georeferenced=" + str(georeferenced)
+    response = cdr.get(url)
     response_data = {}
     if response.status_code == 200:
         response_data = response.json()
@@ -486,6 +507,7 @@ def post_area_extraction(request: SaveAreaExtraction):
     logger.info("Save area extraction")
     height = cog_height_not_in_memory(request.cog_id)
 
+    actions = []
     for area_extraction in request.cog_area_extractions:
         if area_extraction.area_id is None:
             area_id = generate_map_area_id(request.cog_id, area_extraction.coordinates)
@@ -503,27 +525,32 @@ def post_area_extraction(request: SaveAreaExtraction):
 
         coords_from_bottom = copy.deepcopy(area_extraction.coordinates_from_bottom)
 
-        save_ES_data(
-            app_settings.polymer_area_extractions,
-            id=area_id,
-            info={
-                "cog_id": request.cog_id,
-                "area_id": area_id,
-                "coordinates": inverse_geojson(area_extraction.coordinates_from_bottom, height),
-                "coordinates_from_bottom": coords_from_bottom,
-                "bbox": bbox,
-                "extent_from_bottom": area_extraction.extent_from_bottom,
-                "text": area_extraction.text,
-                "system": area_extraction.system,
-                "system_version": area_extraction.system_version,
-                "model": area_extraction.model,
-                "model_version": area_extraction.model_version,
-                # map_area, legend_area, ...
-                "category": area_extraction.category,
-                "confidence": area_extraction.confidence,
-                "status": area_extraction.status,
-            },
+        actions.append(
+            index_action(
+                app_settings.polymer_area_extractions,
+                id=area_id,
+                doc={
+                    "cog_id": request.cog_id,
+                    "area_id": area_id,
+                    "coordinates": inverse_geojson(area_extraction.coordinates_from_bottom, height),
+                    "coordinates_from_bottom": coords_from_bottom,
+                    "bbox": bbox,
+                    "extent_from_bottom": area_extraction.extent_from_bottom,
+                    "text": area_extraction.text,
+                    "system": area_extraction.system,
+                    "system_version": area_extraction.system_version,
+                    "model": area_extraction.model,
+                    "model_version": area_extraction.model_version,
+                    # map_area, legend_area, ...
+                    "category": area_extraction.category,
+                    "confidence": area_extraction.confidence,
+                    "status": area_extraction.status,
+                },
+            )
         )
+
+    if actions:
+        es_bulk_process_actions(actions)
     return
 
 
@@ -531,16 +558,15 @@ def post_area_extraction(request: SaveAreaExtraction):
 async def send_validated_legend_items_to_cdr(cog_id: str = Query(default=None)):
     logger.info("Send to cdr")
     # build result
-    height = cog_height_not_in_memory(cog_id=cog_id)
-    legend_polygon_swatchs_items = legend_categories_by_cog_id(
-        app_settings.polymer_legend_extractions, cog_id=cog_id, category="polygon"
-    )
-    legend_line_swatchs_items = legend_categories_by_cog_id(
-        app_settings.polymer_legend_extractions, cog_id=cog_id, category="line"
-    )
-    legend_point_swatchs_items = legend_categories_by_cog_id(
-        app_settings.polymer_legend_extractions, cog_id=cog_id, category="point"
+    # the height and ages are cached, the legend items come from a single query
+    height, legend_items, ages = await asyncio.gather(
+        run_in_threadpool(cog_height_not_in_memory, cog_id=cog_id),
+        validated_legend_by_category_async(app_settings.polymer_legend_extractions, cog_id=cog_id),
+        run_in_threadpool(get_sgmc_age_index),
     )
+    legend_polygon_swatchs_items = legend_items["polygon"]
+    legend_line_swatchs_items = legend_items["line"]
+    legend_point_swatchs_items = legend_items["point"]
     feature_results = {
         "system": app_settings.polymer_auto_georef_system,
         "system_version": app_settings.polymer_auto_georef_system_version,
@@ -552,9 +578,6 @@ async def send_validated_legend_items_to_cdr(cog_id: str = Query(default=None)):
         "cog_metadata_extractions": [],
     }
 
-    # get map_unit ages
-    ages = get_sgmc_ages()
-
     for poly in legend_polygon_swatchs_items:
         poly_geom = validateCoords(poly["coordinates"].get("coordinates", []))
         add_poly = {
@@ -606,6 +629,7 @@ async def send_validated_legend_items_to_cdr(cog_id: str = Query(default=None)):
         }
         feature_results["point_feature_results"].append(add_point)
     await send_new_legend_items_to_cdr(feature_results)
+    cdr.invalidate(f"/v1/features/{cog_id}/")
     logger.info("Finished sending legend items to cdr")
 
 
@@ -614,6 +638,11 @@ class SaveSwatch(BaseModel):
     legend_swatch: Any
 
 
+class SaveSwatches(BaseModel):
+    cog_id: str
+    legend_swatches: List[Any]
+
+
 def validateCoords(coords):
     geom = []
     if len(coords) > 0:
@@ -621,13 +650,12 @@ def validateCoords(coords):
     return geom
 
 
-def save_swatch_feature(request_dict):
-    logger.info("Save swatch feature")
-    cog_id = request_dict["cog_id"]
-
-    height = cog_height_not_in_memory(cog_id)
-
-    legend_swatch = request_dict["legend_swatch"]
+def prepare_swatch_feature(cog_id, legend_swatch, height):
+    """
+    Returns the new legend_id for the swatch and the bulk actions that move the
+    swatch to it: a delete of the previous id when it changed, and an upsert that
+    merges into an existing document or creates a new one.
+    """
     coords_from_bottom = copy.deepcopy(legend_swatch.get("coordinates_from_bottom"))
 
     legend_swatch["coordinates"] = inverse_geojson(legend_swatch["coordinates_from_bottom"], height)
@@ -653,40 +681,41 @@ def save_swatch_feature(request_dict):
     legend_swatch["system_version"] = app_settings.polymer_auto_georef_system_version
     legend_swatch["provenance"] = legend_swatch["system"] + "_" + legend_swatch["system_version"]
 
-    # check if new id exists
-    if document_exists(app_settings.polymer_legend_extractions, legend_id):
-        # if old id exists and it is not the same as the old id we can remove the old
-        if (
-            document_exists(app_settings.polymer_legend_extractions, legend_swatch["legend_id"])
-            and legend_id != legend_swatch["legend_id"]
-        ):
-            delete_by_id(
-                index=app_settings.polymer_legend_extractions,
-                id=legend_swatch["legend_id"],
-            )
-        # update legend_item
-        update_document_by_id(
-            app_settings.polymer_legend_extractions,
-            doc_id=legend_id,
-            updates=legend_swatch,
-        )
-        return legend_swatch
-
-    # check if old id exists and delete it
-    if document_exists(app_settings.polymer_legend_extractions, legend_swatch["legend_id"]):
-        delete_by_id(
-            index=app_settings.polymer_legend_extractions,
-            id=legend_swatch["legend_id"],
-        )
+    actions = []
+    # if the id changed the old item is removed, a missing old id is ignored
+    if legend_id != legend_swatch["legend_id"]:
+        actions.append(delete_action(app_settings.polymer_legend_extractions, legend_swatch["legend_id"]))
 
-    # old id doesn't exist and new id doesn't exist
-    # save new item
+    # an existing item with the new id is updated in place, otherwise a new item is saved
+    updated_swatch = dict(legend_swatch, legend_id=legend_id)
+    created_swatch = dict(updated_swatch)
     if legend_swatch.get("reference_id", "") == "":
-        legend_swatch["reference_id"] = legend_swatch["legend_id"]
+        created_swatch["reference_id"] = legend_swatch["legend_id"]
+
+    actions.append(
+        upsert_action(app_settings.polymer_legend_extractions, legend_id, doc=updated_swatch, upsert=created_swatch)
+    )
+    return updated_swatch, created_swatch, actions
+
 
-    legend_swatch["legend_id"] = legend_id
-    save_ES_data(index=app_settings.polymer_legend_extractions, info=legend_swatch, id=legend_id)
+def save_swatch_features(cog_id, legend_swatches):
+    logger.info(f"Save {len(legend_swatches)} swatch features")
+    height = cog_height_not_in_memory(cog_id)
+
+    prepared = [prepare_swatch_feature(cog_id, legend_swatch, height) for legend_swatch in legend_swatches]
+    results = iter(es_bulk_process_actions([action for *_, actions in prepared for action in actions]))
+
+    saved = []
+    for updated_swatch, created_swatch, actions in prepared:
+        # the upsert is the last action of each swatch and reports if the item was created
+        *_, upsert_result = [next(results) for _ in actions]
+        saved.append(created_swatch if upsert_result.get("result") == "created" else updated_swatch)
+    return saved
 
+
+def save_swatch_feature(request_dict):
+    logger.info("Save swatch feature")
+    (legend_swatch,) = save_swatch_features(request_dict["cog_id"], [request_dict["legend_swatch"]])
     return legend_swatch
 
 
@@ -700,9 +729,21 @@ async def save_features(request: SaveSwatch):
     return legend_swatch
 
 
+@router.post(
+    "/save_legend_swatches",
+)
+async def save_many_features(request: SaveSwatches):
+    logger.info("save legend swatches")
+    request_dict = request.model_dump()
+    legend_swatches = await run_in_threadpool(
+        save_swatch_features, request_dict["cog_id"], request_dict["legend_swatches"]
+    )
+    return legend_swatches
+
+
 def get_random_cog_meta_from_cdr(georeferenced):
-    url = app_settings.cdr_endpoint_url + "/v1/maps/cog/random?georeferenced=" + str(georeferenced)
-    response = httpx.get(url, headers=auth)
+    url = "/v1/maps/cog/random?georeferenced=" + str(georeferenced)
+    response = cdr.get(url)
     response_data = {}
     if response.status_code == 200:
         response_data = response.json()
@@ -775,7 +816,7 @@ class CogsSearch(BaseModel):
 
 
 def send_search_to_cdr():
-    url = app_settings.cdr_endpoint_url + "/v1/maps/search/cogs"
+    url = "/v1/maps/search/cogs"
     data = {
         "georeferenced": False,
         "validated": False,
@@ -793,7 +834,7 @@ def send_search_to_cdr():
         "sgmc_geology_major_1": [],
         "multi_polygons_intersect": None,
     }
-    response = httpx.post(url, json=data)
+    response = cdr.post(url, json=data, idempotent=True)
     if response.status_code == 200:
         response_data = response.json()
         return response_data
@@ -821,8 +862,8 @@ async def save_proj_info(req: SaveProjInfo):
     proj_id = req.projection_id
     status = req.status
     # es check if id exists
-    if document_exists(app_settings.polymer_projections_index, proj_id):
-        update_document_by_id(
+    if await document_exists_async(app_settings.polymer_projections_index, proj_id):
+        await update_document_by_id_async(
             index_name=app_settings.polymer_projections_index,
             doc_id=proj_id,
             updates={"status": status.value},
@@ -834,9 +875,9 @@ async def save_proj_info(req: SaveProjInfo):
 
     else:
         #  just update the status in the cdr.
-        url = app_settings.cdr_endpoint_url + f"/v1/maps/cog/projection/{proj_id}"
+        url = f"/v1/maps/cog/projection/{proj_id}"
         data = {"status": status.value}
-        response = httpx.put(url, json=data, headers=auth)
+        response = await cdr.aput(url, json=data)
         if response.status_code == 200:
             response_data = response.json()
             return {"message": "projection updated", "projection": response_data["projection"]}
@@ -851,10 +892,11 @@ class SaveCogInfo(BaseModel):
 @router.post("/update_cog_meta", status_code=HTTP_200_OK)
 async def save_cog_info(req: SaveCogInfo):
     #  just update the status in the cdr.
-    url = app_settings.cdr_endpoint_url + f"/v1/maps/cog/update/meta/{req.cog_id}"
+    url = f"/v1/maps/cog/update/meta/{req.cog_id}"
     data = {"no_map": req.no_map}
-    response = httpx.put(url, json=data, headers=auth)
+    response = await cdr.aput(url, json=data)
     if response.status_code == 200:
+        cdr.invalidate(f"/v1/maps/cog/meta/{req.cog_id}")
         response_data = response.json()
         return {"message": "Cog metadata updated", "meta": response_data}
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{req.cog_id} item not updated")
@@ -886,8 +928,8 @@ class ProjectCogRequest(BaseModel):
 
 @router.post("/cdr/fire/{cog_id}")
 async def cdr_fire_map(cog_id: str):
-    url = f"{app_settings.cdr_endpoint_url}/v1/maps/fire/{cog_id}"
-    response = httpx.post(url, headers=auth)
+    url = f"/v1/maps/fire/{cog_id}"
+    response = await cdr.apost(url)
     if response.status_code == 200:
         return response.json()
 
@@ -909,6 +951,16 @@ async def ocr(req: OCRRequest):
     return extraction_data
 
 
+@router.post(
+    "/tif_ocr_stream",
+    summary="streaming OCR",
+    description='Newline delimited JSON, one {"index": ..., "text": ...} line per bbox as soon as its OCR finishes',
+)
+def ocr_stream(req: OCRRequest):
+    results = ({"index": i, "text": text} for i, text in iter_ocr_bboxes(req.cog_id, req.bboxes))
+    return StreamingResponse(ndjson_lines(results), media_type="application/x-ndjson")
+
+
 class PromptRequest(BaseModel):
     prompt: str
 
@@ -928,7 +980,7 @@ class DeleteExtraction(BaseModel):
     response_class=Response,
 )
 async def delete_area_extraction(request: DeleteExtraction):
-    delete_by_id(index=app_settings.polymer_area_extractions, id=request.id)
+    await delete_by_id_async(index=app_settings.polymer_area_extractions, id=request.id)
     return
 
 
@@ -937,7 +989,7 @@ async def parse_shapefile_zip(
     cog_id: str,
     file: UploadFile = File(...),
 ):
-    projections = get_projections_from_cdr(cog_id)
+    projections = await run_in_threadpool(get_projections_from_cdr, cog_id)
     gcps = []
     for proj in projections:
         if proj.get("status") == "validated":
@@ -954,58 +1006,48 @@ async def parse_shapefile_zip(
     with tempfile.TemporaryDirectory() as tmpdir:
         zip_file_path = os.path.join(tmpdir, file.filename)
 
-        with open(zip_file_path, "wb") as f:
-            f.write(await file.read())
+        await save_upload_file(file, zip_file_path)
 
-        unzip_file(zip_file_path, tmpdir)
+        extract_dir = os.path.join(tmpdir, "extracted")
+        await run_in_threadpool(unzip_file, zip_file_path, extract_dir)
 
-        shapefiles = walk_shp_prj_files(tmpdir)
+        shapefiles = walk_shp_prj_files(extract_dir)
 
         if not shapefiles:
             raise HTTPException(
                 status_code=400, detail="No valid shapefiles (.shp and .prj) found in the uploaded zip."
             )
 
-        point_df, line_df, polygon_df, found_crs = load_shapefiles(shapefiles=shapefiles)
-
-        projection = {"crs": found_crs, "gcps": gcps}
-        geo_transform = get_transform(projection=projection)
-
-        point_legend_results = []
-        if point_df is not None:
-            point_legend_results = prepare_point_data(required_column_names, point_df, geo_transform)
-        line_legend_results = []
-        if line_df is not None:
-            line_legend_results = prepare_line_data(required_column_names, line_df, geo_transform)
-        polygon_legend_results = []
-        if polygon_df is not None:
-            polygon_legend_results = prepare_polygon_data(required_column_names, polygon_df, geo_transform)
-
-        f = FeatureResults(
-            **{
-                "system": "upload",
-                "system_version": "1.0",
-                "cog_id": cog_id,
-                "point_feature_results": point_legend_results,
-                "line_feature_results": line_legend_results,
-                "polygon_feature_results": polygon_legend_results,
-            }
-        )
-        try:
-            client = httpx.Client()
+        results = await run_in_threadpool(shapefiles_to_feature_results, shapefiles, gcps)
 
-            cdrland = app_settings.cdr_endpoint_url + "/v1/maps/publish/features"
-            cdr_local_token = app_settings.cdr_bearer_token
-            r = client.post(
+    # large uploads are published as several CDR jobs of at most cdr_publish_chunk_features features
+    payloads = await run_in_threadpool(
+        feature_results_payloads, cog_id, results, app_settings.cdr_publish_chunk_features
+    )
+    responses = []
+    for content in payloads:
+        try:
+            cdrland = "/v1/maps/publish/features"
+            r = await cdr.apost(
                 cdrland,
-                data=json.dumps(f.model_dump(mode="json")),
-                headers={"accept": "application/json", "Authorization": f"{cdr_local_token}"},
+                content=content,
+                headers={"accept": "application/json", "content-type": "application/json"},
+                timeout=cdr.publish_timeout,
             )
             r.raise_for_status()
         except Exception:
-            raise HTTPException(status_code=400, detail="Failed to send payload to the cdr.")
+            detail = "Failed to send payload to the cdr."
+            if responses:
+                cdr.invalidate(f"/v1/features/{cog_id}/")
+                job_ids = ", ".join(str(r.get("job_id")) for r in responses)
+                detail += f" {len(responses)} of {len(payloads)} batches were already published as jobs {job_ids}."
+            raise HTTPException(status_code=400, detail=detail)
+        responses.append(r.json())
+    cdr.invalidate(f"/v1/features/{cog_id}/")
 
-        return r.json()
+    if len(responses) == 1:
+        return responses[0]
+    return {**responses[-1], "job_ids": [r.get("job_id") for r in responses]}
 
 
 class StatState(Enum):
@@ -1050,8 +1092,8 @@ def get_cog_stats_status(cog_id: str):
     That is, for each of Projections, points, lines, polygons, legend_items
     possible states => no data vs some data in pending state vs some validated data available
     """
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/features/{cog_id}/statistics_verbose?verbose=false"
-    response = httpx.get(fetch_url, headers=auth, timeout=None)
+    fetch_url = f"/v1/features/{cog_id}/statistics_verbose?verbose=false"
+    response = cdr.get(fetch_url, cache_ttl=app_settings.cdr_cache_ttl)
 
     if response.status_code == 200:
         stat_data = response.json()
@@ -1,9 +1,8 @@
-import hashlib
 import itertools
 import logging
 import operator
 from logging import Logger
-from typing import Any, Callable, Iterable, Literal, TypeAlias
+from typing import Any, Literal, TypeAlias
 
 import httpx
 from cdr_schemas.cdr_responses.legend_items import LegendItemResponse
@@ -19,7 +18,10 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, PositiveInt, field_validator
 from starlette.status import HTTP_204_NO_CONTENT
 
-from auto_georef.common.segment_utils import CDRClient, quick_cog
+from auto_georef.common import cdr
+from auto_georef.common.feature_index import invalidate_feature_index
+from auto_georef.common.map_utils import cog_height_not_in_memory
+from auto_georef.common.segment_utils import CDRClient, geometry_hash, quick_cog
 from auto_georef.common.utils import timeit
 from auto_georef.settings import app_settings
 
@@ -254,22 +256,20 @@ def get_legend_items(cog_id: str):
     return legend_items
 
 
+def to_layer_legend_item(item: dict, height: int):
+    x1, y1, x2, y2 = item["px_bbox"]
+    return LayerLegendItemResponse(
+        id=item["legend_id"], bbox=[x1, height - y2, x2, height - y1], name=item["abbreviation"].strip()
+    )
+
+
 @router.get("/legend_items_from_system")
 def get_legend_items_from_system(cog_id: str, legend_id: str):
-    image = quick_cog(cog_id)
-    height = image.shape[0]
-
-    def flip_bbox(bbox, height):
-        x1, y1, x2, y2 = bbox
-        return [x1, height - y2, x2, height - y1]
+    height = cog_height_not_in_memory(cog_id)
 
     client = CDRClient("")
     item = client.legend_item_intersect(legend_id)
-
-    item = LayerLegendItemResponse(
-        id=item["legend_id"], bbox=flip_bbox(item["px_bbox"], height), name=item["abbreviation"].strip()
-    )
-    return item
+    return to_layer_legend_item(item, height)
 
 
 class SelectLegendItemPointRequest(BaseModel):
@@ -284,20 +284,12 @@ def check_polymer_legend_item(cog_id: str, legend_id: str):
     """
     client = CDRClient(cog_id)
     latest_version = get_latest_version(cog_id, POLYMER)
-    extractions = client.get_polygons(POLYMER, latest_version, 1 << 32)
+    extractions = client.iter_polygons(POLYMER, latest_version, 1 << 32)
 
-    def create_legend_item(legend_item: Any | None):
-        try:
-            return LegendItemResponse(**legend_item)
-        except Exception:
-            return None
+    # stops paging through the CDR as soon as the legend item is found
+    found = any((e.get("legend_item") or {}).get("legend_id") == legend_id for e in extractions)
 
-    validated_legend_ids = [create_legend_item(e.legend_item).legend_id for e in extractions]
-
-    # logger.info(f"Found {len(validated_legend_ids)} validated legend items for {cog_id}")
-    # logger.info(f"Checking if {legend_id} is in {validated_legend_ids}")
-
-    return {"unique": legend_id not in validated_legend_ids}
+    return {"unique": not found}
 
 
 @router.post("/select_legend_item_point")
@@ -340,9 +332,7 @@ def import_polygons(cog_id: str, system: str, version: str, max_polygons: int =
     height = image.shape[0]
 
     client = CDRClient(cog_id)
-    extractions = client.get_polygons(system, version, max_polygons or 1 << 32)
-
-    logging.info(f"Retrieved polygons from CDR for {cog_id} {system} {version}")
+    extractions = client.iter_polygons(system, version, max_polygons or 1 << 32)
 
     def fix_coordinates(coordinates):
         return [[[x, height - y] for (x, y) in linear_rings] for linear_rings in coordinates]
@@ -353,28 +343,29 @@ def import_polygons(cog_id: str, system: str, version: str, max_polygons: int =
         except Exception:
             return None
 
-    # TODO: Maybe use non-consecutive groupby without sorting for performance?
-    TupleType: TypeAlias = tuple[Polygon, bool | None, LegendItemResponse | None]
-    legend_id_key: Callable[[TupleType], str] = lambda x: x[2].legend_id
-    it = (
-        (
-            Polygon(coordinates=fix_coordinates(e.px_geojson.coordinates)),
-            e.validated,
-            create_legend_item(e.legend_item),
-        )
-        for e in extractions
-    )
-    it = sorted(it, key=legend_id_key)
-    it = itertools.groupby(it, key=legend_id_key)
-
-    def generate_multipolygon(groups: Iterable[TupleType]):
-        ps: list[Polygon]
-        vs: list[bool | None]
-        li: LegendItemResponse | None
-        ps, vs, (li, *_) = zip(*groups)
-
+    def group_polygons():
+        """
+        Group the extractions by legend id in a hash map while they are paged in from
+        the CDR. Only coordinates and validation flags are kept per polygon and each
+        legend item is parsed once.
+        """
+        groups: dict[str | None, tuple[list, list[bool | None], LegendItemResponse | None]] = {}
+        for e in extractions:
+            legend_id = (e.get("legend_item") or {}).get("legend_id")
+            if legend_id not in groups:
+                groups[legend_id] = ([], [], create_legend_item(e.get("legend_item")))
+            coordinates, validated, _ = groups[legend_id]
+            coordinates.append(fix_coordinates(e["px_geojson"]["coordinates"]))
+            validated.append(e.get("validated"))
+
+        logging.info(f"Retrieved {len(groups)} polygon groups from CDR for {cog_id} {system} {version}")
+        return groups.values()
+
+    def generate_multipolygon(
+        coordinates: list, vs: list[bool | None], li: LegendItemResponse | None, intersected: dict[str, dict]
+    ):
         # Create a MultiPolygon from the polygons
-        mp = MultiPolygon(coordinates=[p.coordinates for p in ps])
+        mp = MultiPolygon(coordinates=coordinates)
 
         # Get the name of the polygon
         name = "Unknown"
@@ -389,16 +380,9 @@ def import_polygons(cog_id: str, system: str, version: str, max_polygons: int =
             is_validated = False
 
         # Check if there is a valid legend item for the polygon
-
         legend_item = None
-        try:
-            if li is None:
-                raise ValueError("No legend item")
-
-            legend_item = get_legend_items_from_system(cog_id, li.legend_id)
-            # name = legend_item.name
-        except (ValueError, HTTPException):
-            pass
+        if li is not None and li.legend_id in intersected:
+            legend_item = to_layer_legend_item(intersected[li.legend_id], height)
 
         # # Get a mean color for the polygon
         # color = None
@@ -416,13 +400,18 @@ def import_polygons(cog_id: str, system: str, version: str, max_polygons: int =
             #    color=color,
         )
 
-    # This is parallelizable, and should be especially if the mean color is calculated
-    # multipolygons = [generate_multipolygon(groups) for _, groups in it]
-    # logging.info(f"Processed polygons for {cog_id} {system} {version}")
-    # return multipolygons
+    # The CDR pages are read while the response streams, nothing is fetched before the
+    # first byte is sent. A legend's polygons can be on any page, so a group is only
+    # complete once the last page has been read.
+    def generate_multipolygons():
+        groups = group_polygons()
+        # every legend item is intersected up front, with the height read above
+        legend_ids = [li.legend_id for *_, li in groups if li is not None]
+        intersected = CDRClient("").legend_items_intersect(legend_ids)
+        for group in groups:
+            yield generate_multipolygon(*group, intersected).model_dump_json() + "\n"
 
-    it = (generate_multipolygon(groups).model_dump_json() + "\n" for _, groups in it)
-    return StreamingResponse(it, media_type="text/event-stream")
+    return StreamingResponse(generate_multipolygons(), media_type="text/event-stream")
 
 
 class UploadLayersRequestLayer(BaseModel):
@@ -461,7 +450,7 @@ def upload_layers(req: UploadLayersRequest):
         for polygon_coordinates in multipolygon.coordinates:
             coordinates = [[[x, height - y] for (x, y) in linear_rings] for linear_rings in polygon_coordinates]
             polygon = Polygon(coordinates=coordinates)
-            polygon_id = hashlib.sha256(str(polygon).encode()).hexdigest()
+            polygon_id = geometry_hash(coordinates)
             properties = PolygonProperties(
                 model=POLYMER,
                 model_version=latest_version,
@@ -480,6 +469,8 @@ def upload_layers(req: UploadLayersRequest):
         )
 
     client.publish_polygons(POLYMER, latest_version, polygon_legend_features)
+    invalidate_feature_index(req.cog_id, POLYMER)
+    cdr.invalidate(f"/v1/features/{req.cog_id}/")
 
 
 class SegmentRequest(BaseModel):
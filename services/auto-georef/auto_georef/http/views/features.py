@@ -3,10 +3,10 @@ import logging
 from logging import Logger
 from typing import Any, List, Optional
 
-import httpx
 from fastapi import APIRouter, HTTPException, Request, status
 from pydantic import BaseModel
 
+from ...common import cdr
 from ...settings import app_settings
 from ...templates import templates
 
@@ -14,10 +14,6 @@ logger: Logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-auth = {
-    "Authorization": app_settings.cdr_bearer_token,
-}
-
 
 @router.get("/")
 def index(request: Request):
@@ -44,9 +40,9 @@ def index(request: Request):
 
 
 @router.get("/job-status-tracker")
-def job_status_tracker(request: Request, job_id, title=None, job_type="raster"):
-    url = f"{app_settings.cdr_endpoint_url}/v1/jobs/status/{job_id}"
-    response = httpx.get(url, headers=auth, timeout=None)
+async def job_status_tracker(request: Request, job_id, title=None, job_type="raster"):
+    url = f"/v1/jobs/status/{job_id}"
+    response = await cdr.aget(url)
 
     if response.status_code == 200:
         data = response.json()
@@ -81,9 +77,9 @@ def job_status_tracker(request: Request, job_id, title=None, job_type="raster"):
 
 
 @router.get("/get-map-meta")
-def get_map_meta(request: Request, cog_id: str):
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/maps/cog/meta/{cog_id}"
-    response = httpx.get(fetch_url, headers=auth, timeout=None)  # .raise_for_status()
+async def get_map_meta(request: Request, cog_id: str):
+    fetch_url = f"/v1/maps/cog/meta/{cog_id}"
+    response = await cdr.aget(fetch_url, cache_ttl=app_settings.cdr_cache_ttl)  # .raise_for_status()
     if response.status_code == 200:
         return response.json()
     elif response.status_code == 404:
@@ -102,25 +98,25 @@ class FeaturePackageData(BaseModel):
     cma_id: str = ""
 
 
-def fetch_cog_ids_for_CMA_ID(cma_id):
+async def fetch_cog_ids_for_CMA_ID(cma_id):
     """
     Helper fn to get all cog_ids that belong to a CMA given the cma_id.
     """
-    url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/cma?cma_id={cma_id}"
-    response = httpx.get(url, headers=auth)
+    url = f"/v1/prospectivity/cma?cma_id={cma_id}"
+    response = await cdr.aget(url)
     data = response.json()
     return list(map(lambda cog: cog["cog_id"], data["cogs"]))
 
 
 @router.post("/create-features-package")
-def create_features_package(request: Request, data: FeaturePackageData):
-    url = f"{app_settings.cdr_endpoint_url}/v1/features/intersect_package"
+async def create_features_package(request: Request, data: FeaturePackageData):
+    url = "/v1/features/intersect_package"
 
     raw_data = data.dict()
     if raw_data["cma_id"]:
-        raw_data["cog_ids"] = fetch_cog_ids_for_CMA_ID(raw_data["cma_id"])
+        raw_data["cog_ids"] = await fetch_cog_ids_for_CMA_ID(raw_data["cma_id"])
 
-    job_response = httpx.post(url, headers=auth, timeout=None, json=raw_data)
+    job_response = await cdr.apost(url, timeout=cdr.publish_timeout, json=raw_data)
     if job_response.status_code == 200:
         job_id = job_response.json()["job_id"]
         return job_id
@@ -129,9 +125,9 @@ def create_features_package(request: Request, data: FeaturePackageData):
 
 
 @router.get("/creation-job-status")
-def get_job_creation_status(request: Request, job_id: str):
-    url = f"{app_settings.cdr_endpoint_url}/v1/jobs/status/{job_id}"
-    response = httpx.get(url, headers=auth, timeout=None)
+async def get_job_creation_status(request: Request, job_id: str):
+    url = f"/v1/jobs/status/{job_id}"
+    response = await cdr.aget(url)
 
     if response.status_code == 200:
         return response.json()
@@ -140,9 +136,9 @@ def get_job_creation_status(request: Request, job_id: str):
 
 
 @router.get("/creation-job-result")
-def get_job_creation_result(request: Request, job_id: str):
-    url = f"{app_settings.cdr_endpoint_url}/v1/jobs/result/{job_id}"
-    response = httpx.get(url, headers=auth, timeout=None)
+async def get_job_creation_result(request: Request, job_id: str):
+    url = f"/v1/jobs/result/{job_id}"
+    response = await cdr.aget(url)
 
     if response.status_code == 200:
         return response.json()
@@ -159,11 +155,11 @@ class RasterizeLayerData(BaseModel):
 
 
 @router.post("/rasterize-layers")
-def create_rasterized_layers(request: Request, data: RasterizeLayerData):
-    url = f"{app_settings.cdr_endpoint_url}/v1/features/intersect_package_to_raster"
+async def create_rasterized_layers(request: Request, data: RasterizeLayerData):
+    url = "/v1/features/intersect_package_to_raster"
     raw_data = data.dict()
 
-    job_response = httpx.post(url, headers=auth, timeout=None, json=raw_data)
+    job_response = await cdr.apost(url, timeout=cdr.publish_timeout, json=raw_data)
     if job_response.status_code == 200:
         job_id = job_response.json()["job_id"]
         return job_id
@@ -172,9 +168,9 @@ def create_rasterized_layers(request: Request, data: RasterizeLayerData):
 
 
 @router.get("/processed_data_layers")
-def get_processed_data_layers(request: Request, event_id: str):
-    url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/processed_data_layers?event_id={event_id}"
-    response = httpx.get(url, headers=auth, timeout=None)
+async def get_processed_data_layers(request: Request, event_id: str):
+    url = f"/v1/prospectivity/processed_data_layers?event_id={event_id}"
+    response = await cdr.aget(url)
 
     if response.status_code == 200:
         return response.json()
@@ -1,18 +1,21 @@
+import asyncio
 import copy
 import json
 import logging
-import time
 from datetime import datetime
-from functools import lru_cache
 from logging import Logger
 from typing import Annotated
 from urllib.parse import parse_qsl, urlencode, urlparse
 
 import httpx
 from fastapi import APIRouter, Form, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 
+from ...common import cdr
+from ...common.shared_cache import SharedCache, cached
 from ...settings import app_settings
 from ...templates import templates
+from . import search_cache
 from .common import extraction_colors, format_map
 
 logger: Logger = logging.getLogger(__name__)
@@ -20,32 +23,13 @@ logger: Logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-auth = {
-    "Authorization": app_settings.cdr_bearer_token,
-}
-
-
-def ttl_lru_cache(seconds_to_live: int, maxsize: int = 128):
-    """
-    Time aware lru caching
-    """
+cmas_cache = SharedCache("cmas", ttl=10, stale_ttl=60, maxsize=4)
 
-    def wrapper(func):
-        @lru_cache(maxsize)
-        def inner(__ttl, *args, **kwargs):
-            # Note that __ttl is not passed down to func,
-            # as it's only used to trigger cache miss after some time
-            return func(*args, **kwargs)
 
-        return lambda *args, **kwargs: inner(time.time() // seconds_to_live, *args, **kwargs)
-
-    return wrapper
-
-
-@ttl_lru_cache(seconds_to_live=10)
+@cached(cmas_cache)
 def get_cmas():
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/cmas?size=300"
-    response = httpx.get(fetch_url, headers=auth, timeout=None).raise_for_status()
+    fetch_url = "/v1/prospectivity/cmas?size=300"
+    response = cdr.get(fetch_url).raise_for_status()
     return response.json()
 
 
@@ -77,7 +61,7 @@ def patch_url(url, **kwargs):
 
 # TODO features_extracted and legends_extracted is not implemented in CDR yet, so we ignore those
 @router.post("/search-maps")
-def search_maps(
+async def search_maps(
     request: Request,
     # Form data attributes (not json)
     multi_polygons_intersect: Annotated[str, Form()] = {},
@@ -106,8 +90,6 @@ def search_maps(
     page: int = 0,
     page_size: int = 20,
 ):
-    url = app_settings.cdr_endpoint_url + "/v1/maps/search/cogs"
-
     formatted_params = {
         "sgmc_geology_major_1": json.loads(sgmc_geology_major_1),
         "sgmc_geology_major_2": json.loads(sgmc_geology_major_2),
@@ -132,6 +114,7 @@ def search_maps(
             formatted_params["georeferenced"] = True
             formatted_params["validated"] = True
 
+    # page, size and count are added per request, see search_cache
     data = {
         "publish_year_min": publish_year_min,
         "publish_year_max": publish_year_max,
@@ -142,10 +125,7 @@ def search_maps(
         "scale_min": scale_min,
         "scale_max": scale_max,
         "map_name": map_name,
-        "page": page,
-        "size": page_size,
         "contains": contains,
-        "count": count,
     } | formatted_params
 
     # TODO get current year, compare to publish_year_max
@@ -155,12 +135,10 @@ def search_maps(
         data["multi_polygons_intersect"] = json.loads(multi_polygons_intersect)
 
     if count:
-        response = httpx.post(url, json=data, headers=auth, timeout=None).raise_for_status()
-        response_data = response.json()
-        return response_data
+        return await search_cache.search_count(data)
 
     try:
-        response = httpx.post(url, json=data, headers=auth, timeout=None)
+        status_code, maps = await search_cache.search_page(data, page, page_size)
     except httpx.ConnectError:
         return templates.TemplateResponse(
             "index/map-list-error.html.jinja",
@@ -170,25 +148,23 @@ def search_maps(
             },
         )
 
-    if response.status_code == 200:
-        response_data = response.json()
-
+    if status_code == 200:
         prev_page_url = False
         next_page_url = False
 
         if page > 0:
             prev_page_url = patch_url(app_settings.template_prefix + "/search-maps", page=page - 1)
-        if len(response_data) >= page_size:
+        if len(maps) >= page_size:
             next_page_url = patch_url(app_settings.template_prefix + "/search-maps", page=page + 1)
 
-        if len(response_data) > 0:
-            maps_count = len(response_data)
+        if len(maps) > 0:
+            maps_count = len(maps)
 
             return templates.TemplateResponse(
                 "index/map-list.html.jinja",
                 {
                     "request": request,
-                    "maps": map(format_map, response_data),
+                    "maps": maps,
                     "page": page,
                     "page_size": page_size,
                     "prev_page_url": prev_page_url,
@@ -218,18 +194,18 @@ def search_maps(
             {
                 "request": request,
                 "template_prefix": app_settings.template_prefix,
-                "error_details": f"Status returned by CDR: {response.status_code}.",
+                "error_details": f"Status returned by CDR: {status_code}.",
             },
         )
 
 
 @router.get("/search-one-map")
-def search_one_map(request: Request, cog_id):
-    cog_meta_url = f"{app_settings.cdr_endpoint_url}/v1/maps/cog/meta/{cog_id}"
+async def search_one_map(request: Request, cog_id):
+    cog_meta_url = f"/v1/maps/cog/meta/{cog_id}"
     cog_meta = {}
 
     try:
-        cog_response = httpx.get(cog_meta_url, headers=auth, timeout=None).raise_for_status()
+        cog_response = (await cdr.aget(cog_meta_url, cache_ttl=app_settings.cdr_cache_ttl)).raise_for_status()
         cog_meta = cog_response.json()
 
         return templates.TemplateResponse(
@@ -355,9 +331,9 @@ def format_map_stats(stats_count_data, cog_id):
 
 
 @router.get("/map-stats")
-def get_all_maps_stats(request: Request):
-    url = f"{app_settings.cdr_endpoint_url}/v1/maps/statistics"
-    response = httpx.get(url, headers=auth).raise_for_status()
+async def get_all_maps_stats(request: Request):
+    url = "/v1/maps/statistics"
+    response = (await cdr.aget(url, cache_ttl=app_settings.cdr_cache_ttl)).raise_for_status()
 
     if response.status_code == 200:
         data = response.json()
@@ -378,9 +354,9 @@ def get_all_maps_stats(request: Request):
 
 
 @router.get("/map-stats/{cog_id}")
-def get_map_result_stats(request: Request, cog_id: str):
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/features/{cog_id}/statistics_verbose?verbose=false"
-    response = httpx.get(fetch_url, headers=auth, timeout=None)
+async def get_map_result_stats(request: Request, cog_id: str):
+    fetch_url = f"/v1/features/{cog_id}/statistics_verbose?verbose=false"
+    response = await cdr.aget(fetch_url, cache_ttl=app_settings.cdr_cache_ttl)
 
     response_data = None
 
@@ -419,12 +395,12 @@ def get_map_result_stats(request: Request, cog_id: str):
     )
 
 
-def get_map_downloads(cog_id: str):
+async def get_map_downloads(cog_id: str):
     """
     Helper fn to get all downloads. Route /map-actions includes both downloads
     and cma selector.
     """
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/maps/cog/projections/{cog_id}"
+    fetch_url = f"/v1/maps/cog/projections/{cog_id}"
     s3_prefix = f"{app_settings.cdr_s3_endpoint_url}/{app_settings.cdr_public_bucket}"
 
     s3_download_products = f"{s3_prefix}/12/{cog_id}.zip"
@@ -448,7 +424,7 @@ def get_map_downloads(cog_id: str):
     projections_response = None
 
     try:
-        projections_response = httpx.get(fetch_url, headers=auth, timeout=None).raise_for_status().json()
+        projections_response = (await cdr.aget(fetch_url)).raise_for_status().json()
     except httpx.HTTPError:
         return {"disabled": True}
 
@@ -483,24 +459,30 @@ def update_selected_CMAs(cog_meta, cmas):
 
 
 @router.get("/map-actions/{cog_id}")
-def get_map_actions(request: Request, cog_id: str):
-    try:
-        cmas = get_cmas()
-    except httpx.HTTPError:
-        cmas = []
-
-    # returns disabled or actual download links:
-    downloads = get_map_downloads(cog_id)
+async def get_map_actions(request: Request, cog_id: str):
+    cog_meta_url = f"/v1/maps/cog/meta/{cog_id}"
+
+    # the CMA list, downloads (disabled or actual links) and cog meta are independent
+    cmas, downloads, cog_response = await asyncio.gather(
+        run_in_threadpool(get_cmas),
+        get_map_downloads(cog_id),
+        cdr.aget(cog_meta_url, cache_ttl=app_settings.cdr_cache_ttl),
+        return_exceptions=True,
+    )
 
-    cog_meta_url = f"{app_settings.cdr_endpoint_url}/v1/maps/cog/meta/{cog_id}"
+    if isinstance(downloads, BaseException):
+        raise downloads
+    if isinstance(cmas, httpx.HTTPError):
+        cmas = []
+    elif isinstance(cmas, BaseException):
+        raise cmas
 
     cog_meta = {}
-    try:
-        cog_response = httpx.get(cog_meta_url, headers=auth, timeout=None).raise_for_status()
+    if isinstance(cog_response, httpx.Response) and cog_response.status_code == 200:
         cog_meta = cog_response.json()
-    except httpx.HTTPError:
-        # Ignore and return {} for now.
-        pass
+    elif isinstance(cog_response, BaseException) and not isinstance(cog_response, httpx.HTTPError):
+        raise cog_response
+    # Ignore errors and use {} for now.
 
     all_cmas = update_selected_CMAs(cog_meta, cmas)
     has_linked_cmas = next((cma for cma in all_cmas if cma.get("selected")), False)
@@ -524,12 +506,14 @@ def get_map_actions(request: Request, cog_id: str):
 
 
 @router.post("/cma-link/{cma_id}")
-def link_cma(request: Request, cma_id, cog_id, mineral):
-    url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/link_cma_cogs"
+async def link_cma(request: Request, cma_id, cog_id, mineral):
+    url = "/v1/prospectivity/link_cma_cogs"
     data = {"cma_id": cma_id, "cog_ids": [cog_id]}
 
     try:
-        httpx.post(url, headers=auth, timeout=None, json=data).raise_for_status()
+        (await cdr.apost(url, timeout=cdr.publish_timeout, json=data)).raise_for_status()
+        cdr.invalidate(f"/v1/prospectivity/cma?cma_id={cma_id}")
+        cdr.invalidate(f"/v1/maps/cog/meta/{cog_id}")
 
         return templates.TemplateResponse(
             "index/map-actions-updated-cma.html.jinja",
@@ -548,12 +532,14 @@ def link_cma(request: Request, cma_id, cog_id, mineral):
 
 
 @router.post("/cma-unlink/{cma_id}")
-def unlink_cma(request: Request, cma_id, cog_id, mineral):
-    url = f"{app_settings.cdr_endpoint_url}/v1/prospectivity/unlink_cma_cogs"
+async def unlink_cma(request: Request, cma_id, cog_id, mineral):
+    url = "/v1/prospectivity/unlink_cma_cogs"
     data = {"cma_id": cma_id, "cog_ids": [cog_id]}
 
     try:
-        httpx.post(url, headers=auth, timeout=None, json=data).raise_for_status()
+        (await cdr.apost(url, timeout=cdr.publish_timeout, json=data)).raise_for_status()
+        cdr.invalidate(f"/v1/prospectivity/cma?cma_id={cma_id}")
+        cdr.invalidate(f"/v1/maps/cog/meta/{cog_id}")
 
         return templates.TemplateResponse(
             "index/map-actions-updated-cma.html.jinja",
@@ -572,15 +558,15 @@ def unlink_cma(request: Request, cma_id, cog_id, mineral):
 
 
 @router.get("/map-process-status/{cog_id}")
-def get_map_process_status(request: Request, cog_id):
+async def get_map_process_status(request: Request, cog_id):
     """
     Retrieves if map has been fired before. Is so, returns template with
     checked mark + time when map was last processed. Else returns an empty check
     and a tooltip to inform user that checking it will process map.
     """
-    url = f"{app_settings.cdr_endpoint_url}/v1/maps/fired_cog?cog_id={cog_id}"
+    url = f"/v1/maps/fired_cog?cog_id={cog_id}"
 
-    response = httpx.get(url, headers=auth, timeout=None)
+    response = await cdr.aget(url)
 
     completed_on = None
     message = None
@@ -618,13 +604,13 @@ def get_map_process_status(request: Request, cog_id):
 
 
 @router.post("/process-map/{cog_id}")
-def process_fire_map(request: Request, cog_id):
+async def process_fire_map(request: Request, cog_id):
     """
     Returns result template if queuing a map for processing is successful.
     """
-    url = f"{app_settings.cdr_endpoint_url}/v1/maps/fire/{cog_id}"
+    url = f"/v1/maps/fire/{cog_id}"
 
-    response = httpx.post(url, headers=auth, timeout=None)
+    response = await cdr.apost(url, timeout=cdr.publish_timeout)
 
     message = None
     completed_on = None
@@ -652,9 +638,9 @@ def process_fire_map(request: Request, cog_id):
 
 
 @router.get("/jobs-queue")
-def jobs_queue(request: Request):
-    url = f"{app_settings.cdr_endpoint_url}/v1/jobs/q/size"
-    response = httpx.get(url, headers=auth, timeout=None).raise_for_status()
+async def jobs_queue(request: Request):
+    url = "/v1/jobs/q/size"
+    response = (await cdr.aget(url)).raise_for_status()
     data = response.json()
     queue_size = data["size"]
 
@@ -671,9 +657,9 @@ def jobs_queue(request: Request):
 
 
 @router.get("/get-rock-units")
-def get_rock_units(request: Request, major_type: str):
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/sgmc/sgmc_rock_unit_names?major_type={major_type}"
-    response = httpx.get(fetch_url, headers=auth, timeout=None).raise_for_status()
+async def get_rock_units(request: Request, major_type: str):
+    fetch_url = f"/v1/sgmc/sgmc_rock_unit_names?major_type={major_type}"
+    response = (await cdr.aget(fetch_url)).raise_for_status()
     return response.json()
 
 
@@ -683,13 +669,13 @@ def list_cmas(request: Request):
 
 
 @router.get("/get-ngmdb/{product_id}")
-def get_map_by_ngmdb_id(request: Request, product_id):
-    fetch_url = f"{app_settings.cdr_endpoint_url}/v1/maps/ngmdb/{product_id}"
+async def get_map_by_ngmdb_id(request: Request, product_id):
+    fetch_url = f"/v1/maps/ngmdb/{product_id}"
 
     response = None
 
     try:
-        response = httpx.get(fetch_url, headers=auth, timeout=None).raise_for_status()
+        response = (await cdr.aget(fetch_url)).raise_for_status()
     except httpx.HTTPError as he:
         if he.response.status_code == 500:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please enter numbers only.")
@@ -1,12 +1,19 @@
 import hashlib
 import itertools
 import logging
+import json
 import operator
 import re
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from logging import Logger
 from typing import Any, Callable, Literal
+from urllib.parse import urlencode
+
+import numpy as np
+from cachetools import TTLCache
 
-import httpx
 from cdr_schemas.cdr_responses.features import LineExtractionResponse, PointExtractionResponse
 from cdr_schemas.cdr_responses.legend_items import LegendItemResponse
 from cdr_schemas.feature_results import FeatureResults
@@ -25,10 +32,12 @@ from cdr_schemas.features.point_features import (
     PointLegendAndFeaturesResult,
     PointProperties,
 )
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Response
 from pydantic import BaseModel
 from starlette.status import HTTP_204_NO_CONTENT
 
+from ...common import cdr
+from ...common.feature_index import invalidate_feature_index
 from ...common.tiff_cache import get_cached_tiff
 from ...http.routes.cache import cache
 from ...settings import app_settings
@@ -40,15 +49,14 @@ router = APIRouter()
 POLYMER: Literal["polymer"] = "polymer"
 FType = Literal["line", "point"]
 
+# the columnar features loaded for a page, handed to the payload request that follows the template request
+# when it reaches the same worker, keyed by the token in the payload url and only used once
+features_cache = TTLCache(maxsize=32, ttl=app_settings.cdr_cache_ttl)
+features_lock = threading.Lock()
 
-class FeatureResponse(BaseModel):
-    feature_id: str
-    geometry: Line | Point
-    name: str
-    legend_id: str
-    bbox: list[float | int]
-    is_validated: bool | None
-    dash_pattern: DashType | None
+# (height, latest Polymer version, legend items by id) per (cog_id, ftype), looked up once per publishing session
+publish_context_cache = TTLCache(maxsize=128, ttl=app_settings.cdr_cache_ttl)
+publish_context_lock = threading.Lock()
 
 
 class FeatureGroup(BaseModel):
@@ -56,20 +64,37 @@ class FeatureGroup(BaseModel):
     legend_id: str
 
 
-class PublishRequest(BaseModel):
-    cog_id: str
+class PublishFeature(BaseModel):
     geometry: Line | Point
     feature_id: str
     legend_id: str
     dash_pattern: DashType | None = None
 
 
-class UpdateStatusRequest(BaseModel):
+class PublishRequest(PublishFeature):
+    cog_id: str
+
+
+class PublishBatchRequest(BaseModel):
+    cog_id: str
+    features: list[PublishFeature]
+
+
+class StatusUpdate(BaseModel):
     feature_id: str
     ftype: str
     is_validated: bool | None
 
 
+class UpdateStatusRequest(StatusUpdate):
+    cog_id: str
+
+
+class UpdateStatusBatchRequest(BaseModel):
+    cog_id: str
+    updates: list[StatusUpdate]
+
+
 class CDRClient:
     def __init__(self, cog_id: str, *, system: str | None = None, version: str | None = None):
         self.cog_id = cog_id
@@ -77,12 +102,11 @@ class CDRClient:
         self.version = version
 
         self.headers = {"accept": "application/json", "Authorization": app_settings.cdr_bearer_token}
-        self.base_url = f"{app_settings.cdr_endpoint_url}/v1/features"
-        self.client = httpx.Client(timeout=None)
+        self.base_url = "/v1/features"
 
     def get(self, endpoint: str, data: dict | None = None):
         url_search_params = "&".join([f"{k}={v}" for k, v in data.items()])
-        response = self.client.get(f"{self.base_url}/{endpoint}?{url_search_params}", headers=self.headers)
+        response = cdr.get(f"{self.base_url}/{endpoint}?{url_search_params}", headers=self.headers)
         response.raise_for_status()
         try:
             return response.json()
@@ -91,7 +115,9 @@ class CDRClient:
 
     def post(self, endpoint: str, data: dict[str, Any] | BaseModel | None = None):
         json = data.model_dump() if isinstance(data, BaseModel) else data
-        response = self.client.post(f"{self.base_url}/{endpoint}", headers=self.headers, json=json)
+        response = cdr.post(
+            f"{self.base_url}/{endpoint}", headers=self.headers, json=json, timeout=cdr.publish_timeout
+        )
         response.raise_for_status()
         try:
             return response.json()
@@ -112,7 +138,10 @@ class CDRClient:
         response: list[LegendItemResponse] = self.get(f"{self.cog_id}/legend_items", data)
         return response
 
-    def _get_features(self, ftype: str, ExtractionResponse: Callable, max_num: int):
+    def iter_features(self, ftype: str, max_num: int):
+        """
+        Yield `ftype` extractions as raw dicts, one CDR page at a time
+        """
         SIZE = 10_000
 
         def get_data(page: int):
@@ -125,15 +154,17 @@ class CDRClient:
                 "size": SIZE,
             }
 
-        all_extractions = []
+        count = 0
         for i in itertools.count():
             extractions = self.get(f"{self.cog_id}/{ftype}_extractions", get_data(i))
-            all_extractions.extend([ExtractionResponse(**e) for e in extractions])
+            yield from extractions[: max_num - count]
+            count += len(extractions)
 
-            if len(extractions) < SIZE or len(all_extractions) >= max_num:
+            if len(extractions) < SIZE or count >= max_num:
                 break
 
-        return all_extractions[:max_num]
+    def _get_features(self, ftype: str, ExtractionResponse: Callable, max_num: int):
+        return [ExtractionResponse(**e) for e in self.iter_features(ftype, max_num)]
 
     def get_lines(self, max_num: int) -> list[LineExtractionResponse]:
         return self._get_features("line", LineExtractionResponse, max_num)
@@ -141,26 +172,25 @@ class CDRClient:
     def get_points(self, max_num: int) -> list[PointExtractionResponse]:
         return self._get_features("point", PointExtractionResponse, max_num)
 
-    def _publish_feature(self, ftype: str, result: LineLegendAndFeaturesResult | PointLegendAndFeaturesResult):
+    def publish_features(
+        self, ftype: str, results: list[LineLegendAndFeaturesResult] | list[PointLegendAndFeaturesResult]
+    ):
         feature_results = FeatureResults(
             system=self.system,
             system_version=self.version,
             cog_id=self.cog_id,
-            point_feature_results=[result] if ftype == "point" else [],
-            line_feature_results=[result] if ftype == "line" else [],
+            point_feature_results=results if ftype == "point" else [],
+            line_feature_results=results if ftype == "line" else [],
         )
         json = self.post(f"publish/{ftype}_features", feature_results)
         logger.info(f"Published {ftype}: {json}")
 
-    def publish_line(self, result: LineLegendAndFeaturesResult):
-        self._publish_feature("line", result)
-
-    def publish_point(self, result: PointLegendAndFeaturesResult):
-        self._publish_feature("point", result)
+    def update_statuses(self, feature_ids: list[str], ftype: str, is_validated: bool | None):
+        data = {"feature_ids": feature_ids, "feature_type": ftype, "validated": is_validated}
+        self.post(f"update/bulk_feature_status", data)
 
     def update_status(self, feature_id: str, ftype: str, is_validated: bool | None):
-        data = {"feature_ids": [feature_id], "feature_type": ftype, "validated": is_validated}
-        self.post(f"update/bulk_feature_status", data)
+        self.update_statuses([feature_id], ftype, is_validated)
 
 
 def create_template(name: str, request: Request, context: dict | None = None):
@@ -174,11 +204,6 @@ def create_template(name: str, request: Request, context: dict | None = None):
     )
 
 
-def flip_bbox(bbox: list[float | int], height: int):
-    x1, y1, x2, y2 = bbox
-    return [x1, height - y2, x2, height - y1]
-
-
 def flip_geometry(feature: Line | Point, height: int):
     def fix_coordinate(coordinate: list[int | float], height: int):
         x, y = coordinate
@@ -190,65 +215,83 @@ def flip_geometry(feature: Line | Point, height: int):
         return Point(coordinates=fix_coordinate(feature.coordinates, height))
 
 
-def get_features(cog_id: str, ftype: FType, system: str, version: str, max_num: int):
+def get_name(legend_item: Any | None):
+    name = "Unknown"
+    try:
+        li = LegendItemResponse(**legend_item)
+        name = li.label or li.abbreviation or name
+    except Exception:
+        pass
+    return " ".join(word.capitalize() for word in re.split(r"[_\-\s]+", name))
+
+
+def to_columns(ftype: FType, extractions: list[dict], height: int):
+    """
+    Columnar features of one legend group: flat `coordinates` (x, y pairs) with
+    `offsets` into them per feature, flat `bbox` (4 values per feature), and one list
+    per property. Coordinates and boxes are flipped to the page's pixel space.
+    """
+    if ftype == "line":
+        geometries = [e["px_geojson"]["coordinates"] for e in extractions]
+    else:
+        geometries = [[e["px_geojson"]["coordinates"]] for e in extractions]
+
+    coordinates = np.array([c[:2] for g in geometries for c in g], dtype=np.float64).reshape(-1, 2)
+    coordinates[:, 1] = height - coordinates[:, 1]
+    offsets = np.concatenate([[0], np.cumsum([len(g) for g in geometries])])
+
+    x1, y1, x2, y2 = np.array([e["px_bbox"] for e in extractions], dtype=np.float64).reshape(-1, 4).T
+    bbox = np.stack([x1, height - y2, x2, height - y1], axis=1)
+
+    columns = {
+        "name": get_name(extractions[0].get("legend_item")),
+        "feature_id": [e[f"{ftype}_id"] for e in extractions],
+        "is_validated": [e.get("validated") for e in extractions],
+        "coordinates": coordinates.ravel().tolist(),
+        "offsets": offsets.tolist(),
+        "bbox": bbox.ravel().tolist(),
+    }
+    if ftype == "line":
+        columns["dash_pattern"] = [e.get("dash_pattern") for e in extractions]
+    return columns
+
+
+def load_features(cog_id: str, ftype: FType, system: str, version: str, max_num: int):
     client = CDRClient(cog_id, system=system, version=version)
 
     with get_cached_tiff(cache, cog_id) as (_, height):
         pass
 
-    # Helper functions
-    def create_legend_item(legend_item: Any | None):
-        try:
-            return LegendItemResponse(**legend_item)
-        except Exception:
-            return None
-
-    def get_name(legend_item: Any | None):
-        li = create_legend_item(legend_item)
-        name = "Unknown"
-        if li is not None:
-            name = li.label or li.abbreviation or name
-        name = " ".join(word.capitalize() for word in re.split(r"[_\-\s]+", name))
-        return name
-
-    def get_feature_id(feature: LineExtractionResponse | PointExtractionResponse):
-        if isinstance(feature, LineExtractionResponse):
-            return feature.line_id
-        elif isinstance(feature, PointExtractionResponse):
-            return feature.point_id
-
-    def get_dash_pattern(feature: LineExtractionResponse | PointExtractionResponse):
-        return feature.dash_pattern if isinstance(feature, LineExtractionResponse) else None
-
-    # Get features
-    features = None
-    if ftype == "line":
-        features = client.get_lines(max_num or 1 << 32)
-    elif ftype == "point":
-        features = client.get_points(max_num or 1 << 32)
-
-    # Process features
-    features = [
-        FeatureResponse(
-            geometry=flip_geometry(f.px_geojson, height),
-            name=get_name(f.legend_item),
-            legend_id=f.legend_id or "",
-            bbox=flip_bbox(f.px_bbox, height),
-            is_validated=f.validated,
-            feature_id=get_feature_id(f),
-            dash_pattern=get_dash_pattern(f),
-        )
-        for f in features
-    ]
-
-    legend_id_key: Callable[[FeatureResponse], str] = lambda f: f.legend_id
-    features = sorted(features, key=legend_id_key)
-    grouped_features = {lid: list(f) for lid, f in itertools.groupby(features, key=legend_id_key)}
-    feature_groups = [FeatureGroup(name=f.name, legend_id=lid) for lid, (f, *_) in grouped_features.items()]
+    # Group the raw extractions by legend id, no model is built per feature
+    grouped: dict[str, list[dict]] = {}
+    for e in client.iter_features(ftype, max_num or 1 << 32):
+        grouped.setdefault(e.get("legend_id") or "", []).append(e)
 
+    grouped_features = {lid: to_columns(ftype, grouped[lid], height) for lid in sorted(grouped)}
+    feature_groups = [FeatureGroup(name=g["name"], legend_id=lid) for lid, g in grouped_features.items()]
     return grouped_features, feature_groups
 
 
+def get_features(cog_id: str, ftype: FType, system: str, version: str, max_num: int):
+    """
+    Loads the features of a layer for a page, returns the url the page requests them
+    from and the list of groups. The url carries a new token every time, so a page
+    opened after features were marked never gets an older payload.
+    """
+    grouped_features, feature_groups = load_features(cog_id, ftype, system, version, max_num)
+    token = secrets.token_urlsafe(8)
+    with features_lock:
+        features_cache[token] = ((cog_id, ftype, system, version, max_num), grouped_features)
+    return features_url(cog_id, ftype, system, version, max_num, token), feature_groups
+
+
+def features_url(cog_id: str, ftype: FType, system: str, version: str, max_num: int, token: str):
+    query = urlencode(
+        {"cog_id": cog_id, "ftype": ftype, "system": system, "version": version, "max_num": max_num, "token": token}
+    )
+    return f"/lines/feature-data?{query}"
+
+
 def get_systems(cog_id: str, type: str):
     """
     Get the systems and versions for the specified `cog_id` and `type`
@@ -301,6 +344,10 @@ def get_legend_items(cog_id: str, ftype: str, system: str, version: str):
     return legend_items
 
 
+def chunked(items: list, size: int):
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
 @router.post("/update-status", status_code=HTTP_204_NO_CONTENT)
 def update_status(request: UpdateStatusRequest):
     """
@@ -311,81 +358,182 @@ def update_status(request: UpdateStatusRequest):
 
     client = CDRClient("")
     client.update_status(request.feature_id, request.ftype, request.is_validated)
+    # the status is part of the indexed features of every system
+    invalidate_feature_index(request.cog_id)
+    cdr.invalidate(f"/v1/features/{request.cog_id}/")
 
 
-@router.post("/publish", status_code=HTTP_204_NO_CONTENT)
-def publish(request: PublishRequest):
+@router.post("/update-status-batch", status_code=HTTP_204_NO_CONTENT)
+def update_status_batch(request: UpdateStatusBatchRequest):
     """
-    Publish a feature to the CDR
+    Update the status of many features, with one CDR request per feature type and status
     """
 
-    with get_cached_tiff(cache, request.cog_id) as (_, height):
+    groups: dict[tuple[str, bool | None], list[str]] = {}
+    for update in request.updates:
+        groups.setdefault((update.ftype, update.is_validated), []).append(update.feature_id)
+
+    client = CDRClient("")
+    for (ftype, is_validated), feature_ids in groups.items():
+        logger.info(f"Updating status of {len(feature_ids)} {ftype} features to {is_validated}")
+        for chunk in chunked(feature_ids, app_settings.cdr_publish_chunk_features):
+            client.update_statuses(chunk, ftype, is_validated)
+    invalidate_feature_index(request.cog_id)
+    cdr.invalidate(f"/v1/features/{request.cog_id}/")
+
+
+def get_publish_context(cog_id: str, ftype: FType, legend_ids: set[str] = frozenset()):
+    """
+    Height of the COG, latest Polymer version and the Polymer legend items by id. Cached
+    per cog, reloaded when a requested legend item is missing (e.g. created since).
+    """
+    key = (cog_id, ftype)
+    with publish_context_lock:
+        context = publish_context_cache.get(key)
+    if context is not None and legend_ids <= context[2].keys():
+        return context
+
+    with get_cached_tiff(cache, cog_id) as (_, height):
         pass
 
-    latest_version = get_latest_version(request.cog_id, POLYMER)
-    client = CDRClient(request.cog_id, system=POLYMER, version=latest_version)
+    latest_version = get_latest_version(cog_id, POLYMER)
+    legend_items = {li.legend_id: li for li in get_legend_items(cog_id, ftype, POLYMER, latest_version)}
+    context = (height, latest_version, legend_items)
+
+    with publish_context_lock:
+        publish_context_cache[key] = context
+    return context
 
-    ftype = "line" if isinstance(request.geometry, Line) else "point"
-    legend_items = get_legend_items(request.cog_id, ftype, POLYMER, latest_version)
-    legend_items = {li.legend_id: li for li in legend_items}
 
-    if isinstance(request.geometry, Point):
-        point: Point = flip_geometry(request.geometry, height)
+def to_polymer_feature(cog_id: str, version: str, height: int, feature: PublishFeature):
+    if isinstance(feature.geometry, Point):
+        point: Point = flip_geometry(feature.geometry, height)
         point_id = hashlib.sha256(str(point).encode()).hexdigest()
-        feature = PointFeature(
-            id=f"{request.cog_id}_{POLYMER}_{latest_version}_{point_id}",
+        return PointFeature(
+            id=f"{cog_id}_{POLYMER}_{version}_{point_id}",
             geometry=point,
             properties=PointProperties(
                 model=POLYMER,
-                model_version=latest_version,
-                reference_id=request.feature_id,
+                model_version=version,
+                reference_id=feature.feature_id,
                 validated=True,
             ),
         )
-        features_legend = PointLegendAndFeaturesResult(
-            id=request.legend_id,
-            name=legend_items[request.legend_id].label,
-            description=legend_items[request.legend_id].description,
+
+    line: Line = flip_geometry(feature.geometry, height)
+    line_id = hashlib.sha256(str(line).encode()).hexdigest()
+    return LineFeature(
+        id=f"{cog_id}_{POLYMER}_{version}_{line_id}",
+        geometry=line,
+        properties=LineProperties(
+            model=POLYMER,
+            model_version=version,
             validated=True,
-            point_features=PointFeatureCollection(features=[feature]),
-        )
-        client.publish_point(features_legend)
-    elif isinstance(request.geometry, Line):
-        line: Line = flip_geometry(request.geometry, height)
-        line_id = hashlib.sha256(str(line).encode()).hexdigest()
-        feature = LineFeature(
-            id=f"{request.cog_id}_{POLYMER}_{latest_version}_{line_id}",
-            geometry=line,
-            properties=LineProperties(
-                model=POLYMER,
-                model_version=latest_version,
-                validated=True,
-                reference_id=request.feature_id,
-                # TODO: Remove this hardcoding once the `cdr_schemas` is updated to include
-                # the same `dash_pattern` type in `LineProperties` and `LineExtractionResponse`
-                dash_pattern=request.dash_pattern,
-            ),
-        )
-        features_legend = LineLegendAndFeaturesResult(
-            id=request.legend_id,
-            name=legend_items[request.legend_id].label,
-            description=legend_items[request.legend_id].description,
+            reference_id=feature.feature_id,
+            # TODO: Remove this hardcoding once the `cdr_schemas` is updated to include
+            # the same `dash_pattern` type in `LineProperties` and `LineExtractionResponse`
+            dash_pattern=feature.dash_pattern,
+        ),
+    )
+
+
+def to_legend_result(ftype: FType, legend_item: LegendItemResponse, features: list):
+    if ftype == "point":
+        return PointLegendAndFeaturesResult(
+            id=legend_item.legend_id,
+            name=legend_item.label,
+            description=legend_item.description,
             validated=True,
-            line_features=LineFeatureCollection(features=[feature]),
+            point_features=PointFeatureCollection(features=features),
         )
-        client.publish_line(features_legend)
+    return LineLegendAndFeaturesResult(
+        id=legend_item.legend_id,
+        name=legend_item.label,
+        description=legend_item.description,
+        validated=True,
+        line_features=LineFeatureCollection(features=features),
+    )
 
 
-def dict_features(features: dict[str, list[FeatureResponse]]):
-    return {lid: [f.model_dump() for f in fs] for lid, fs in features.items()}
+def publish_features(cog_id: str, features: list[PublishFeature]):
+    """
+    Publish features to the latest Polymer version, grouped by feature type and legend
+    item, with at most `cdr_publish_chunk_features` features per CDR request
+    """
+    chunk_size = app_settings.cdr_publish_chunk_features
+
+    by_ftype: dict[FType, dict[str, list[PublishFeature]]] = {}
+    for feature in features:
+        ftype = "line" if isinstance(feature.geometry, Line) else "point"
+        by_ftype.setdefault(ftype, {}).setdefault(feature.legend_id, []).append(feature)
+
+    for ftype, by_legend in by_ftype.items():
+        height, latest_version, legend_items = get_publish_context(cog_id, ftype, set(by_legend))
+        client = CDRClient(cog_id, system=POLYMER, version=latest_version)
+
+        # split large legend groups, then pack the pieces into requests of up to chunk_size features
+        results, batch_size = [], 0
+        for legend_id, legend_features in by_legend.items():
+            polymer_features = [to_polymer_feature(cog_id, latest_version, height, f) for f in legend_features]
+            for chunk in chunked(polymer_features, chunk_size):
+                if results and batch_size + len(chunk) > chunk_size:
+                    client.publish_features(ftype, results)
+                    results, batch_size = [], 0
+                results.append(to_legend_result(ftype, legend_items[legend_id], chunk))
+                batch_size += len(chunk)
+        if results:
+            client.publish_features(ftype, results)
+
+    invalidate_feature_index(cog_id, POLYMER)
+    # cached system versions and statistics of the cog
+    cdr.invalidate(f"/v1/features/{cog_id}/")
+
+
+@router.post("/publish", status_code=HTTP_204_NO_CONTENT)
+def publish(request: PublishRequest):
+    """
+    Publish a feature to the CDR
+    """
+
+    publish_features(request.cog_id, [request])
+
+
+@router.post("/publish-batch", status_code=HTTP_204_NO_CONTENT)
+def publish_batch(request: PublishBatchRequest):
+    """
+    Publish many features to the CDR at once
+    """
+
+    logger.info(f"Publishing {len(request.features)} features for {request.cog_id}")
+    publish_features(request.cog_id, request.features)
+
+
+@router.get("/feature-data")
+def get_feature_data(cog_id: str, ftype: FType, system: str, version: str, max_num: int = 0, token: str = ""):
+    """
+    Columnar features grouped by legend id, loaded by the pages instead of being embedded in the templates.
+    The features loaded for the page's template are used when this worker has them, otherwise they are
+    loaded again.
+    """
+    key = (cog_id, ftype, system, version, max_num)
+    with features_lock:
+        staged = features_cache.pop(token, None)
+    if staged is not None and staged[0] == key:
+        grouped_features = staged[1]
+    else:
+        grouped_features, _ = load_features(cog_id, ftype, system, version, max_num)
+
+    content = json.dumps({"ftype": ftype, "groups": grouped_features}, separators=(",", ":"))
+    # the page changes the status of these features, they are never reused from the browser cache
+    return Response(content=content, media_type="application/json", headers={"Cache-Control": "no-cache"})
 
 
 @router.get("/view-features")
 def get_view_features(request: Request, cog_id: str, ftype: FType, system: str, version: str, max_num: int = 0):
-    grouped_features, feature_groups = get_features(cog_id, ftype, system, version, max_num)
+    url, feature_groups = get_features(cog_id, ftype, system, version, max_num)
 
     context = {
-        "features": dict_features(grouped_features),
+        "features_url": url,
         "groups": feature_groups,
         "system": system,
         "version": version,
@@ -397,15 +545,21 @@ def get_view_features(request: Request, cog_id: str, ftype: FType, system: str,
 @router.get("/validate-features")
 def get_validate_features(request: Request, cog_id: str, ftype: FType, system: str, version: str, max_num: int = 0):
     latest_version = get_latest_version(cog_id, POLYMER)
-    legend_groups = get_legend_items(cog_id, ftype, POLYMER, latest_version)
-    legend_id_to_label = {li.legend_id: li.label for li in legend_groups}
 
-    grouped_features, feature_groups = get_features(cog_id, ftype, system, version, max_num)
-    polymer_grouped_features, _ = get_features(cog_id, ftype, POLYMER, latest_version, max_num)
+    # the Polymer features are only loaded here so the payload request finds them ready
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        legend_groups = executor.submit(get_legend_items, cog_id, ftype, POLYMER, latest_version)
+        features = executor.submit(get_features, cog_id, ftype, system, version, max_num)
+        polymer_features = executor.submit(get_features, cog_id, ftype, POLYMER, latest_version, max_num)
+        legend_groups = legend_groups.result()
+        url, feature_groups = features.result()
+        polymer_url, _ = polymer_features.result()
+
+    legend_id_to_label = {li.legend_id: li.label for li in legend_groups}
 
     context = {
-        "features": dict_features(grouped_features),
-        "polymer_features": dict_features(polymer_grouped_features),
+        "features_url": url,
+        "polymer_features_url": polymer_url,
         "groups": feature_groups,
         "legend_groups": legend_groups,
         "legend_id_to_label": legend_id_to_label,
@@ -419,13 +573,17 @@ def get_validate_features(request: Request, cog_id: str, ftype: FType, system: s
 @router.get("/create-features")
 def get_create_features(request: Request, cog_id: str, ftype: FType, max_num: int = 0):
     latest_version = get_latest_version(cog_id, POLYMER)
-    legend_groups = get_legend_items(cog_id, ftype, POLYMER, latest_version)
-    legend_id_to_label = {li.legend_id: li.label for li in legend_groups}
 
-    polymer_grouped_features, _ = get_features(cog_id, ftype, POLYMER, latest_version, max_num)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        legend_groups = executor.submit(get_legend_items, cog_id, ftype, POLYMER, latest_version)
+        polymer_features = executor.submit(get_features, cog_id, ftype, POLYMER, latest_version, max_num)
+        legend_groups = legend_groups.result()
+        polymer_url, _ = polymer_features.result()
+
+    legend_id_to_label = {li.legend_id: li.label for li in legend_groups}
 
     context = {
-        "polymer_features": dict_features(polymer_grouped_features),
+        "polymer_features_url": polymer_url,
         "legend_groups": legend_groups,
         "legend_id_to_label": legend_id_to_label,
         "system": POLYMER,
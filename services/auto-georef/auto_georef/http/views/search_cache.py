@@ -0,0 +1,104 @@
+"""
+Search session cache for /search-maps.
+
+Pages and totals of a map search are kept for `search_cache_ttl` seconds, keyed by the
+normalized query (every filter except page, size and count). Serving a full page also
+prefetches the following `search_prefetch_pages` in the background, so paging back and
+forth is answered from memory. Requests for a page that is being fetched wait on that
+fetch instead of sending the same search again.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from logging import Logger
+
+from cachetools import TTLCache
+
+from ...common import cdr
+from ...settings import app_settings
+from .common import format_map
+
+logger: Logger = logging.getLogger(__name__)
+
+search_url = "/v1/maps/search/cogs"
+
+search_cache = TTLCache(maxsize=app_settings.search_cache_size, ttl=app_settings.search_cache_ttl)
+# key -> task fetching it, also keeps a reference to prefetch tasks until they're done
+inflight: dict[tuple, asyncio.Task] = {}
+
+page_keys = {"page", "size", "count"}
+
+
+def normalize_query(data):
+    """Hash of the search filters, filter lists are order insensitive"""
+    query = {
+        key: sorted(value, key=json.dumps) if isinstance(value, list) and key.startswith("sgmc_") else value
+        for key, value in data.items()
+        if key not in page_keys
+    }
+    return hashlib.sha256(json.dumps(query, sort_keys=True).encode()).hexdigest()
+
+
+async def fetch_page(data, page, page_size):
+    """(status_code, formatted maps or None)"""
+    data = data | {"page": page, "size": page_size, "count": False}
+    response = await cdr.apost(search_url, json=data, idempotent=True)
+    if response.status_code != 200:
+        return response.status_code, None
+    return 200, [format_map(m) for m in response.json()]
+
+
+async def fetch_count(data):
+    response = (await cdr.apost(search_url, json=data | {"count": True}, idempotent=True)).raise_for_status()
+    return response.json()
+
+
+async def get_or_fetch(key, fetch):
+    """Value of `key` from the cache, an in-flight fetch, or `fetch()`"""
+    if key in search_cache:
+        return search_cache[key]
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = asyncio.create_task(fetch())
+        task.add_done_callback(lambda t: done(key, t))
+    return await asyncio.shield(task)
+
+
+def done(key, task):
+    inflight.pop(key, None)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logger.warning(f"Map search failed: {task.exception()!r}")
+        return
+    result = task.result()
+    # only successful pages are kept, errors are retried on the next request
+    if not isinstance(result, tuple) or result[0] == 200:
+        search_cache[key] = result
+
+
+def prefetch(data, query_key, page, page_size):
+    for next_page in range(page + 1, page + 1 + app_settings.search_prefetch_pages):
+        key = (query_key, next_page, page_size)
+        if key in search_cache or key in inflight:
+            continue
+        task = inflight[key] = asyncio.create_task(fetch_page(data, next_page, page_size))
+        task.add_done_callback(lambda t, key=key: done(key, t))
+
+
+async def search_page(data, page, page_size):
+    """
+    One page of the search as (status_code, formatted maps or None), the next pages
+    are prefetched when this one is full.
+    """
+    query_key = normalize_query(data)
+    status_code, maps = await get_or_fetch((query_key, page, page_size), lambda: fetch_page(data, page, page_size))
+    if status_code == 200 and len(maps) >= page_size:
+        prefetch(data, query_key, page, page_size)
+    return status_code, maps
+
+
+async def search_count(data):
+    return await get_or_fetch((normalize_query(data), "count"), lambda: fetch_count(data))
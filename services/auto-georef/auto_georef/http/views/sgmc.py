@@ -3,10 +3,10 @@ import logging
 from logging import Logger
 from typing import List
 
-import httpx
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
+from ...common import cdr
 from ...settings import app_settings
 from ...templates import templates
 
@@ -14,10 +14,6 @@ logger: Logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-auth = {
-    "Authorization": app_settings.cdr_bearer_token,
-}
-
 
 @router.get("/")
 def index(request: Request):
@@ -56,10 +52,10 @@ class SGMCPackageData(BaseModel):
 
 
 @router.post("/create-features-package")
-def create_features_package(request: Request, data: SGMCPackageData):
-    url = f"{app_settings.cdr_endpoint_url}/v1/sgmc/intersect_package"
+async def create_features_package(request: Request, data: SGMCPackageData):
+    url = "/v1/sgmc/intersect_package"
     raw_data = data.dict()
-    job_response = httpx.post(url, headers=auth, timeout=None, json=raw_data)
+    job_response = await cdr.apost(url, timeout=cdr.publish_timeout, json=raw_data)
     if job_response.status_code == 200:
         job_id = job_response.json()["job_id"]
         return job_id
@@ -68,11 +64,11 @@ def create_features_package(request: Request, data: SGMCPackageData):
 
 
 @router.post("/rasterize-layers")
-def create_rasterized_layers(request: Request, data: SGMCPackageData):
-    url = f"{app_settings.cdr_endpoint_url}/v1/sgmc/intersect_package_to_raster"
+async def create_rasterized_layers(request: Request, data: SGMCPackageData):
+    url = "/v1/sgmc/intersect_package_to_raster"
     raw_data = data.dict()
 
-    job_response = httpx.post(url, headers=auth, timeout=None, json=raw_data)
+    job_response = await cdr.apost(url, timeout=cdr.publish_timeout, json=raw_data)
     if job_response.status_code == 200:
         job_id = job_response.json()["job_id"]
         return job_id
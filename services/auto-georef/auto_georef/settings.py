@@ -22,8 +22,27 @@ class Settings(BaseSettings):
     cdr_s3_px_extractions_prefix: str = "px_results"
     cdr_es_endpoint_url: str = "http://192.168.1.95:9200"
     cdr_endpoint_url: str = "http://192.168.1.95:8333"
+    cdr_timeout: float = 60
+    cdr_connect_timeout: float = 10
+    cdr_publish_timeout: float = 600
+    cdr_max_connections: int = 50
+    cdr_retries: int = 3
+    cdr_retry_backoff: float = 0.5
+    cdr_cache_ttl: int = 60
+    cdr_cache_size: int = 1024
+    cdr_slow_request_seconds: float = 5
+    cdr_polygon_page_size: int = 10_000
+    cdr_publish_concurrency: int = 4
+    cdr_publish_chunk_features: int = 5_000
+    cdr_publish_chunk_vertices: int = 500_000
 
     polymer_es_endpoint_url: str = "http://192.168.1.95:9200"
+    polymer_es_maxsize: int = 25
+    polymer_es_timeout: int = 30
+    polymer_es_max_retries: int = 3
+    polymer_es_page_size: int = 1000
+    # filter text fields on their .keyword subfield, enable once cli/reindex_es_index.py has run
+    polymer_es_keyword_filters: bool = False
     polymer_s3_endpoint_url: str = "http://192.168.1.95:9000"
     polymer_public_bucket: str = "public.cdr.land"
     polymer_s3_cog_prefix: str = "cogs"
@@ -48,9 +67,40 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_cache_timeout: int = 10000
 
+    shared_cache_redis: bool = True
+    shared_cache_prefix: str = "shared_cache"
+    shared_cache_lock_timeout: int = 30
+
     disk_cache_dir: str = "/home/apps/auto-georef/disk_cache"
     sam_model_path: str = "/home/apps/auto-georef/model_weights/sam_model_best.pth"
     time_per_embedding: int = 10_000
 
+    feature_index_ttl: int = 600
+    feature_index_size: int = 16
+    feature_index_max_features: int = 1_000_000
+    viewport_max_features: int = 10_000
+    vector_tile_max_zoom: int = 8
+    vector_tile_extent: int = 4096
+    vector_tile_buffer: int = 64
+    vector_tile_max_age: int = 60
+    vector_tile_cache_max_bytes: int = 2 * 1024**3
+    vector_tile_cache_prune_interval: int = 300
+
+    ocr_workers: int = 4
+    # read the union of the OCR windows at once when it is at most this many times their area
+    ocr_union_read_factor: float = 4.0
+    gdal_vsi_cache_size: int = 64 * 1024 * 1024
+    cog_header_ttl: int = 30 * 24 * 3600
+
+    search_cache_ttl: int = 120
+    search_cache_size: int = 512
+    search_prefetch_pages: int = 1
+
+    cma_stats_ttl: int = 60
+    cma_stats_stale_ttl: int = 600
+
+    sgmc_ages_ttl: int = 3600
+    sgmc_ages_redis: bool = False
+
 
 app_settings = Settings()
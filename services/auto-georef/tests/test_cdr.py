@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+import auto_georef.common.cdr as cdr
+
+
+class FakeClient:
+    def __init__(self, status_codes):
+        self.status_codes = list(status_codes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        return SimpleNamespace(status_code=self.status_codes.pop(0))
+
+
+def test_get_retries_server_errors_and_caches(monkeypatch):
+    fake = FakeClient([503, 200])
+    monkeypatch.setattr(cdr, "client", fake)
+    monkeypatch.setattr(cdr, "backoff", lambda attempt: 0)
+
+    response = cdr.get("/v1/maps/cog/meta/abc123", cache_ttl=60)
+    assert response.status_code == 200
+    assert cdr.get("/v1/maps/cog/meta/abc123", cache_ttl=60) is response
+    assert len(fake.calls) == 2
+
+    cdr.invalidate("/v1/maps/cog/meta/abc123")
+    fake.status_codes.append(200)
+    cdr.get("/v1/maps/cog/meta/abc123", cache_ttl=60)
+    assert len(fake.calls) == 3
+
+
+def test_post_is_not_retried_on_server_errors(monkeypatch):
+    fake = FakeClient([500, 200])
+    monkeypatch.setattr(cdr, "client", fake)
+    monkeypatch.setattr(cdr, "backoff", lambda attempt: 0)
+
+    assert cdr.post("/v1/maps/publish/features").status_code == 500
+    assert cdr.post("/v1/maps/search/cogs", idempotent=True).status_code == 200
+
+
+def test_metrics_group_ids():
+    assert cdr.endpoint_name("GET", "/v1/maps/cog/meta/abc123") == "GET /v1/maps/cog/meta/{id}"
@@ -0,0 +1,20 @@
+from auto_georef.common.cma_stats import accumulate_stats_for_feature, cache_key
+
+
+def test_accumulate_stats_for_feature():
+    cog_stats = {
+        "a": {"georeferenced_count": 8, "validated_count": 2},
+        "b": {"georeferenced_count": 4, "validated_count": 0},
+        "c": {"total_lines": 0, "total_validated_lines": 0},
+        "d": {"total_lines": 3, "total_validated_lines": 1},
+    }
+
+    # [validated, pending, empty]
+    assert accumulate_stats_for_feature(cog_stats) == [2, 1, 1]
+    assert accumulate_stats_for_feature({}) == [0, 0, 0]
+
+
+def test_cache_key_ignores_cog_order():
+    assert cache_key("cma", ["a", "b"]) == cache_key("cma", ["b", "a"])
+    assert cache_key("cma", ["a", "b"]) != cache_key("cma", ["a"])
+    assert cache_key("cma", ["a"]) != cache_key("other", ["a"])
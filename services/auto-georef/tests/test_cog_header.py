@@ -0,0 +1,27 @@
+from auto_georef.common import map_utils
+
+
+def test_cog_header_is_read_once(monkeypatch):
+    reads = []
+
+    def read_cog_header(cog_id):
+        reads.append(cog_id)
+        return {"width": 10, "height": 20}
+
+    monkeypatch.setattr(map_utils, "read_cog_header", read_cog_header)
+    monkeypatch.setattr(map_utils.cog_headers, "use_redis", False)
+    map_utils.cog_headers.clear(local_only=True)
+
+    assert map_utils.cog_height_not_in_memory("cog") == 20
+    assert map_utils.cog_height_not_in_memory("cog") == 20
+    assert map_utils.get_cog_header("cog")["width"] == 10
+    assert reads == ["cog"]
+    map_utils.cog_headers.clear(local_only=True)
+
+
+def test_cog_path_prefers_disk_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(map_utils.app_settings, "disk_cache_dir", str(tmp_path))
+
+    assert map_utils.cog_path("cog").startswith(map_utils.app_settings.cdr_s3_endpoint_url)
+    (tmp_path / "cog.cog.tif").touch()
+    assert map_utils.cog_path("cog") == str(tmp_path / "cog.cog.tif")
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from auto_georef.common.crs_index import CRSIndex
+
+
+def crs_info(code, name):
+    return SimpleNamespace(
+        auth_name="EPSG",
+        code=code,
+        name=name,
+        type=SimpleNamespace(name="PROJECTED_CRS"),
+        area_of_use=SimpleNamespace(name="USA", bounds=(-125.0, 24.0, -66.0, 49.0)),
+    )
+
+
+infos = [
+    crs_info("4267", "NAD27"),
+    crs_info("26912", "NAD83 / UTM zone 12N"),
+    crs_info("26913", "NAD83 / UTM zone 13N"),
+    crs_info("32612", "WGS 84 / UTM zone 12N"),
+]
+
+
+def test_crs_index_search_by_code_prefix():
+    index = CRSIndex(infos)
+
+    labels = [entry["label"] for entry in index.search("EPSG:269")]
+    assert labels == ["EPSG:26912", "EPSG:26913"]
+
+    # bare numbers and lowercase authorities are treated as EPSG codes
+    assert [entry["label"] for entry in index.search("epsg:269")] == labels
+    assert [entry["label"] for entry in index.search("269")] == labels
+
+
+def test_crs_index_search_by_name_prefix():
+    index = CRSIndex(infos)
+
+    labels = [entry["label"] for entry in index.search("nad83")]
+    assert labels == ["EPSG:26912", "EPSG:26913"]
+
+
+def test_crs_index_search_all_and_limit():
+    index = CRSIndex(infos)
+
+    assert len(index.search()) == 4
+    assert len(index.search(limit=2)) == 2
+    assert index.get("epsg:4267")["name"] == "NAD27"
+    assert index.etag == CRSIndex(infos).etag
@@ -0,0 +1,157 @@
+import auto_georef.es as es_module
+from auto_georef.es import GCPResolver
+
+
+def test_gcp_resolver_fetches_each_source_once(monkeypatch):
+    calls = {"cdr": 0, "mget": 0}
+
+    def fake_cdr_gcps(cog_id):
+        calls["cdr"] += 1
+        return [{"gcp_id": "a", "source": "cdr"}, {"gcp_id": "b", "source": "cdr"}]
+
+    def fake_mget(index, ids):
+        calls["mget"] += 1
+        return {gcp_id: {"gcp_id": gcp_id, "source": "polymer"} for gcp_id in ids if gcp_id != "missing"}
+
+    monkeypatch.setattr(es_module, "get_cdr_gcps", fake_cdr_gcps)
+    monkeypatch.setattr(es_module, "return_ES_docs_by_ids", fake_mget)
+
+    resolver = GCPResolver("cog")
+    resolved = resolver.resolve(["a", "c", "missing"])
+    resolved.update(resolver.resolve(["b", "a"]))
+
+    assert resolved["a"] == ("cdr", {"gcp_id": "a", "source": "cdr"})
+    assert resolved["b"][0] == "cdr"
+    assert resolved["c"][0] == "polymer"
+    assert "missing" not in resolved
+    assert calls == {"cdr": 1, "mget": 1}
+
+
+def test_gcp_resolver_prefers_polymer(monkeypatch):
+    monkeypatch.setattr(es_module, "get_cdr_gcps", lambda cog_id: [{"gcp_id": "a"}, {"gcp_id": "b"}])
+    monkeypatch.setattr(es_module, "return_ES_docs_by_ids", lambda index, ids: {"a": {"gcp_id": "a"}})
+
+    resolved = GCPResolver("cog").resolve(["a", "b"], prefer="polymer")
+
+    assert resolved["a"][0] == "polymer"
+    assert resolved["b"][0] == "cdr"
+
+
+def test_gcp_resolver_uses_prefetched_gcps(monkeypatch):
+    def fail(*args):
+        raise AssertionError("should not be called")
+
+    monkeypatch.setattr(es_module, "get_cdr_gcps", fail)
+    monkeypatch.setattr(es_module, "return_ES_docs_by_ids", fail)
+
+    resolver = GCPResolver("cog", cdr_gcps=[{"gcp_id": "a"}], polymer_gcps=[{"gcp_id": "b"}])
+
+    assert set(resolver.resolve(["a", "b"])) == {"a", "b"}
+
+
+def test_filter_query_uses_term_filters(monkeypatch):
+    monkeypatch.setattr(es_module.app_settings, "polymer_es_keyword_filters", True)
+    assert es_module.legend_categories_query("cog", "polygon") == {
+        "query": {
+            "bool": {
+                "filter": [
+                    {"term": {"cog_id": "cog"}},
+                    {"term": {"category.keyword": "polygon"}},
+                    {"term": {"status.keyword": "validated"}},
+                ]
+            }
+        }
+    }
+
+    query = es_module.filter_query({"cog_id": ["a", "b"]}, must_not={"status": "failed"})
+    assert query["query"]["bool"]["filter"] == [{"terms": {"cog_id": ["a", "b"]}}]
+    assert query["query"]["bool"]["must_not"] == [{"term": {"status.keyword": "failed"}}]
+
+
+def test_filter_query_matches_text_fields_before_reindex(monkeypatch):
+    monkeypatch.setattr(es_module.app_settings, "polymer_es_keyword_filters", False)
+
+    query = es_module.validated_legend_query("cog", ["polygon", "line"])
+    assert query["query"]["bool"]["filter"] == [
+        {"term": {"cog_id": "cog"}},
+        {
+            "bool": {
+                "should": [{"match": {"category": "polygon"}}, {"match": {"category": "line"}}],
+                "minimum_should_match": 1,
+            }
+        },
+        {"match": {"status": "validated"}},
+    ]
+
+    query = es_module.cog_id_query("cog")
+    assert query["query"]["bool"]["must_not"] == [{"match": {"status": "failed"}}]
+
+
+class FakePagedES:
+    def __init__(self, docs):
+        self.docs = docs
+        self.bodies = []
+        self.closed = []
+
+    def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit"}
+
+    def search(self, body, index=None):
+        self.bodies.append(body)
+        start = body.get("search_after", [0])[0]
+        page = self.docs[start : start + body["size"]]
+        hits = [{"_source": doc, "sort": [start + i + 1]} for i, doc in enumerate(page)]
+        return {"pit_id": "pit", "hits": {"hits": hits}}
+
+    def close_point_in_time(self, body):
+        self.closed.append(body["id"])
+
+
+def test_iter_es_docs_pages_past_the_first_page(monkeypatch):
+    fake = FakePagedES([{"n": n} for n in range(5)])
+    monkeypatch.setattr(es_module, "es", fake)
+
+    docs = list(es_module.iter_ES_docs("index", {"query": {}}, source=["n"], page_size=2))
+
+    assert docs == [{"n": n} for n in range(5)]
+    # the full first page is read again from the point in time
+    assert "pit" not in fake.bodies[0]
+    assert [body.get("search_after") for body in fake.bodies[1:]] == [None, [2], [4]]
+    assert fake.bodies[1]["_source"] == ["n"]
+    assert fake.closed == ["pit"]
+
+
+def test_iter_es_docs_reads_a_single_page_without_point_in_time(monkeypatch):
+    fake = FakePagedES([{"n": n} for n in range(3)])
+    monkeypatch.setattr(es_module, "es", fake)
+
+    docs = list(es_module.iter_ES_docs("index", {"query": {}}, source=["n"], page_size=5))
+
+    assert docs == [{"n": n} for n in range(3)]
+    assert len(fake.bodies) == 1
+    assert fake.bodies[0]["_source"] == ["n"] and "pit" not in fake.bodies[0]
+    assert fake.closed == []
+
+
+def test_group_by_category():
+    items = [{"category": "line", "n": 1}, {"category": "polygon", "n": 2}, {"category": "other"}]
+
+    grouped = es_module.group_by_category(items, ("polygon", "line", "point"))
+
+    assert grouped == {
+        "polygon": [{"category": "polygon", "n": 2}],
+        "line": [{"category": "line", "n": 1}],
+        "point": [],
+    }
+
+
+def test_group_by_category_ignores_case():
+    items = [{"category": "Line", "n": 1}, {"category": "POINT", "n": 2}, {"n": 3}]
+
+    grouped = es_module.group_by_category(items, ("polygon", "line", "point"))
+
+    assert grouped == {
+        "polygon": [],
+        "line": [{"category": "Line", "n": 1}],
+        "point": [{"category": "POINT", "n": 2}],
+    }
@@ -0,0 +1,75 @@
+import pytest
+
+from auto_georef.common import feature_index
+from auto_georef.common.feature_index import FeatureIndex, feature_index_cache, invalidate_feature_index
+
+
+def polygon_extraction(polygon_id, x, y, size):
+    coordinates = [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]]
+    return {
+        "polygon_id": polygon_id,
+        "legend_id": "legend_1",
+        "legend_item": {"legend_id": "legend_1", "label": "alluvium"},
+        "validated": None,
+        "px_geojson": {"type": "Polygon", "coordinates": coordinates},
+    }
+
+
+index = FeatureIndex.from_extractions(
+    "polygon",
+    [
+        polygon_extraction("small", 0, 0, 5),
+        polygon_extraction("large", 10, 10, 50),
+        polygon_extraction("medium", 20, 0, 10),
+        polygon_extraction("outside", 500, 500, 10),
+    ],
+)
+
+
+def test_viewport_returns_features_in_bbox():
+    indices, geometries, total = index.viewport((0, 0, 100, 100), max_features=10)
+
+    assert total == 3
+    assert [index.properties[i]["id"] for i in indices] == ["small", "large", "medium"]
+    assert len(geometries) == 3
+    assert index.properties[0]["name"] == "alluvium"
+
+
+def test_viewport_keeps_largest_features_when_truncated():
+    indices, _, total = index.viewport((0, 0, 100, 100), max_features=2)
+
+    assert total == 3
+    # index order is kept, the smallest polygon is dropped
+    assert [index.properties[i]["id"] for i in indices] == ["large", "medium"]
+
+
+def test_viewport_simplifies_with_tolerance():
+    _, geometries, _ = index.viewport((0, 0, 100, 100), max_features=10, tolerance=1.0)
+
+    assert all(not g.is_empty for g in geometries)
+
+
+def test_invalidate_feature_index():
+    feature_index_cache[("cog", "polygon", "polymer", "1")] = index
+    feature_index_cache[("cog", "line", "other", "1")] = index
+    feature_index_cache[("other_cog", "polygon", "polymer", "1")] = index
+
+    invalidate_feature_index("cog", "polymer")
+    assert ("cog", "polygon", "polymer", "1") not in feature_index_cache
+    assert ("cog", "line", "other", "1") in feature_index_cache
+
+    invalidate_feature_index("cog")
+    assert ("cog", "line", "other", "1") not in feature_index_cache
+    assert ("other_cog", "polygon", "polymer", "1") in feature_index_cache
+    feature_index_cache.clear()
+
+
+def test_failed_build_releases_build_lock(monkeypatch):
+    def fail(*args):
+        raise RuntimeError("CDR is down")
+
+    monkeypatch.setattr(feature_index, "build_feature_index", fail)
+    with pytest.raises(RuntimeError):
+        feature_index.get_feature_index("cog", "polygon", "system", "1")
+
+    assert ("cog", "polygon", "system", "1") not in feature_index.build_locks
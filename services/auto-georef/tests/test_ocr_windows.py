@@ -0,0 +1,69 @@
+import numpy as np
+
+from auto_georef.common.map_utils import ocr_windows, read_windows, to_uint8
+from auto_georef.settings import app_settings
+
+
+class FakeSource:
+    """3 band raster whose pixel values encode their row and column"""
+
+    def __init__(self, height=100, width=100):
+        self.height = height
+        self.count = 3
+        rows, cols = np.mgrid[0:height, 0:width]
+        self.data = np.stack([rows, cols, rows * 0]).astype(np.int32)
+        self.reads = []
+
+    def read(self, indexes, window, boundless, fill_value):
+        self.reads.append(window)
+        top, left = int(window.row_off), int(window.col_off)
+        return self.data[[i - 1 for i in indexes], top : top + int(window.height), left : left + int(window.width)]
+
+
+def test_ocr_windows_flip_bboxes():
+    src = FakeSource()
+    (window,) = ocr_windows(src, [[10, 70, 30, 80]])
+
+    assert (window.col_off, window.row_off, window.width, window.height) == (10, 20, 20, 10)
+
+
+def test_read_windows_reads_close_windows_once(monkeypatch):
+    monkeypatch.setattr(app_settings, "ocr_union_read_factor", 4.0)
+    src = FakeSource()
+    windows = ocr_windows(src, [[10, 70, 30, 80], [12, 60, 30, 70]])
+
+    pixels = read_windows(src, windows)
+
+    assert len(src.reads) == 1
+    assert pixels[0].shape == (3, 10, 20)
+    # top left pixel of each window
+    assert (pixels[0][0, 0, 0], pixels[0][1, 0, 0]) == (20, 10)
+    assert (pixels[1][0, 0, 0], pixels[1][1, 0, 0]) == (30, 12)
+
+
+def test_read_windows_reads_far_windows_separately(monkeypatch):
+    monkeypatch.setattr(app_settings, "ocr_union_read_factor", 4.0)
+    src = FakeSource()
+    windows = ocr_windows(src, [[90, 0, 95, 5], [0, 95, 5, 100]])
+
+    pixels = read_windows(src, windows)
+
+    # read in row order, results in bbox order
+    assert [w.row_off for w in src.reads] == [0, 95]
+    assert (pixels[0][0, 0, 0], pixels[0][1, 0, 0]) == (95, 90)
+    assert (pixels[1][0, 0, 0], pixels[1][1, 0, 0]) == (0, 0)
+
+
+def test_to_uint8_stretches_other_dtypes():
+    pixels = FakeSource().data[:, :10, :10]
+
+    converted = to_uint8(pixels)
+
+    assert converted.dtype == np.uint8 and converted.shape == (3, 10, 10)
+    assert (converted.min(), converted.max()) == (0, 255)
+
+
+def test_to_uint8_keeps_the_gray_band_of_two_band_rasters():
+    pixels = np.zeros((2, 5, 5), dtype=np.uint16)
+
+    assert to_uint8(pixels).shape == (1, 5, 5)
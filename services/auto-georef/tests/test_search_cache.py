@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+
+from auto_georef.http.views import search_cache
+from auto_georef.settings import app_settings
+
+
+def cog(cog_id):
+    return {"cog_id": cog_id, "provider_url": "", "provider_name": "", "ngmdb_prod": None, "scale": 24000}
+
+
+def test_normalize_query_ignores_paging_and_sgmc_order():
+    query = {"map_name": "x", "sgmc_geology_major_1": ["b", "a"], "search_terms": ["b", "a"]}
+
+    assert search_cache.normalize_query(query | {"page": 1, "size": 20}) == search_cache.normalize_query(
+        query | {"sgmc_geology_major_1": ["a", "b"], "count": True}
+    )
+    assert search_cache.normalize_query(query) != search_cache.normalize_query(query | {"search_terms": ["a", "b"]})
+
+
+def test_search_page_is_cached_and_prefetches_next_page(monkeypatch):
+    requests = []
+
+    async def apost(url, json, idempotent):
+        requests.append(json["page"])
+        return httpx.Response(200, json=[cog(f"{json['page']}-{i}") for i in range(2)])
+
+    monkeypatch.setattr(search_cache.cdr, "apost", apost)
+    monkeypatch.setattr(app_settings, "search_prefetch_pages", 1)
+    search_cache.search_cache.clear()
+
+    async def browse():
+        status_code, maps = await search_cache.search_page({"map_name": "x"}, 0, 2)
+        await asyncio.gather(*search_cache.inflight.values())
+        next_status_code, next_maps = await search_cache.search_page({"map_name": "x"}, 1, 2)
+        await asyncio.gather(*search_cache.inflight.values())
+        return status_code, maps, next_status_code, next_maps
+
+    status_code, maps, next_status_code, next_maps = asyncio.run(browse())
+
+    assert status_code == next_status_code == 200
+    assert [m["cog_id"] for m in maps] == ["0-0", "0-1"]
+    assert [m["cog_id"] for m in next_maps] == ["1-0", "1-1"]
+    assert maps[0]["fmt_scale"] == "24K"
+    # page 1 was prefetched, page 2 is prefetched when page 1 is served
+    assert requests == [0, 1, 2]
+    search_cache.search_cache.clear()
@@ -0,0 +1,127 @@
+from cdr_schemas.features.polygon_features import (
+    Polygon,
+    PolygonFeature,
+    PolygonFeatureCollection,
+    PolygonLegendAndFeaturesResult,
+    PolygonProperties,
+)
+
+from auto_georef.common import segment_utils
+from auto_georef.common.segment_utils import CDRClient, chunk_polygon_result, geometry_hash
+from auto_georef.settings import app_settings
+
+
+def paged_client(monkeypatch, extractions):
+    """CDRClient whose extraction pages are served from `extractions`"""
+    client = CDRClient("cog")
+    pages = []
+
+    def get(endpoint, data):
+        pages.append(data["page"])
+        start = data["page"] * data["size"]
+        return extractions[start : start + data["size"]]
+
+    monkeypatch.setattr(client, "get", get)
+    return client, pages
+
+
+def test_iter_extractions_stops_at_max_num(monkeypatch):
+    monkeypatch.setattr(app_settings, "cdr_polygon_page_size", 2)
+    client, pages = paged_client(monkeypatch, list(range(10)))
+
+    assert list(client.iter_extractions("polygon", "system", "1", max_num=3)) == [0, 1, 2]
+    assert pages == [0, 1]
+
+
+def test_iter_extractions_stops_after_a_partial_page(monkeypatch):
+    monkeypatch.setattr(app_settings, "cdr_polygon_page_size", 2)
+    client, pages = paged_client(monkeypatch, list(range(5)))
+
+    assert list(client.iter_extractions("polygon", "system", "1", max_num=100)) == list(range(5))
+    assert pages == [0, 1, 2]
+
+
+def test_iter_extractions_stops_after_an_empty_page(monkeypatch):
+    monkeypatch.setattr(app_settings, "cdr_polygon_page_size", 2)
+    client, pages = paged_client(monkeypatch, list(range(4)))
+
+    assert list(client.iter_extractions("polygon", "system", "1", max_num=100)) == list(range(4))
+    assert pages == [0, 1, 2]
+
+
+def test_legend_items_intersect(monkeypatch):
+    segment_utils.legend_intersect_cache.clear()
+    segment_utils.legend_intersect_cache["cached"] = {"legend_id": "cached_match", "ratio": 1.0}
+    client = CDRClient("cog")
+    requested = []
+
+    def get(endpoint, data):
+        requested.append(data["legend_id"])
+        if data["legend_id"] == "no_match":
+            return []
+        return [{"legend_id": "low", "ratio": 0.2}, {"legend_id": "high", "ratio": 0.8}]
+
+    monkeypatch.setattr(client, "get", get)
+
+    items = client.legend_items_intersect(["a", "cached", "no_match", "a"])
+
+    # the best match per id, ids without one are left out
+    assert items == {"a": {"legend_id": "high", "ratio": 0.8}, "cached": {"legend_id": "cached_match", "ratio": 1.0}}
+    # duplicates and cached ids are not requested again
+    assert sorted(requested) == ["a", "no_match"]
+    segment_utils.legend_intersect_cache.clear()
+
+
+def square(x):
+    return [[[x, 0], [x + 1, 0], [x + 1, 1], [x, 1], [x, 0]]]
+
+
+def legend_result(count):
+    features = [
+        PolygonFeature(
+            id=str(i),
+            geometry=Polygon(coordinates=square(i)),
+            properties=PolygonProperties(model="polymer", model_version="1", validated=True),
+        )
+        for i in range(count)
+    ]
+    return PolygonLegendAndFeaturesResult(
+        id="legend", label="Qal", validated=True, polygon_features=PolygonFeatureCollection(features=features)
+    )
+
+
+def chunk_sizes(result):
+    return [len(chunk.polygon_features.features) for chunk in chunk_polygon_result(result)]
+
+
+def test_chunk_polygon_result_limits_features(monkeypatch):
+    monkeypatch.setattr(app_settings, "cdr_publish_chunk_features", 2)
+    monkeypatch.setattr(app_settings, "cdr_publish_chunk_vertices", 1000)
+
+    assert chunk_sizes(legend_result(5)) == [2, 2, 1]
+
+
+def test_chunk_polygon_result_limits_vertices(monkeypatch):
+    # each square has 5 vertices
+    monkeypatch.setattr(app_settings, "cdr_publish_chunk_features", 100)
+    monkeypatch.setattr(app_settings, "cdr_publish_chunk_vertices", 12)
+    assert chunk_sizes(legend_result(5)) == [2, 2, 1]
+
+    # a feature over the limit is still published, on its own
+    monkeypatch.setattr(app_settings, "cdr_publish_chunk_vertices", 3)
+    assert chunk_sizes(legend_result(2)) == [1, 1]
+
+
+def test_chunk_polygon_result_keeps_empty_legend_items():
+    chunks = list(chunk_polygon_result(legend_result(0)))
+
+    assert len(chunks) == 1
+    assert chunks[0].id == "legend" and chunks[0].polygon_features.features == []
+
+
+def test_geometry_hash_depends_on_ring_boundaries():
+    points = [[0, 0], [1, 0], [1, 1], [0, 0]]
+
+    assert geometry_hash([points]) == geometry_hash([[[float(x), float(y)] for x, y in points]])
+    assert geometry_hash([points[:2], points[2:]]) != geometry_hash([points[:3], points[3:]])
+    assert geometry_hash([points]) != geometry_hash([points[:2], points[2:]])
@@ -0,0 +1,80 @@
+import json
+import time
+from types import SimpleNamespace
+
+import auto_georef.common.sgmc_ages as sgmc_module
+from auto_georef.common.sgmc_ages import SGMCAgeIndex, SGMCAgesCache
+
+ages = {"Late Cretaceous": {"max_ma": 100.5, "min_ma": 66.0}}
+
+
+def test_age_index_normalizes_age_text():
+    index = SGMCAgeIndex(ages)
+
+    assert index.map_unit("  late   cretaceous ") == {"age_text": "Late Cretaceous", "t_age": 100.5, "b_age": 66.0}
+    assert index.map_unit("Jurassic") is None
+    assert index.map_unit("") is None
+
+
+def test_cache_revalidates_with_etag(monkeypatch):
+    requests = []
+
+    def fake_get(url, headers):
+        assert url == "/v1/sgmc/sgmc_ages"
+        requests.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return SimpleNamespace(status_code=304, headers={})
+        return SimpleNamespace(status_code=200, headers={"ETag": '"v1"'}, json=lambda: ages)
+
+    monkeypatch.setattr(sgmc_module.cdr, "get", fake_get)
+
+    cache = SGMCAgesCache(ttl=60)
+    index = cache.get()
+    assert cache.get() is index
+    assert len(requests) == 1
+
+    cache.refresh()
+    assert cache.get() is index
+    assert requests[-1]["If-None-Match"] == '"v1"'
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def test_redis_copy_keeps_its_fetch_time(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(sgmc_module, "redis_client", fake)
+    requests = []
+
+    def fake_get(url, headers):
+        requests.append(headers)
+        return SimpleNamespace(status_code=304, headers={})
+
+    monkeypatch.setattr(sgmc_module.cdr, "get", fake_get)
+
+    # fetched by another worker 50s ago
+    payload = {"ages": ages, "etag": '"v1"', "last_modified": None, "fetched_at": time.time() - 50}
+    fake.data[sgmc_module.redis_key] = json.dumps(payload)
+    cache = SGMCAgesCache(ttl=60, use_redis=True)
+    cache.refresh()
+    assert len(cache.get()) == 1 and not cache.is_stale()
+    assert requests == []
+
+    # 20s later the copy is older than the ttl, it is revalidated with the CDR
+    monotonic = time.monotonic()
+    wall = time.time()
+    monkeypatch.setattr(time, "monotonic", lambda: monotonic + 20)
+    monkeypatch.setattr(time, "time", lambda: wall + 20)
+    assert cache.is_stale()
+    cache.refresh()
+    assert requests[-1]["If-None-Match"] == '"v1"'
+    assert not cache.is_stale()
+    assert json.loads(fake.data[sgmc_module.redis_key])["fetched_at"] >= wall + 19
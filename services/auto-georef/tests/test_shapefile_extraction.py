@@ -0,0 +1,103 @@
+import os
+import zipfile
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from affine import Affine
+from fastapi import HTTPException
+from shapely.geometry import LineString, Point, Polygon
+
+from auto_georef.common.shapefile_extraction import (
+    apply_transform_to_gdf,
+    chunk_feature_results,
+    feature_results_payloads,
+    line_coordinates,
+    point_coordinates,
+    polygon_coordinates,
+    to_int_or_none,
+    unzip_file,
+)
+
+
+def test_apply_transform_to_gdf_uses_inverse_transform():
+    gdf = gpd.GeoDataFrame(geometry=[Point(10, 20), LineString([(0, 0), (10, 10)])])
+    # pixel -> world: x * 2 + 100, y * -2 + 200
+    transform = Affine(2, 0, 100, 0, -2, 200)
+
+    pixel = apply_transform_to_gdf(gdf, transform)
+
+    assert pixel.geometry[0].equals(Point(-45, 90))
+    assert list(pixel.geometry[1].coords) == [(-50, 100), (-45, 95)]
+
+
+def test_geojson_coordinates():
+    square = [(0, 0), (4, 0), (4, 4), (0, 4), (0, 0)]
+    hole = [(1, 1), (2, 1), (2, 2), (1, 1)]
+
+    assert point_coordinates([Point(1, 2), Point(3, 4)]) == [[1, 2], [3, 4]]
+    assert line_coordinates([LineString([(0, 0), (1, 1)]), LineString([(2, 2), (3, 3), (4, 4)])]) == [
+        [[0, 0], [1, 1]],
+        [[2, 2], [3, 3], [4, 4]],
+    ]
+    polygons = polygon_coordinates([Polygon(square, [hole]), Polygon(square)])
+    assert len(polygons[0]) == 2 and len(polygons[1]) == 1
+    assert polygons[0][1] == [list(c) for c in hole]
+
+
+def test_to_int_or_none():
+    assert to_int_or_none(pd.Series([12, "7", None, "n/a"])) == [12, 7, None, None]
+
+
+def test_chunk_feature_results():
+    def legend(n):
+        return {"id": f"legend_{n}", "line_features": {"type": "FeatureCollection", "features": list(range(n))}}
+
+    results = {
+        "point_feature_results": [],
+        "line_feature_results": [legend(3), legend(1)],
+        "polygon_feature_results": [],
+    }
+
+    batches = list(chunk_feature_results(results, chunk_size=2))
+
+    sizes = [[len(r["line_features"]["features"]) for r in b["line_feature_results"]] for b in batches]
+    assert sizes == [[2], [1, 1]]
+    assert batches[1]["line_feature_results"][0]["id"] == "legend_3"
+
+
+def test_chunk_feature_results_empty_upload():
+    results = {"point_feature_results": [], "line_feature_results": [], "polygon_feature_results": []}
+
+    assert list(chunk_feature_results(results, chunk_size=2)) == [results]
+
+
+def test_feature_results_payloads_validates_every_batch_first():
+    def legend(n, features):
+        return {"id": f"legend_{n}", "line_features": {"type": "FeatureCollection", "features": features}}
+
+    line = {"type": "Feature", "id": "a", "geometry": {"type": "LineString", "coordinates": [[0, 0], [1, 1]]}}
+    results = {
+        "point_feature_results": [],
+        "line_feature_results": [legend(1, [line]), legend(2, [{"type": "Feature", "geometry": "broken"}])],
+        "polygon_feature_results": [],
+    }
+
+    with pytest.raises(HTTPException) as e:
+        feature_results_payloads("cog", results, chunk_size=1)
+    assert e.value.status_code == 400
+
+
+def test_unzip_file_extracts_only_shapefile_members(tmp_path):
+    zip_path = tmp_path / "upload.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        for name in ["faults/faults.shp", "faults/faults.shx", "faults/faults.dbf", "faults/faults.prj"]:
+            zf.writestr(name, b"")
+        zf.writestr("faults/report.pdf", b"")
+        zf.writestr("__MACOSX/faults/._faults.shp", b"")
+
+    unzip_file(zip_path, tmp_path / "extracted")
+
+    extracted = sorted(os.listdir(tmp_path / "extracted" / "faults"))
+    assert extracted == ["faults.dbf", "faults.prj", "faults.shp", "faults.shx"]
+    assert not (tmp_path / "extracted" / "__MACOSX").exists()
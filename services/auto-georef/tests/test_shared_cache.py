@@ -0,0 +1,79 @@
+import threading
+import time
+
+from auto_georef.common.shared_cache import SharedCache, cached, shared_caches
+
+
+def test_get_or_load_caches_value():
+    cache = SharedCache("test_get_or_load", ttl=60, use_redis=False)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert cache.get_or_load("key", loader) == {"value": 1}
+    assert cache.get_or_load("key", loader) == {"value": 1}
+    assert len(calls) == 1
+    assert cache.stats()["local_hits"] == 1
+    assert cache.stats()["misses"] == 1
+    shared_caches.pop(cache.namespace)
+
+
+def test_stale_value_is_served_while_refreshing(monkeypatch):
+    cache = SharedCache("test_stale", ttl=10, stale_ttl=60, use_redis=False)
+    cache.set("key", "old")
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return "new"
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 30)
+    assert cache.get_or_load("key", loader) == "old"
+    assert refreshed.wait(5)
+
+    for _ in range(50):
+        if not cache.refreshing:
+            break
+        time.sleep(0.01)
+    assert cache.get("key") == "new"
+    assert cache.stats()["stale_hits"] == 1
+    shared_caches.pop(cache.namespace)
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = SharedCache("test_coalesce", ttl=60, use_redis=False)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    threads = [threading.Thread(target=cache.get_or_load, args=("key", loader)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache.get("key") == "value"
+    shared_caches.pop(cache.namespace)
+
+
+def test_cached_keys_by_arguments():
+    cache = SharedCache("test_cached", ttl=60, use_redis=False)
+    calls = []
+
+    @cached(cache)
+    def double(x, scale=2):
+        calls.append(x)
+        return x * scale
+
+    assert double(2) == 4
+    assert double(2) == 4
+    assert double(3, scale=3) == 9
+    assert calls == [2, 3]
+    shared_caches.pop(cache.namespace)
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+from shapely.geometry import LinearRing, Polygon
+
+from auto_georef.common import vector_tiles
+from auto_georef.common.feature_index import FeatureIndex
+from auto_georef.common.vector_tiles import (
+    CLOSE_PATH,
+    LINE_TO,
+    MOVE_TO,
+    POLYGON,
+    GeometryEncoder,
+    command,
+    render_tile,
+    tile_bounds,
+    varint,
+    zigzag,
+)
+from auto_georef.settings import app_settings
+
+
+def polygon_extraction(polygon_id, coordinates, legend_id="legend_1"):
+    return {
+        "polygon_id": polygon_id,
+        "legend_id": legend_id,
+        "legend_item": {"legend_id": legend_id, "abbreviation": "Qal"},
+        "validated": True,
+        "px_geojson": {"type": "Polygon", "coordinates": coordinates},
+    }
+
+
+def square(x, y, size):
+    return [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]]
+
+
+def test_varint_and_zigzag():
+    assert varint(1) == b"\x01"
+    assert varint(300) == b"\xac\x02"
+    assert zigzag([0, -1, 1, -2, 2]).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_tile_bounds(monkeypatch):
+    monkeypatch.setattr(app_settings, "vector_tile_max_zoom", 2)
+
+    assert tile_bounds(2, 1, 3) == (256, 768, 512, 1024)
+    assert tile_bounds(0, 0, 0) == (0, 0, 1024, 1024)
+
+
+def test_exterior_rings_are_encoded_with_positive_area():
+    # counter clockwise on screen (negative area with y down), has to be reversed
+    ring = [[0, 0], [0, 10], [10, 10], [10, 0], [0, 0]]
+    assert vector_tiles.signed_area(np.array(ring[:-1])) < 0
+
+    encoder = GeometryEncoder()
+    assert encoder.add_ring(LinearRing(ring), exterior=True)
+    # starts at the last vertex, (10, 0)
+    assert encoder.commands[:3] == [command(MOVE_TO, 1), 20, 0]
+
+
+def test_polygon_command_stream():
+    _, commands = vector_tiles.encode_geometry(Polygon([(0, 0), (10, 0), (10, 10), (0, 10)]))
+
+    assert commands[0] == command(MOVE_TO, 1)
+    assert commands[3] == command(LINE_TO, 3)
+    assert commands[-1] == command(CLOSE_PATH, 1)
+
+
+def test_feature_index_query():
+    index = FeatureIndex.from_extractions(
+        "polygon",
+        [
+            polygon_extraction("a", square(0, 0, 10)),
+            polygon_extraction("b", square(100, 100, 10)),
+        ],
+    )
+
+    assert len(index) == 2
+    assert index.query((0, 0, 20, 20)).tolist() == [0]
+    assert index.query((0, 0, 200, 200)).tolist() == [0, 1]
+    assert index.properties[1]["name"] == "Qal"
+
+
+def test_feature_index_digest_changes_with_features():
+    a = FeatureIndex.from_extractions("polygon", [polygon_extraction("a", square(0, 0, 10))])
+    ab = FeatureIndex.from_extractions(
+        "polygon", [polygon_extraction("a", square(0, 0, 10)), polygon_extraction("b", square(5, 5, 10))]
+    )
+
+    assert a.digest != ab.digest
+
+
+def test_feature_index_digest_changes_with_validation_and_geometry():
+    extraction = polygon_extraction("a", square(0, 0, 10))
+    index = FeatureIndex.from_extractions("polygon", [extraction])
+
+    moved = FeatureIndex.from_extractions("polygon", [polygon_extraction("a", square(1, 0, 10))])
+    unvalidated = FeatureIndex.from_extractions("polygon", [extraction | {"validated": False}])
+    same = FeatureIndex.from_extractions("polygon", [polygon_extraction("a", square(0, 0, 10))])
+
+    assert index.digest != moved.digest
+    assert index.digest != unvalidated.digest
+    assert index.digest == same.digest
+
+
+def test_prune_tile_cache_removes_least_recently_used(monkeypatch, tmp_path):
+    monkeypatch.setattr(app_settings, "disk_cache_dir", str(tmp_path))
+    directory = tmp_path / "tiles" / "layer" / "digest"
+    directory.mkdir(parents=True)
+    for i in range(4):
+        path = directory / f"{i}.mvt"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (i, i))
+
+    vector_tiles.prune_tile_cache(300)
+
+    assert sorted(os.listdir(directory)) == ["2.mvt", "3.mvt"]
+
+
+def test_render_tile(monkeypatch):
+    monkeypatch.setattr(app_settings, "vector_tile_max_zoom", 2)
+    index = FeatureIndex.from_extractions("polygon", [polygon_extraction("a", square(10, 10, 100))])
+
+    tile = render_tile(index, 2, 0, 0)
+    assert tile
+    assert b"polygon" in tile and b"legend_1" in tile
+    assert vector_tiles.encode_geometry(index.geometries[0])[0] == POLYGON
+
+    # nothing in the far corner of the grid
+    assert render_tile(index, 2, 3, 3) == b""
@@ -0,0 +1,185 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from cdr_schemas.features.line_features import Line
+from cdr_schemas.features.point_features import Point
+
+from auto_georef.http.views import points_lines
+from auto_georef.http.views.points_lines import (
+    PublishFeature,
+    StatusUpdate,
+    UpdateStatusBatchRequest,
+    chunked,
+    to_columns,
+)
+from auto_georef.settings import app_settings
+
+
+def line_extraction(line_id, coordinates, bbox, validated=None):
+    return {
+        "line_id": line_id,
+        "legend_id": "legend_1",
+        "legend_item": {"legend_id": "legend_1", "label": "thrust_fault"},
+        "validated": validated,
+        "dash_pattern": "solid",
+        "px_bbox": bbox,
+        "px_geojson": {"type": "LineString", "coordinates": coordinates},
+    }
+
+
+def test_to_columns_lines():
+    extractions = [
+        line_extraction("a", [[0, 10], [5, 20]], [0, 10, 5, 20], validated=True),
+        line_extraction("b", [[1, 1], [2, 2], [3, 3]], [1, 1, 3, 3]),
+    ]
+
+    columns = to_columns("line", extractions, height=100)
+
+    assert columns["feature_id"] == ["a", "b"]
+    assert columns["is_validated"] == [True, None]
+    assert columns["dash_pattern"] == ["solid", "solid"]
+    assert columns["offsets"] == [0, 2, 5]
+    # y is flipped to the page's pixel space
+    assert columns["coordinates"][:4] == [0, 90, 5, 80]
+    assert columns["bbox"][:4] == [0, 80, 5, 90]
+
+
+def test_to_columns_points():
+    extractions = [
+        {
+            "point_id": "p",
+            "legend_id": "legend_2",
+            "legend_item": None,
+            "validated": False,
+            "px_bbox": [4, 4, 6, 6],
+            "px_geojson": {"type": "Point", "coordinates": [5, 5]},
+        }
+    ]
+
+    columns = to_columns("point", extractions, height=10)
+
+    assert columns["name"] == "Unknown"
+    assert columns["coordinates"] == [5, 5]
+    assert columns["offsets"] == [0, 1]
+    assert "dash_pattern" not in columns
+
+
+def test_chunked():
+    assert chunked([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert chunked([], 2) == []
+
+
+def test_update_status_batch_groups_by_type_and_status(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        points_lines.CDRClient,
+        "update_statuses",
+        lambda self, feature_ids, ftype, is_validated: calls.append((ftype, is_validated, feature_ids)),
+    )
+    invalidated = []
+    monkeypatch.setattr(points_lines, "invalidate_feature_index", lambda *args: invalidated.append(args))
+    monkeypatch.setattr(app_settings, "cdr_publish_chunk_features", 2)
+
+    updates = [
+        StatusUpdate(feature_id="a", ftype="line", is_validated=True),
+        StatusUpdate(feature_id="b", ftype="line", is_validated=True),
+        StatusUpdate(feature_id="c", ftype="line", is_validated=True),
+        StatusUpdate(feature_id="d", ftype="point", is_validated=False),
+    ]
+    points_lines.update_status_batch(UpdateStatusBatchRequest(cog_id="cog", updates=updates))
+
+    assert calls == [
+        ("line", True, ["a", "b"]),
+        ("line", True, ["c"]),
+        ("point", False, ["d"]),
+    ]
+    # every system of the cog
+    assert invalidated == [("cog",)]
+
+
+def test_feature_data_uses_the_features_loaded_for_the_page_once(monkeypatch):
+    loads = []
+
+    def load_features(*args):
+        loads.append(args)
+        return {"legend_1": {"validated": len(loads)}}, []
+
+    monkeypatch.setattr(points_lines, "load_features", load_features)
+
+    url, _ = points_lines.get_features("cog", "line", "system", "1", 0)
+    token = url.split("token=")[1]
+    response = points_lines.get_feature_data("cog", "line", "system", "1", 0, token)
+
+    assert len(loads) == 1
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert b'"validated":1' in response.body
+
+    # e.g. after features were marked, the same url is loaded again
+    response = points_lines.get_feature_data("cog", "line", "system", "1", 0, token)
+    assert len(loads) == 2
+    assert b'"validated":2' in response.body
+    assert points_lines.get_features("cog", "line", "system", "1", 0)[0] != url
+
+
+def legend_item(legend_id):
+    return SimpleNamespace(legend_id=legend_id, label=legend_id, description="")
+
+
+def test_publish_features_packs_legend_chunks(monkeypatch):
+    published = []
+
+    def publish_features(self, ftype, results):
+        features = [r.line_features.features if ftype == "line" else r.point_features.features for r in results]
+        published.append((ftype, self.version, [(r.id, len(f)) for r, f in zip(results, features)]))
+
+    monkeypatch.setattr(points_lines.CDRClient, "publish_features", publish_features)
+    monkeypatch.setattr(
+        points_lines,
+        "get_publish_context",
+        lambda cog_id, ftype, legend_ids: (100, "2", {legend_id: legend_item(legend_id) for legend_id in legend_ids}),
+    )
+    monkeypatch.setattr(points_lines, "invalidate_feature_index", lambda *args: None)
+    monkeypatch.setattr(app_settings, "cdr_publish_chunk_features", 3)
+
+    def line(n, legend_id):
+        return PublishFeature(geometry=Line(coordinates=[[n, 0], [n, 1]]), feature_id=f"l{n}", legend_id=legend_id)
+
+    point = PublishFeature(geometry=Point(coordinates=[1, 1]), feature_id="p", legend_id="c")
+    features = [line(0, "a"), line(1, "a"), line(2, "b"), point, line(3, "a"), line(4, "a")]
+
+    points_lines.publish_features("cog", features)
+
+    # legend a is split in 3 + 1 features, its last piece shares a request with legend b
+    assert published == [
+        ("line", "2", [("a", 3)]),
+        ("line", "2", [("a", 1), ("b", 1)]),
+        ("point", "2", [("c", 1)]),
+    ]
+
+
+def test_get_publish_context_reloads_missing_legend_items(monkeypatch):
+    loads = []
+
+    @contextmanager
+    def get_cached_tiff(cache, cog_id):
+        yield None, 100
+
+    def get_legend_items(cog_id, ftype, system, version):
+        loads.append(version)
+        return [legend_item("a")] if len(loads) == 1 else [legend_item("a"), legend_item("b")]
+
+    monkeypatch.setattr(points_lines, "get_cached_tiff", get_cached_tiff)
+    monkeypatch.setattr(points_lines, "get_latest_version", lambda cog_id, system: "2")
+    monkeypatch.setattr(points_lines, "get_legend_items", get_legend_items)
+    points_lines.publish_context_cache.clear()
+
+    height, version, legend_items = points_lines.get_publish_context("cog", "line", {"a"})
+    assert (height, version, set(legend_items)) == (100, "2", {"a"})
+    points_lines.get_publish_context("cog", "line", {"a"})
+    assert len(loads) == 1
+
+    # "b" was created since the context was loaded
+    _, _, legend_items = points_lines.get_publish_context("cog", "line", {"a", "b"})
+    assert set(legend_items) == {"a", "b"}
+    assert len(loads) == 2
+    points_lines.publish_context_cache.clear()
@@ -1,5 +1,4 @@
 import type { LineString, Point } from "geojson";
-import type { PropertyReplace } from "@/utils/property-replace";
 
 declare global {
   /**
@@ -8,8 +7,8 @@ declare global {
    * @property cogURL - The URL of the COG image.
    * @property system - The system of the COG image.
    * @property version - The version of the COG image.
-   * @property rawFeatures - The raw features returned from the request.
-   * @property rawPolymerFeatures - The raw features of the latest 'polymer' system.
+   * @property featuresURL - The URL of the columnar features of the selected system.
+   * @property polymerFeaturesURL - The URL of the columnar features of the latest 'polymer' system.
    * @property features - The formatted features.
    * @property polymerFeatures - The formatted features of the latest 'polymer' system.
    * @property mode - The page mode.
@@ -23,8 +22,8 @@ declare global {
     cogURL: string;
     system?: string;
     version?: string;
-    rawFeatures?: FeatureGroup<RawFeatureResponse>;
-    rawPolymerFeatures?: FeatureGroup<RawFeatureResponse>;
+    featuresURL?: string;
+    polymerFeaturesURL?: string;
     features?: FeatureGroup;
     polymerFeatures?: FeatureGroup;
     mode?: PageMode;
@@ -66,17 +65,27 @@ declare global {
   };
 
   /**
-   * Represents the response of a raw feature returned from the request.
+   * Represents the features of one legend group as returned by `/lines/feature-data`.
+   * Feature `i` has the vertices `offsets[i]` to `offsets[i + 1]` of the flat
+   * `coordinates` (x, y pairs) and the bounding box `bbox[4 * i]` to `bbox[4 * i + 3]`.
    */
-  type RawFeatureResponse = PropertyReplace<
-    Feature,
-    [
-      { from: "featureID"; to: "feature_id" },
-      { from: "legendID"; to: "legend_id" },
-      { from: "isValidated"; to: "is_validated" },
-      { from: "dashPattern"; to: "dash_pattern" },
-    ]
-  >;
+  type FeatureColumns = {
+    name: string;
+    feature_id: string[];
+    is_validated: (boolean | null)[];
+    dash_pattern?: ("solid" | "dash" | "dotted" | "" | null)[];
+    coordinates: number[];
+    offsets: number[];
+    bbox: number[];
+  };
+
+  /**
+   * Represents the response of `/lines/feature-data`.
+   */
+  type FeatureColumnsResponse = {
+    ftype: FType;
+    groups: Record<string, FeatureColumns>;
+  };
 
   /**
    * Represents a marked feature with its validation status.
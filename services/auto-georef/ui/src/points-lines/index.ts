@@ -173,15 +173,19 @@ async function onView(ftype: FType, system: string, version: string) {
   // Add the feature groups to the page
   const template = templateResult.value;
   setInnerHTML(E.query("#groups"), template);
-  if (polymer.rawFeatures === undefined) {
-    return Failure("`polymer.rawFeatures` is not defined");
+  if (polymer.featuresURL === undefined) {
+    return Failure("`polymer.featuresURL` is not defined");
   }
 
   // Set feature type
   polymer.ftype = ftype;
 
-  // Format features properly
-  polymer.features = U.formatRawFeatures(polymer.rawFeatures);
+  // Fetch the features of the groups
+  const featuresResult = await U.fetchFeatures(polymer.featuresURL);
+  if (!featuresResult.success) {
+    return Failure(featuresResult.error);
+  }
+  polymer.features = featuresResult.value;
 
   // Remove all existing features before adding new ones
   U.removeAllFeatures(map);
@@ -248,18 +252,28 @@ async function onValidate(ftype: FType, system: string, version: string) {
   const template = templateResult.value;
   setInnerHTML(E.query("#group-select"), template);
   if (
-    polymer.rawFeatures === undefined ||
-    polymer.rawPolymerFeatures === undefined
+    polymer.featuresURL === undefined ||
+    polymer.polymerFeaturesURL === undefined
   ) {
-    return Failure("`polymer.rawFeatures` is not defined");
+    return Failure("`polymer.featuresURL` is not defined");
   }
 
   // Set feature type
   polymer.ftype = ftype;
 
-  // Format features properly
-  polymer.features = U.formatRawFeatures(polymer.rawFeatures);
-  polymer.polymerFeatures = U.formatRawFeatures(polymer.rawPolymerFeatures);
+  // Fetch both feature sets at the same time
+  const [featuresResult, polymerFeaturesResult] = await Promise.all([
+    U.fetchFeatures(polymer.featuresURL),
+    U.fetchFeatures(polymer.polymerFeaturesURL),
+  ]);
+  if (!featuresResult.success) {
+    return Failure(featuresResult.error);
+  }
+  if (!polymerFeaturesResult.success) {
+    return Failure(polymerFeaturesResult.error);
+  }
+  polymer.features = featuresResult.value;
+  polymer.polymerFeatures = polymerFeaturesResult.value;
 
   // Remove all existing features before adding new ones
   U.removeAllFeatures(map);
@@ -287,8 +301,8 @@ async function onCreate(ftype: FType) {
   // Add the feature groups to the page
   const template = templateResult.value;
   setInnerHTML(E.query("#create-select"), template);
-  if (polymer.rawPolymerFeatures === undefined) {
-    return Failure("`polymer.rawPolymerFeatures` is not defined");
+  if (polymer.polymerFeaturesURL === undefined) {
+    return Failure("`polymer.polymerFeaturesURL` is not defined");
   }
 
   // Set the feature type
@@ -299,8 +313,14 @@ async function onCreate(ftype: FType) {
     }
   });
 
-  // Format features properly
-  polymer.polymerFeatures = U.formatRawFeatures(polymer.rawPolymerFeatures);
+  // Fetch the features of the latest 'polymer' system
+  const polymerFeaturesResult = await U.fetchFeatures(
+    polymer.polymerFeaturesURL,
+  );
+  if (!polymerFeaturesResult.success) {
+    return Failure(polymerFeaturesResult.error);
+  }
+  polymer.polymerFeatures = polymerFeaturesResult.value;
 
   // Remove all existing features before creating new ones
   U.removeAllFeatures(map);
@@ -814,6 +834,7 @@ async function markFeatureHandler(type: "good" | "bad" | "skip" | "unset") {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
+        cog_id: polymer.cogID,
         feature_id: markedFeature.feature.featureID,
         ftype: ftype,
         is_validated: markedFeature.feature.isValidated,
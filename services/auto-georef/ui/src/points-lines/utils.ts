@@ -12,7 +12,6 @@ import type { Coordinate } from "ol/coordinate";
 
 import type { LineString, Point } from "geojson";
 
-import { replaceProperties } from "@/utils/property-replace";
 import { Failure, Success } from "@/utils/result";
 
 import MouseWheelZoom from "@/utils/openlayers/mouse-wheel-zoom";
@@ -60,27 +59,57 @@ export function removeFeature(map: OpenLayersMap, feature: OpenLayersFeature) {
 }
 
 /**
- * Formats the raw features groups to the correct format.
- * @param rawFeatures - The raw features to format.
- * @returns The formatted features.
+ * Expands the columnar feature groups into features.
+ * @param response - The columnar features returned by `/lines/feature-data`.
+ * @returns The features grouped by legend ID.
  */
-export function formatRawFeatures(
-  rawFeatures: FeatureGroup<RawFeatureResponse>,
-) {
+export function formatFeatureColumns(response: FeatureColumnsResponse) {
   const features: FeatureGroup = {};
-  for (const [legendID, rawFeature] of Object.entries(rawFeatures)) {
-    features[legendID] = rawFeature.map((feature) =>
-      replaceProperties(feature, [
-        { from: "feature_id", to: "featureID" },
-        { from: "legend_id", to: "legendID" },
-        { from: "is_validated", to: "isValidated" },
-        { from: "dash_pattern", to: "dashPattern" },
-      ]),
-    );
+  for (const [legendID, columns] of Object.entries(response.groups)) {
+    const { coordinates, offsets, bbox } = columns;
+    features[legendID] = columns.feature_id.map((featureID, i) => {
+      const vertices: number[][] = [];
+      for (let j = offsets[i]; j < offsets[i + 1]; j++) {
+        vertices.push([coordinates[2 * j], coordinates[2 * j + 1]]);
+      }
+      const geometry: LineString | Point =
+        response.ftype === "point"
+          ? { type: "Point", coordinates: vertices[0] }
+          : { type: "LineString", coordinates: vertices };
+      return {
+        featureID,
+        geometry,
+        name: columns.name,
+        legendID,
+        bbox: [bbox[4 * i], bbox[4 * i + 1], bbox[4 * i + 2], bbox[4 * i + 3]],
+        isValidated: columns.is_validated[i],
+        dashPattern: columns.dash_pattern?.[i] ?? undefined,
+      };
+    });
   }
   return features;
 }
 
+/**
+ * Fetches the columnar features and expands them into features.
+ * @param url - The URL of the features, set by the template.
+ * @returns A success response with the features grouped by legend ID or a failure response.
+ */
+export async function fetchFeatures(url: string) {
+  try {
+    const response = await fetch(url);
+
+    if (!response.ok) {
+      throw new Error("Failed to fetch features");
+    }
+
+    const columns: FeatureColumnsResponse = await response.json();
+    return Success(formatFeatureColumns(columns));
+  } catch (error) {
+    return Failure(error);
+  }
+}
+
 /**
  * Sets the page mode to the specified mode.
  * @param mode - The mode to set.
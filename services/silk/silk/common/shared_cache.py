@@ -0,0 +1,218 @@
+"""
+Two tier cache shared by the uvicorn workers.
+
+Values live in a small in-process LRU in front of Redis, so a value loaded by one worker
+is a Redis hit for the others instead of another CDR call. Entries are fresh for `ttl`
+seconds and are then served for up to `stale_ttl` seconds while one caller refreshes
+them in a background thread. Concurrent misses for the same key are coalesced, in
+process with a lock and across workers with a Redis lock. Values must be JSON
+serializable. Redis is used when `shared_cache_redis` is set, and when it is down the
+cache keeps working in process only.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from logging import Logger
+
+from cachetools import TTLCache
+
+from ..redisapi import delete_keys_with_prefix, redis_client
+from ..settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+
+shared_caches: dict[str, "SharedCache"] = {}
+
+
+class SharedCache:
+    def __init__(self, namespace, ttl, stale_ttl=None, maxsize=128, use_redis=None):
+        if namespace in shared_caches:
+            raise ValueError(f"Shared cache namespace {namespace} is already in use")
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl or ttl, ttl)
+        self.use_redis = app_settings.shared_cache_redis if use_redis is None else use_redis
+        self.local = TTLCache(maxsize=maxsize, ttl=self.stale_ttl)
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.refreshing = set()
+        self.metrics = Counter()
+        shared_caches[namespace] = self
+
+    def redis_key(self, key):
+        return f"{app_settings.shared_cache_prefix}:{self.namespace}:{key}"
+
+    def get_entry(self, key):
+        with self.lock:
+            entry = self.local.get(key)
+        if entry is not None:
+            self.metrics["local_hits"] += 1
+            return entry
+        if not self.use_redis:
+            return None
+        try:
+            payload = redis_client.get(self.redis_key(key))
+        except Exception:
+            self.metrics["redis_errors"] += 1
+            logger.warning(f"Failed to read {self.namespace}:{key} from redis")
+            return None
+        if payload is None:
+            return None
+        entry = json.loads(payload)
+        self.metrics["redis_hits"] += 1
+        with self.lock:
+            self.local[key] = entry
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] <= self.ttl
+
+    def get(self, key, default=None):
+        """Cached value, fresh or stale, without loading it."""
+        entry = self.get_entry(key)
+        if entry is None:
+            self.metrics["misses"] += 1
+            return default
+        return entry["value"]
+
+    def set(self, key, value):
+        entry = {"value": value, "fetched_at": time.time()}
+        with self.lock:
+            self.local[key] = entry
+        if self.use_redis:
+            try:
+                redis_client.set(self.redis_key(key), json.dumps(entry), ex=self.stale_ttl)
+            except Exception:
+                self.metrics["redis_errors"] += 1
+                logger.warning(f"Failed to save {self.namespace}:{key} to redis")
+
+    def delete(self, key):
+        with self.lock:
+            self.local.pop(key, None)
+        if self.use_redis:
+            try:
+                redis_client.delete(self.redis_key(key))
+            except Exception:
+                self.metrics["redis_errors"] += 1
+
+    def clear(self, local_only=False):
+        with self.lock:
+            self.local.clear()
+        if self.use_redis and not local_only:
+            try:
+                delete_keys_with_prefix(self.redis_key(""))
+            except Exception:
+                self.metrics["redis_errors"] += 1
+
+    def load(self, key, loader):
+        self.metrics["loads"] += 1
+        start = time.perf_counter()
+        value = loader()
+        self.metrics["load_ms"] += int((time.perf_counter() - start) * 1000)
+        self.set(key, value)
+        return value
+
+    def get_or_load(self, key, loader):
+        """
+        Cached value of `key`, calling `loader()` when it is missing. A stale value is
+        returned right away and refreshed in the background.
+        """
+        entry = self.get_entry(key)
+        if entry is not None:
+            if not self.is_fresh(entry):
+                self.metrics["stale_hits"] += 1
+                self.refresh_in_background(key, loader)
+            return entry["value"]
+
+        self.metrics["misses"] += 1
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                # someone else may have loaded it while we waited
+                entry = self.get_entry(key)
+                if entry is not None:
+                    self.metrics["coalesced"] += 1
+                    return entry["value"]
+                if not self.use_redis:
+                    return self.load(key, loader)
+                return self.load_with_redis_lock(key, loader)
+        finally:
+            with self.lock:
+                self.key_locks.pop(key, None)
+
+    def load_with_redis_lock(self, key, loader):
+        try:
+            lock = redis_client.lock(
+                self.redis_key(key) + ":lock",
+                timeout=app_settings.shared_cache_lock_timeout,
+                blocking_timeout=app_settings.shared_cache_lock_timeout,
+            )
+            acquired = lock.acquire()
+        except Exception:
+            self.metrics["redis_errors"] += 1
+            return self.load(key, loader)
+
+        try:
+            if acquired:
+                entry = self.get_entry(key)
+                if entry is not None:
+                    self.metrics["coalesced"] += 1
+                    return entry["value"]
+            return self.load(key, loader)
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception:
+                    logger.warning(f"Failed to release the redis lock of {self.namespace}:{key}")
+
+    def refresh_in_background(self, key, loader):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+        threading.Thread(target=self._background_refresh, args=(key, loader), daemon=True).start()
+
+    def _background_refresh(self, key, loader):
+        try:
+            self.load(key, loader)
+        except Exception:
+            self.metrics["load_errors"] += 1
+            logger.exception(f"Failed to refresh {self.namespace}:{key}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def stats(self):
+        with self.lock:
+            size = len(self.local)
+        return {"size": size, "ttl": self.ttl, "stale_ttl": self.stale_ttl, "redis": self.use_redis, **self.metrics}
+
+
+def cached(cache: SharedCache):
+    """Caches the result of a function in `cache`, keyed by its arguments."""
+
+    def wrapper(func):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            key = ":".join([func.__name__, *map(str, args), *(f"{k}={v}" for k, v in sorted(kwargs.items()))])
+            return cache.get_or_load(key, lambda: func(*args, **kwargs))
+
+        inner.cache = cache
+        return inner
+
+    return wrapper
+
+
+def shared_cache_stats():
+    return {namespace: cache.stats() for namespace, cache in shared_caches.items()}
+
+
+def clear_shared_caches(local_only=False):
+    for cache in shared_caches.values():
+        cache.clear(local_only=local_only)
@@ -4,6 +4,8 @@ from logging import Logger
 from fastapi import APIRouter, Request, Response
 from starlette.status import HTTP_204_NO_CONTENT
 
+from ...common.shared_cache import shared_cache_stats
+
 logger: Logger = logging.getLogger(__name__)
 router = APIRouter()
 
@@ -22,3 +24,12 @@ async def get_health_check():
 @router.get("/app")
 def app(request: Request):
     return {"message": "Hello World", "root_path": request.scope.get("root_path")}
+
+
+@router.get(
+    "/cache",
+    summary="shared cache stats",
+    description="Hits, misses and loads of each shared cache, for this worker",
+)
+def cache_stats():
+    return shared_cache_stats()
@@ -10,14 +10,15 @@ import fitz
 import httpx
 import openai
 from openai import OpenAI
-from cachetools import TTLCache
 from cdr_schemas.document import DocumentMetaData, DocumentProvenance
-from fastapi import APIRouter, Form, Request, Response, status
+from fastapi import APIRouter, Form, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import joinedload
 
 from ... import cdrops
+from ...common.shared_cache import SharedCache
 from ...db.db import db_session
 from ...db.models import DbAnnotation, DbPdf
 from ...pdf.utils import cache_open_pdf
@@ -34,7 +35,8 @@ client = OpenAI(
 
 logger: Logger = logging.getLogger(__name__)
 router = APIRouter()
-gpt_cache = TTLCache(maxsize=10, ttl=60)
+# shared so the SSE request can land on another worker than the POST that created the chat
+gpt_cache = SharedCache("cdr_doc_gpt_chats", ttl=60, maxsize=10)
 
 
 @router.get("/cdr/d/{doc_id}")
@@ -47,7 +49,7 @@ async def index(doc_id: str, page1: int, request: Request, bbox: str = ""):
     if page1 < 1:
         return RedirectResponse(f"/cdr/d/{doc_id}/1")
     try:
-        meta = cdrops.get_doc_meta(doc_id)
+        meta = await run_in_threadpool(cdrops.get_doc_meta, doc_id)
     except Exception:
         # todo not found?
         raise
@@ -379,7 +381,7 @@ async def gpt_response_stream(gpt: GptRequest, request: Request, model: str = "g
     msgs.append({"role": "user", "content": gpt.prompt})
     chat_id = uuid.uuid4().hex
     logger.debug("chat id: %s", chat_id)
-    gpt_cache[chat_id] = GptChat(msgs=msgs, model=model)
+    await run_in_threadpool(gpt_cache.set, chat_id, GptChat(msgs=msgs, model=model).model_dump())
 
     return templates.TemplateResponse(
         "doc/gpt.html",
@@ -402,7 +404,10 @@ async def gpt_stream(msgs, model):
 
 @router.get("/doc/ask/gpt/stream/{chat_id}")
 async def gpt_response_stream_sse(chat_id: str, request: Request) -> StreamingResponse:
-    chat = gpt_cache[chat_id]
+    chat = await run_in_threadpool(gpt_cache.get, chat_id)
+    if chat is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="chat not found or expired")
+    chat = GptChat(**chat)
 
     headers = {
         "Content-Type": "text/event-stream",
@@ -9,12 +9,13 @@ from typing import Dict, List
 import fitz
 import openai
 from openai import OpenAI
-from cachetools import TTLCache
-from fastapi import APIRouter, Request, Response, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import joinedload
 
+from ...common.shared_cache import SharedCache
 from ...db.db import db_session
 from ...db.models import DbAnnotation, DbPdf
 from ...pdf.utils import cache_open_pdf
@@ -32,7 +33,8 @@ openai.api_key = app_settings.openai_api_key
 
 logger: Logger = logging.getLogger(__name__)
 router = APIRouter()
-gpt_cache = TTLCache(maxsize=10, ttl=60)
+# shared so the SSE request can land on another worker than the POST that created the chat
+gpt_cache = SharedCache("doc_gpt_chats", ttl=60, maxsize=10)
 
 
 @router.get("/d/{doc_id}/{page}")
@@ -375,7 +377,7 @@ async def gpt_response_stream(gpt: GptRequest, request: Request, model: str = "g
     msgs.append({"role": "user", "content": gpt.prompt})
     chat_id = uuid.uuid4().hex
     logger.debug("chat id: %s", chat_id)
-    gpt_cache[chat_id] = GptChat(msgs=msgs, model=model)
+    await run_in_threadpool(gpt_cache.set, chat_id, GptChat(msgs=msgs, model=model).model_dump())
 
     return templates.TemplateResponse(
         "doc/gpt.html",
@@ -398,7 +400,10 @@ async def gpt_stream(msgs, model):
 
 @router.get("/doc/ask/gpt/stream/{chat_id}")
 async def gpt_response_stream_sse(chat_id: str, request: Request) -> StreamingResponse:
-    chat = gpt_cache[chat_id]
+    chat = await run_in_threadpool(gpt_cache.get, chat_id)
+    if chat is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="chat not found or expired")
+    chat = GptChat(**chat)
 
     headers = {
         "Content-Type": "text/event-stream",
@@ -7,7 +7,6 @@ from typing import Annotated
 import fitz
 import httpx
 import openai
-from cachetools import TTLCache
 from fastapi import APIRouter, Form, Request, Response, UploadFile, status
 from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import joinedload
@@ -24,7 +23,6 @@ openai.api_key = app_settings.openai_api_key
 
 logger: Logger = logging.getLogger(__name__)
 router = APIRouter()
-gpt_cache = TTLCache(maxsize=10, ttl=60)
 
 
 @router.get("/info/d/{doc_id}")
@@ -7,13 +7,13 @@ from uuid import uuid4
 
 import aiofiles
 import httpx
-from cachetools import TTLCache
 from fastapi import APIRouter, HTTPException, Request, status
 from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from pyzotero import zotero
 
 from ...common.s3_utils import aws_s3_client, s3_client, s3_presigned_url, upload_s3_file
+from ...common.shared_cache import SharedCache
 from ...common.utils import dget
 from ...db.db import db_session
 from ...db.models import DbPdf
@@ -24,7 +24,7 @@ logger: Logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-presigned_url_cache = TTLCache(maxsize=10, ttl=60)
+presigned_url_cache = SharedCache("presigned_urls", ttl=60, maxsize=10)
 # pubs_link_cache = TTLCache(maxsize=10, ttl=360)
 
 
@@ -169,7 +169,7 @@ async def sse_pubs_download_progress(url: str, request: Request) -> StreamingRes
 
 @router.get("/partials/zot/download/progress")
 async def sse_zot_download_progress(key: str, request: Request) -> StreamingResponse:
-    url = presigned_url_cache.get(key)
+    url = await run_in_threadpool(presigned_url_cache.get, key)
     logger.debug("cached url: %s", url)
     if not url:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="key not found or expired")
@@ -254,7 +254,7 @@ def zot_id(key: str, request: Request, response: HTMLResponse):
         url = s3_presigned_url(s3, app_settings.s3_documents_bucket, s3_key)
         cache_id = uuid.uuid4().hex
         logger.debug("creating presigned uuid: %s, url: %s, key: %s", cache_id, url, s3_key)
-        presigned_url_cache[cache_id] = url
+        presigned_url_cache.set(cache_id, url)
         if url:
             response.headers["HX-Redirect"] = f"/download/zot/progress?key={cache_id}"
             return
@@ -0,0 +1,22 @@
+import logging
+from logging import Logger
+
+import redis
+
+from .settings import app_settings
+
+logger: Logger = logging.getLogger(__name__)
+
+# None when `redis_url` isn't set, the shared caches then stay in process
+redis_client = redis.Redis.from_url(app_settings.redis_url, decode_responses=True) if app_settings.redis_url else None
+
+
+def delete_keys_with_prefix(prefix):
+    cursor = 0
+    while True:
+        cursor, keys = redis_client.scan(cursor=cursor, match=f"{prefix}*")
+        if keys:
+            redis_client.delete(*keys)
+        if cursor == 0:
+            break
+    logger.warning(f"All keys with prefix '{prefix}' have been deleted.")
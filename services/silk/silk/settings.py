@@ -44,8 +44,17 @@ class Settings(BaseSettings):
     cdr_admin_authelia_user: str
     cdr_admin_authelia_pass: str
 
+    # e.g. redis://redis.nyl.on:6379/0, shares the caches between workers when set
+    redis_url: str = ""
+    shared_cache_prefix: str = "silk_cache"
+    shared_cache_lock_timeout: int = 30
+
     cdr_system_name: str = "silk"
     cdr_system_version: str = "0.1.0"
 
+    @property
+    def shared_cache_redis(self) -> bool:
+        return bool(self.redis_url)
+
 
 app_settings = Settings()
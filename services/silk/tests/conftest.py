@@ -0,0 +1,6 @@
+import os
+
+# required settings without defaults, the tests don't reach any of these services
+for name in ["openai_api_key", "authelia_user", "authelia_pass", "cdr_admin_authelia_user", "cdr_admin_authelia_pass"]:
+    os.environ.setdefault(f"SILK_{name.upper()}", "test")
+os.environ["SILK_REDIS_URL"] = ""
@@ -0,0 +1,132 @@
+import threading
+import time
+
+from silk.common import shared_cache
+from silk.common.shared_cache import SharedCache, cached, shared_caches
+
+
+class FakeLock:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        return self.lock.acquire(timeout=5)
+
+    def release(self):
+        self.lock.release()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.locks = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        return self.locks.setdefault(name, FakeLock())
+
+
+def test_redis_is_off_without_redis_url():
+    cache = SharedCache("test_no_redis", ttl=60)
+
+    assert shared_cache.redis_client is None
+    assert cache.use_redis is False
+    assert cache.get_or_load("key", lambda: "value") == "value"
+    shared_caches.pop(cache.namespace)
+
+
+def test_get_or_load_caches_value():
+    cache = SharedCache("test_get_or_load", ttl=60, use_redis=False)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert cache.get_or_load("key", loader) == {"value": 1}
+    assert cache.get_or_load("key", loader) == {"value": 1}
+    assert len(calls) == 1
+    assert cache.stats()["local_hits"] == 1
+    assert cache.stats()["misses"] == 1
+    shared_caches.pop(cache.namespace)
+
+
+def test_values_are_shared_through_redis(monkeypatch):
+    monkeypatch.setattr(shared_cache, "redis_client", FakeRedis())
+    worker_a = SharedCache("test_redis_a", ttl=60, use_redis=True)
+    worker_b = SharedCache("test_redis_b", ttl=60, use_redis=True)
+    # two workers of the same cache
+    monkeypatch.setattr(worker_b, "namespace", worker_a.namespace)
+
+    assert worker_a.get_or_load("key", lambda: "value") == "value"
+    assert worker_b.get_or_load("key", lambda: "other") == "value"
+    assert worker_b.stats()["redis_hits"] == 1
+    shared_caches.pop("test_redis_a")
+    shared_caches.pop("test_redis_b")
+
+
+def test_stale_value_is_served_while_refreshing(monkeypatch):
+    cache = SharedCache("test_stale", ttl=10, stale_ttl=60, use_redis=False)
+    cache.set("key", "old")
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return "new"
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 30)
+    assert cache.get_or_load("key", loader) == "old"
+    assert refreshed.wait(5)
+
+    for _ in range(50):
+        if not cache.refreshing:
+            break
+        time.sleep(0.01)
+    assert cache.get("key") == "new"
+    assert cache.stats()["stale_hits"] == 1
+    shared_caches.pop(cache.namespace)
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = SharedCache("test_coalesce", ttl=60, use_redis=False)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    threads = [threading.Thread(target=cache.get_or_load, args=("key", loader)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert cache.get("key") == "value"
+    shared_caches.pop(cache.namespace)
+
+
+def test_cached_keys_by_arguments():
+    cache = SharedCache("test_cached", ttl=60, use_redis=False)
+    calls = []
+
+    @cached(cache)
+    def double(x, scale=2):
+        calls.append(x)
+        return x * scale
+
+    assert double(2) == 4
+    assert double(2) == 4
+    assert double(3, scale=3) == 9
+    assert calls == [2, 3]
+    shared_caches.pop(cache.namespace)